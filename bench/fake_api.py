@@ -0,0 +1,78 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+Отвечает на sendMessage / editMessageText / answerCallbackQuery
+(и любые другие методы - простым true) с заданной задержкой
+"""
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+
+class FakeBotAPI:
+    """
+    aiohttp-сервер на 127.0.0.1. latency - задержка ответа в секундах,
+    jitter - случайная добавка к ней. Ответ бота на обновление -
+    answerCallbackQuery для нажатия (ключ - id нажатия) и sendMessage
+    для сообщения (ключ - id чата); он завершает ожидание wait_reply(ключ)
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.port = port
+        self.calls = {}    # метод -> число запросов
+        self._waiters = {}  # ключ ответа -> Future
+        self._message_id = 0
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def wait_reply(self, key):
+        """Future, которое завершится ответом бота с этим ключом"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = future
+        return future
+
+    def _reply(self, key):
+        future = self._waiters.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        form = await request.post()
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.random() * self.jitter)
+
+        result = True
+        if method in ("sendMessage", "editMessageText") and "chat_id" in form:
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(form["chat_id"]), "type": "private"},
+                "text": form.get("text", ""),
+            }
+            if method == "sendMessage":
+                self._reply(int(form["chat_id"]))
+        elif method == "answerCallbackQuery":
+            self._reply(form.get("callback_query_id"))
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,225 @@
+"""
+Нагрузочный тест бота без сети: обновления от множества пользователей
+подаются в диспетчер (или через webhook.py по HTTP), ответы принимает
+локальная замена Bot API.
+
+Каждый пользователь отправляет следующее обновление после ответа бота
+на предыдущее. Задержка - время от отправки обновления до ответа бота:
+sendMessage на сообщение или answerCallbackQuery на нажатие кнопки.
+Запросы к Bot API идут через те же лимиты отправки и метрики, что в работе
+(около 30 сообщений в секунду на бота); --no-limits их отключает, чтобы
+замерить только обработчики.
+
+    python bench/load.py --users 200 --updates 2000 --latency 0.05
+    python bench/load.py --mode webhook --workers 8
+    python bench/load.py --no-limits --updates 20000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с локальным Bot API")
+    parser.add_argument("--mode", choices=("dispatcher", "webhook"), default="dispatcher",
+                        help="dispatcher - feed_update напрямую, webhook - POST в приложение webhook.py")
+    parser.add_argument("--users", type=int, default=200, help="число пользователей")
+    parser.add_argument("--updates", type=int, default=2000, help="всего обновлений")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа Bot API, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--mix", default="0.1,0.5,0.4", help="доли /start, кнопок и текста")
+    parser.add_argument("--workers", type=int, default=8, help="WEBHOOK_WORKERS для режима webhook")
+    parser.add_argument("--db", default="", help="DATABASE_PATH (по умолчанию - в памяти)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="сколько ждать ответа, с")
+    parser.add_argument("--no-limits", action="store_true", help="без лимитов отправки Telegram")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux - в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.latencies = []
+        self.no_reply = 0
+        self.rejected = 0
+        self.sent = 0
+
+    async def run(self):
+        # Окружение задаётся до импорта bot.py: токен, база, без настоящего webhook
+        os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+        os.environ["DATABASE_PATH"] = self.args.db
+        os.environ["WEBHOOK_HOST"] = ""
+        os.environ["WEBHOOK_WORKERS"] = str(self.args.workers)
+        os.environ["SHARDS"] = "0"
+        os.environ.pop("SHARD_INDEX", None)
+        # Ни снимка, ни журнала, ни общей базы групп из окружения или .env рабочего бота
+        os.environ["SNAPSHOT_PATH"] = ""
+        os.environ["JOURNAL_INTERVAL"] = "0"
+        os.environ["JOURNAL_ARCHIVE"] = ""
+        os.environ["GROUPS_DATABASE_PATH"] = ""
+        os.environ["SHARD_COUNT"] = "1"
+
+        from aiogram import Bot
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        from fake_api import FakeBotAPI
+        from metrics import ApiMetricsMiddleware
+        from ratelimit import RateLimitMiddleware
+        from updates import UpdateGenerator
+
+        import bot as bot_module
+        logging.getLogger().setLevel(logging.WARNING)
+
+        self.api = FakeBotAPI(latency=self.args.latency, jitter=self.args.jitter)
+        await self.api.start()
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.api.url))
+        self.bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+        # Те же middleware сессии, что у бота в bot.py и webhook.py
+        self.limiter = bot_module.send_limiter
+        if not self.args.no_limits:
+            self.bot.session.middleware(RateLimitMiddleware(self.limiter))
+        self.bot.session.middleware(ApiMetricsMiddleware(bot_module.metrics))
+        self.dp = bot_module.dp
+        mix = tuple(float(x) for x in self.args.mix.split(","))
+        self.generator = UpdateGenerator(self.args.users, mix=mix, seed=self.args.seed)
+
+        if self.args.mode == "webhook":
+            send, stop = await self._start_webhook()
+        else:
+            send, stop = await self._start_dispatcher()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(self._user(user_id, send) for user_id in self.generator.users))
+        elapsed = time.perf_counter() - start
+
+        await stop()
+        await self.api.stop()
+        return self._report(elapsed)
+
+    async def _start_dispatcher(self):
+        from aiogram.types import Update
+
+        await self.dp.emit_startup(bot=self.bot)
+
+        async def send(update):
+            await self.dp.feed_update(self.bot, Update.model_validate(update, context={"bot": self.bot}))
+
+        async def stop():
+            await self.dp.emit_shutdown(bot=self.bot)
+            await self.bot.session.close()
+
+        return send, stop
+
+    async def _start_webhook(self):
+        from aiohttp import ClientSession, web
+        import webhook
+
+        webhook.bot = self.bot
+        runner = web.AppRunner(webhook.create_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}{webhook.WEBHOOK_PATH}"
+        client = ClientSession()
+
+        async def send(update):
+            async with client.post(url, data=json.dumps(update),
+                                   headers={"Content-Type": "application/json"}) as response:
+                if response.status == 429:
+                    self.rejected += 1
+
+        async def stop():
+            await client.close()
+            await runner.cleanup()
+
+        return send, stop
+
+    async def _user(self, user_id, send):
+        while self.sent < self.args.updates:
+            self.sent += 1
+            update = self.generator.next(user_id)
+            if "callback_query" in update:
+                reply = self.api.wait_reply(update["callback_query"]["id"])
+            else:
+                reply = self.api.wait_reply(user_id)
+            started = time.perf_counter()
+            task = asyncio.create_task(send(update))
+            try:
+                replied = await asyncio.wait_for(reply, self.args.timeout)
+                self.latencies.append(replied - started)
+            except asyncio.TimeoutError:
+                self.no_reply += 1
+            await task
+
+    def _report(self, elapsed):
+        from ratelimit import LIMITED_PREFIXES
+
+        latencies = sorted(self.latencies)
+        # Методы Bot API в camelCase, классы aiogram - с заглавной: sendMessage -> SendMessage
+        limited = sum(count for method, count in self.api.calls.items()
+                      if (method[:1].upper() + method[1:]).startswith(LIMITED_PREFIXES))
+        return {
+            "mode": self.args.mode,
+            "users": self.args.users,
+            "updates": self.sent,
+            "api_latency_ms": self.args.latency * 1000,
+            "seconds": round(elapsed, 3),
+            "updates_per_second": round(self.sent / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            "no_reply": self.no_reply,
+            "rejected_429": self.rejected,
+            "api_calls": dict(self.api.calls),
+            "sends_per_second": round(limited / elapsed, 1) if elapsed else 0.0,
+            "limits": not self.args.no_limits,
+            "send_retries": self.limiter.retried,
+            "edits_coalesced": self.limiter.coalesced,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+
+
+def main():
+    args = parse_args()
+    result = asyncio.run(LoadTest(args).run())
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    print(f"Режим: {result['mode']}, пользователей: {result['users']}, "
+          f"задержка Bot API: {result['api_latency_ms']:.0f} мс")
+    print(f"Обновлений: {result['updates']} за {result['seconds']} с "
+          f"({result['updates_per_second']} в секунду)")
+    print(f"Задержка ответа: p50 {result['p50_ms']} мс, p99 {result['p99_ms']} мс, "
+          f"макс. {result['max_ms']} мс")
+    print(f"Без ответа: {result['no_reply']}, отклонено (429): {result['rejected_429']}")
+    print(f"Запросы к API: {result['api_calls']}")
+    print(f"Отправка сообщений и правок: {result['sends_per_second']} в секунду "
+          f"({'с лимитами' if result['limits'] else 'без лимитов'}; "
+          f"повторов после 429: {result['send_retries']}, схлопнуто правок: {result['edits_coalesced']})")
+    print(f"Пиковая память (RSS): {result['peak_rss_mb']} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Микробенчмарки горячих путей: разбор сообщений, отрисовка экранов
+и сборка клавиатур при 10, 1000 и 10000 записей у пользователя.
+
+Результаты сравниваются с сохранёнными в bench/baseline.json; замедление
+больше порога (по умолчанию 25%) отмечается, и скрипт завершается с кодом 1.
+Сохраняется и сравнивается не абсолютное время, а отношение ко времени
+эталонного цикла (calibrate), замеренного сразу перед каждым замером: так
+результат меньше зависит от текущей частоты процессора и загрузки машины.
+Берётся медиана по repeat таким парам замеров, каждый не короче MIN_TIME.
+Случаи быстрее GATE_MIN только выводятся: их шум больше порога.
+
+    python bench/micro.py            # сравнить с базовыми значениями
+    python bench/micro.py --save     # записать новые базовые значения
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = (10, 1000, 10000)
+MIN_TIME = 0.05     # секунд на один замер: быстрые случаи вызываются в цикле
+GATE_MIN = 10e-6    # случаи быстрее 10 мкс не проверяются на замедление
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Микробенчмарки разбора и отрисовки")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="записей у пользователя")
+    parser.add_argument("--filter", default="", help="только случаи, содержащие строку")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление")
+    parser.add_argument("--repeat", type=int, default=9, help="повторов замера (берётся медиана)")
+    parser.add_argument("--save", action="store_true", help="сохранить результаты как базовые")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    return parser.parse_args()
+
+
+def calibrate():
+    """Эталонная работа: форматирование строк, словарь и сортировка"""
+    data = {f"key{i}": i * 7 % 101 for i in range(200)}
+    "\n".join(f"{k} - {v}" for k, v in sorted(data.items(), key=lambda kv: kv[1]))
+
+
+def loops(timer):
+    """Сколько вызовов подряд нужно, чтобы замер шёл не меньше MIN_TIME"""
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= MIN_TIME:
+            return number
+        number = max(number * 2, int(number * MIN_TIME * 1.2 / elapsed) if elapsed else 0)
+
+
+def measure_relative(func, repeat):
+    """(медиана времени вызова в секундах, медиана того же времени в единицах эталонного цикла)"""
+    timer, reference = timeit.Timer(func), timeit.Timer(calibrate)
+    number, reference_number = loops(timer), loops(reference)
+    seconds = []
+    relative = []
+    for _ in range(repeat):
+        unit = reference.timeit(reference_number) / reference_number
+        elapsed = timer.timeit(number) / number
+        seconds.append(elapsed)
+        relative.append(elapsed / unit)
+    return statistics.median(seconds), statistics.median(relative)
+
+
+def populate(bot, user_id, size, rng):
+    """Расписание, задания, заметки и напоминания пользователя по size записей"""
+    from updates import DAYS, SUBJECTS, WORDS
+
+    for _ in range(size):
+        hour = rng.randint(8, 17)
+        bot.user_schedule.add(user_id, {
+            "id": bot.new_id(), "day": rng.choice(DAYS), "time": f"{hour:02d}:00-{hour + 1:02d}:30",
+            "subject": rng.choice(SUBJECTS), "room": str(rng.randint(100, 450)),
+        })
+        bot.user_homework.add(user_id, {
+            "id": bot.new_id(), "subject": rng.choice(SUBJECTS),
+            "task": " ".join(rng.choice(WORDS) for _ in range(4)),
+            "deadline": f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2030", "done": rng.random() < 0.3,
+        })
+        bot.user_notes.add(user_id, {
+            "id": bot.new_id(), "title": rng.choice(WORDS).capitalize(),
+            "text": " ".join(rng.choice(WORDS) for _ in range(12)),
+        })
+        bot.user_reminders.add(user_id, {
+            "id": bot.new_id(), "text": rng.choice(WORDS), "date": "01.01.2030",
+            "at": 1893456000.0, "sent": False,
+        })
+
+
+def cases(bot, user_id, size, rng):
+    """Пары (имя, функция без аргументов) для пользователя с size записями"""
+    from intents import parse_message
+    from keyboards import items_keyboard, page_nav
+    from updates import homework_line, note_line, reminder_line, schedule_line
+
+    lines = [make(rng) for make in (schedule_line, homework_line, note_line, reminder_line) for _ in range(25)]
+    subjects = bot.subject_vocab.for_user(user_id)
+    last_page = (size - 1) // bot.PAGE_SIZE * bot.PAGE_SIZE
+    notes_page = bot.user_notes.get(user_id)[:bot.PAGE_SIZE]
+    buttons = tuple((f"📌 {i}. {n['title']}", f"note:del:{n['id']}:0") for i, n in enumerate(notes_page, 1))
+
+    def parse_batch():
+        for line in lines:
+            parse_message(line, subjects)
+
+    return [
+        ("parse_message x100", parse_batch),
+        ("schedule_week", lambda: bot.render_schedule_week.uncached(user_id, 0)),
+        ("schedule_week last page", lambda: bot.render_schedule_week.uncached(user_id, last_page)),
+        ("homework_list", lambda: bot.render_homework_list.uncached(user_id, 0)),
+        ("homework_list last page", lambda: bot.render_homework_list.uncached(user_id, last_page)),
+        ("homework_list cached", lambda: bot.render_homework_list(user_id, 0)),
+        ("homework_done last page", lambda: bot.render_homework_done.uncached(user_id, last_page)),
+        ("schedule_delete last page", lambda: bot.render_schedule_delete.uncached(user_id, last_page)),
+        ("notes_list", lambda: bot.render_notes_list.uncached(user_id, 0)),
+        ("notes_delete", lambda: bot.render_notes_delete.uncached(user_id, 0)),
+        ("reminders", lambda: bot.render_reminders.uncached(user_id, 0)),
+        ("notes_search", lambda: bot.note_search.search(user_id, "лекц форм")),
+        ("items_keyboard", lambda: items_keyboard.__wrapped__(buttons, "notes", "notes_clear", ())),
+        ("page_nav", lambda: page_nav.__wrapped__("notes_list", 0, size, bot.PAGE_SIZE)),
+    ]
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+    os.environ["DATABASE_PATH"] = ""
+    # Ни снимка, ни журнала, ни общей базы групп из окружения или .env рабочего бота
+    os.environ["SNAPSHOT_PATH"] = ""
+    os.environ["JOURNAL_INTERVAL"] = "0"
+    os.environ["JOURNAL_ARCHIVE"] = ""
+    os.environ["GROUPS_DATABASE_PATH"] = ""
+    os.environ["SHARD_COUNT"] = "1"
+
+    import bot
+    logging.getLogger().setLevel(logging.WARNING)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        rng = random.Random(size)
+        user_id = size
+        populate(bot, user_id, size, rng)
+        for name, func in cases(bot, user_id, size, rng):
+            key = f"{name} [{size}]"
+            if args.filter not in key:
+                continue
+            seconds, relative = measure_relative(func, args.repeat)
+            gated = key in baseline and seconds >= GATE_MIN
+            if gated and relative > baseline[key] * (1 + args.threshold):
+                # Перепроверка: единичный выброс не должен считаться регрессией
+                seconds, relative = min((seconds, relative), measure_relative(func, args.repeat * 2),
+                                        key=lambda r: r[1])
+            results[key] = relative
+            line = f"{key:<40} {seconds * 1e6:>12.2f} мкс {relative:>10.3f}"
+            if key in baseline:
+                ratio = relative / baseline[key]
+                line += f"   x{ratio:.2f}"
+                if not gated:
+                    line += f"  (быстрее {GATE_MIN * 1e6:.0f} мкс, не проверяется)"
+                elif ratio > 1 + args.threshold:
+                    line += "  РЕГРЕССИЯ"
+                    regressions.append(key)
+            print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"Базовые значения сохранены: {args.baseline}")
+    elif regressions:
+        print(f"Замедление больше {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Проигрывание журнала изменений (journal.py) без сети: события применяются
+к коллекциям бота с его индексами и кэшами так быстро, как получится,
+и печатается пропускная способность и задержки по операциям.
+Поверх снимка на начало журнала (--snapshot) то же самое даёт
+восстановление на момент времени: --until и --save записывают
+состояние в новый снимок, который можно указать в SNAPSHOT_PATH.
+
+    python bench/replay.py /var/data/journal/bot.snap.log.*
+    python bench/replay.py --snapshot day.snap --until "2024-12-25 18:00" --save restored.snap journal/*
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проигрывание журнала изменений хранилища")
+    parser.add_argument("segments", nargs="+", help="файлы сегментов журнала (по порядку)")
+    parser.add_argument("--snapshot", default="", help="снимок, поверх которого писался журнал")
+    parser.add_argument("--until", default="", help="остановиться на этом времени (ГГГГ-ММ-ДД ЧЧ:ММ[:СС])")
+    parser.add_argument("--save", default="", help="записать получившееся состояние в снимок")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def restore(storage, path):
+    """Загрузить снимок в коллекции хранилища в памяти"""
+    from snapshot import Snapshot
+
+    snapshot = Snapshot(path)
+    collections = {collection.name: collection for collection in storage.collections()}
+    for name in snapshot.names:
+        collection = collections.get(name) or storage.collection(name)
+        for key, data in snapshot.blocks(name):
+            collection.replace(key, pickle.loads(data))
+    snapshot.close()
+
+
+def save(storage, path):
+    from snapshot import write_snapshot
+
+    changed = {}
+    for collection in storage.collections():
+        for key, items in collection.items():
+            changed[(collection.name, key)] = [
+                item.to_dict() if hasattr(item, "to_dict") else item for item in items
+            ]
+    write_snapshot(path, changed).close()
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+    os.environ["DATABASE_PATH"] = ""
+    # Ни снимка, ни журнала, ни общей базы групп из окружения или .env рабочего бота
+    os.environ["SNAPSHOT_PATH"] = ""
+    os.environ["JOURNAL_INTERVAL"] = "0"
+    os.environ["JOURNAL_ARCHIVE"] = ""
+    os.environ["GROUPS_DATABASE_PATH"] = ""
+    os.environ["SHARD_COUNT"] = "1"
+
+    import bot
+    from journal import read_events
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.snapshot:
+        restore(bot.storage, args.snapshot)
+    until = datetime.fromisoformat(args.until).timestamp() if args.until else None
+    events = read_events(sorted(args.segments), until)
+    collections = {collection.name: collection for collection in bot.storage.collections()}
+
+    latencies = {}
+    skipped = 0
+    started = time.perf_counter()
+    for _, name, user_id, op, values in events:
+        collection = collections.get(name)
+        if collection is None:
+            collection = collections[name] = bot.storage.collection(name)
+        t = time.perf_counter()
+        try:
+            collection.apply(user_id, op, values)
+        except (IndexError, KeyError, ValueError):
+            skipped += 1
+            continue
+        latencies.setdefault(f"{name}.{op}", []).append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "events": len(events),
+        "skipped": skipped,
+        "seconds": round(elapsed, 3),
+        "events_per_second": round(len(events) / elapsed) if elapsed else 0,
+        "ops": {},
+    }
+    if events:
+        result["first"] = datetime.fromtimestamp(events[0][0]).isoformat(" ", "seconds")
+        result["last"] = datetime.fromtimestamp(events[-1][0]).isoformat(" ", "seconds")
+    for key, values in sorted(latencies.items()):
+        values.sort()
+        result["ops"][key] = {
+            "count": len(values),
+            "p50_us": round(percentile(values, 0.5) * 1e6, 1),
+            "p99_us": round(percentile(values, 0.99) * 1e6, 1),
+            "max_us": round(values[-1] * 1e6, 1),
+        }
+    if args.save:
+        save(bot.storage, args.save)
+        result["saved"] = args.save
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    print(f"Событий: {result['events']} (пропущено {skipped}) за {result['seconds']} с, "
+          f"{result['events_per_second']} в секунду")
+    if events:
+        print(f"Журнал: с {result['first']} по {result['last']}")
+    for key, stats in result["ops"].items():
+        print(f"{key:<28} {stats['count']:>8}  p50 {stats['p50_us']:>8.1f} мкс  "
+              f"p99 {stats['p99_us']:>8.1f} мкс  max {stats['max_us']:>8.1f} мкс")
+    if args.save:
+        print(f"Состояние записано в {args.save}")
+
+
+if __name__ == "__main__":
+    main()
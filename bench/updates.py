@@ -0,0 +1,122 @@
+"""
+Синтетические обновления Telegram: смесь /start, переходов по меню
+и текстовых сообщений (расписание, задания, заметки, напоминания)
+"""
+import random
+import time
+
+DAYS = ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Пн", "Ср")
+SUBJECTS = ("Математика", "Физика", "Информатика", "История", "Английский язык", "Химия")
+WORDS = (
+    "лекция", "формула", "контрольная", "проект", "доклад", "конспект", "задача",
+    "семинар", "экзамен", "теорема", "лабораторная", "отчёт", "глава", "параграф",
+)
+
+# Кнопки меню, которые нажимают пользователи
+MENU_BUTTONS = (
+    "main_menu", "schedule", "schedule_today", "schedule_tomorrow", "schedule_week",
+    "homework", "homework_list", "homework_done", "notes", "notes_list",
+    "reminders", "links", "about", "page:homework_list:10", "page:notes_list:10",
+)
+
+
+def schedule_line(rng):
+    hour = rng.randint(8, 17)
+    return f"{rng.choice(DAYS)} | {hour:02d}:00-{hour + 1:02d}:30 | {rng.choice(SUBJECTS)} | {rng.randint(100, 450)}"
+
+
+def homework_line(rng):
+    task = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+    if rng.random() < 0.5:
+        return f"{rng.choice(SUBJECTS)} | {task}"
+    return f"{rng.choice(SUBJECTS)} | {task} | {rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2030"
+
+
+def note_line(rng):
+    title = rng.choice(WORDS).capitalize()
+    body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+    return f"{title} | {body}"
+
+
+def reminder_line(rng):
+    return f"{rng.choice(WORDS).capitalize()} | {rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2030 {rng.randint(8, 20)}:00"
+
+
+# Текстовые сообщения: (доля, генератор)
+TEXT_MIX = (
+    (0.3, schedule_line),
+    (0.3, homework_line),
+    (0.25, note_line),
+    (0.1, reminder_line),
+    (0.05, lambda rng: " ".join(rng.choice(WORDS) for _ in range(3))),
+)
+
+
+class UpdateGenerator:
+    """
+    Обновления для users пользователей с id от first_user.
+    mix - доли (/start, кнопки меню, текст)
+    """
+
+    def __init__(self, users, mix=(0.1, 0.5, 0.4), seed=1, first_user=1_000_000):
+        self.users = [first_user + i for i in range(users)]
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self._update_id = 0
+
+    def _next_id(self):
+        self._update_id += 1
+        return self._update_id
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def message(self, user_id, text):
+        update_id = self._next_id()
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": text,
+            },
+        }
+
+    def callback(self, user_id, data):
+        update_id = self._next_id()
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": f"{user_id}:{update_id}",
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": 1,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": 1, "is_bot": True, "first_name": "Bot"},
+                    "text": "menu",
+                },
+            },
+        }
+
+    def text(self):
+        roll = self.rng.random()
+        for share, make in TEXT_MIX:
+            if roll < share:
+                return make(self.rng)
+            roll -= share
+        return TEXT_MIX[-1][1](self.rng)
+
+    def next(self, user_id):
+        """Следующее обновление пользователя по заданной смеси"""
+        roll = self.rng.random()
+        start, menu, _ = self.mix
+        if roll < start:
+            return self.message(user_id, "/start")
+        if roll < start + menu:
+            return self.callback(user_id, self.rng.choice(MENU_BUTTONS))
+        return self.message(user_id, self.text())
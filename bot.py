@@ -1,13 +1,42 @@
 import asyncio
 import logging
 import os
-from datetime import datetime, timedelta
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+import re
+import uuid
+from collections import ChainMap
+from datetime import date, datetime, timedelta
+from functools import partial
+from html import escape
+from aiogram import Bot, types, F
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery
 from dotenv import load_dotenv
 
+from callbacks import CallbackRouter, pack
+from keyboards import (
+    GROUP_KEYBOARD, LINKS_KEYBOARD, LINKS_TEXT, MAIN_MENU, NOTES_SEARCH_KEYBOARD, REMINDERS_BUTTONS,
+    REMINDERS_BUTTONS_EMPTY, STATIC_SCREENS, button_keyboard, items_keyboard, page_nav,
+    paged_keyboard,
+)
+from deadlines import DeadlineIndex, UndoneIndex, due_entry, parse_deadline
+from dedup import UpdateDeduplicator
+from digest import build_digests, deliver, next_run
+from fsm import CollectionFSMStorage, expiry_entry
+from groups import GroupDirectory, Timetable
+from intents import SubjectVocabulary, parse_message
+from locks import KeyedLock, SerializedDispatcher
+from metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware, Metrics
+from records import Homework, Note, Reminder, ScheduleEntry
+from ratelimit import RateLimitMiddleware, SendLimiter, bulk
+from schedule import ScheduleIndex, slice_days, weekday_name
+from render import RenderCache, ScreenEditor
+from search import NoteSearch
+from scheduler import TimerScheduler, parse_reminder_date
+from storage import LoadUserMiddleware, Projection, SharedSQLiteStorage, create_storage
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -18,99 +47,452 @@ logger = logging.getLogger(__name__)
 # Получаем токен из переменных окружения
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+DATABASE_PATH = os.getenv("DATABASE_PATH", "")  # Пусто - данные только в памяти
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")  # Двоичный снимок данных (если нет базы)
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", 300))  # Как часто писать снимок, секунд
+JOURNAL_INTERVAL = float(os.getenv("JOURNAL_INTERVAL", 0.2))  # Сброс журнала изменений на диск, секунд (0 - без журнала)
+JOURNAL_ARCHIVE = os.getenv("JOURNAL_ARCHIVE", "")  # Куда переносить свёрнутый журнал (пусто - удалять)
+MEMORY_MAX_USERS = int(os.getenv("MEMORY_MAX_USERS", 0))  # Пользователей в памяти (0 - все)
+MEMORY_IDLE_TTL = int(os.getenv("MEMORY_IDLE_TTL", 0))    # Выгружать неактивных дольше N секунд
+DIGEST_TIME = os.getenv("DIGEST_TIME", "07:00")  # Время утренней сводки; пусто - без сводки
+DIGEST_WINDOW = int(os.getenv("DIGEST_WINDOW", 1800))  # За сколько секунд разослать сводки
+DEADLINE_REMINDER_TIME = os.getenv("DEADLINE_REMINDER_TIME", "18:00")  # Напоминание о завтрашних сроках
+FSM_TTL = int(os.getenv("FSM_TTL", 3600))  # Сколько секунд помнить незавершённый диалог
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 10000))  # Состояний диалогов в LRU-кэше
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 1))  # Процессов-шардов (задаёт shard.py): общий лимит отправки делится между ними
+GROUPS_DATABASE_PATH = os.getenv("GROUPS_DATABASE_PATH", "")  # Общая база групп для процессов SHARDS (задаёт shard.py)
 
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден! Создайте файл .env и добавьте туда BOT_TOKEN=ваш_токен")
 
-# Инициализация бота и диспетчера
+# Хранилище данных (SQLite, если задан DATABASE_PATH, иначе снимок, если задан SNAPSHOT_PATH)
+storage = create_storage(
+    DATABASE_PATH, MEMORY_MAX_USERS, MEMORY_IDLE_TTL,
+    SNAPSHOT_PATH, SNAPSHOT_INTERVAL, JOURNAL_INTERVAL, JOURNAL_ARCHIVE,
+)
+
+# Состояния диалогов (FSM): LRU-кэш в памяти поверх коллекции хранилища,
+# сроки состояний - выжимкой для очистки брошенных диалогов. Коллекция не выгружается:
+# состояние читается до LoadUserMiddleware, и чтение с диска остановило бы цикл событий,
+# а объём ограничен сроком жизни состояний
+fsm_expiries = Projection(storage.collection("fsm"), storage.collection("fsm_expiries"), expiry_entry, key="key")
+fsm_storage = CollectionFSMStorage(fsm_expiries.source, fsm_expiries.target, FSM_CACHE_SIZE, FSM_TTL)
+
+# Инициализация бота и диспетчера.
+# Обновления одного пользователя - по очереди (блокировка до чтения состояния FSM), разных - параллельно
+user_locks = KeyedLock()
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-
-# База данных (в реальном проекте используйте БД)
-user_schedule = {}  # Расписание пользователя
-user_homework = {}  # Домашние задания
-user_notes = {}     # Заметки
-user_reminders = {} # Напоминания
-
-
-# Функция создания главного меню
-def get_main_menu():
-    keyboard = InlineKeyboardBuilder()
-    keyboard.add(InlineKeyboardButton(text="📅 Расписание", callback_data="schedule"))
-    keyboard.add(InlineKeyboardButton(text="📝 Домашние задания", callback_data="homework"))
-    keyboard.add(InlineKeyboardButton(text="📌 Заметки", callback_data="notes"))
-    keyboard.add(InlineKeyboardButton(text="⏰ Напоминания", callback_data="reminders"))
-    keyboard.add(InlineKeyboardButton(text="📚 Полезные ссылки", callback_data="links"))
-    keyboard.add(InlineKeyboardButton(text="ℹ️ О боте", callback_data="about"))
-    keyboard.adjust(2, 2, 1, 1)
-    return keyboard.as_markup()
-
-
-# Функция создания клавиатуры для расписания
-def get_schedule_keyboard():
-    keyboard = InlineKeyboardBuilder()
-    keyboard.add(InlineKeyboardButton(text="📅 Сегодня", callback_data="schedule_today"))
-    keyboard.add(InlineKeyboardButton(text="📆 Завтра", callback_data="schedule_tomorrow"))
-    keyboard.add(InlineKeyboardButton(text="📋 Вся неделя", callback_data="schedule_week"))
-    keyboard.add(InlineKeyboardButton(text="➕ Добавить занятие", callback_data="schedule_add"))
-    keyboard.add(InlineKeyboardButton(text="🗑️ Удалить занятие", callback_data="schedule_delete"))
-    keyboard.add(InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu"))
-    keyboard.adjust(2, 2, 1, 1)
-    return keyboard.as_markup()
-
-
-# Функция создания клавиатуры для домашних заданий
-def get_homework_keyboard():
-    keyboard = InlineKeyboardBuilder()
-    keyboard.add(InlineKeyboardButton(text="📋 Список заданий", callback_data="homework_list"))
-    keyboard.add(InlineKeyboardButton(text="➕ Добавить задание", callback_data="homework_add"))
-    keyboard.add(InlineKeyboardButton(text="✅ Выполнено", callback_data="homework_done"))
-    keyboard.add(InlineKeyboardButton(text="🗑️ Удалить", callback_data="homework_delete"))
-    keyboard.add(InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu"))
-    keyboard.adjust(2, 2, 1)
-    return keyboard.as_markup()
-
-
-# Функция создания клавиатуры для заметок
-def get_notes_keyboard():
-    keyboard = InlineKeyboardBuilder()
-    keyboard.add(InlineKeyboardButton(text="📋 Мои заметки", callback_data="notes_list"))
-    keyboard.add(InlineKeyboardButton(text="➕ Новая заметка", callback_data="notes_add"))
-    keyboard.add(InlineKeyboardButton(text="🔍 Поиск", callback_data="notes_search"))
-    keyboard.add(InlineKeyboardButton(text="🗑️ Удалить", callback_data="notes_delete"))
-    keyboard.add(InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu"))
-    keyboard.adjust(2, 2, 1)
-    return keyboard.as_markup()
-
-
-# Функция создания клавиатуры для полезных ссылок
-def get_links_keyboard():
-    keyboard = InlineKeyboardBuilder()
-    keyboard.add(InlineKeyboardButton(text="🌐 Сайт колледжа", url="https://college.cfuv.ru"))
-    keyboard.add(InlineKeyboardButton(text="📱 Соцсети", url="https://vk.com/college"))
-    keyboard.add(InlineKeyboardButton(text="📚 Библиотека", url="https://library.college.ru"))
-    keyboard.add(InlineKeyboardButton(text="💬 Чат студентов", url="https://t.me/college_chat"))
-    keyboard.add(InlineKeyboardButton(text="🎮 FunPay", url="https://funpay.com"))
-    keyboard.add(InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu"))
-    keyboard.adjust(2, 2, 1, 1)
-    return keyboard.as_markup()
+dp = SerializedDispatcher(storage=fsm_storage, locks=user_locks)
+callbacks = CallbackRouter()
+
+
+# Имя обработчика для метрик: для кнопок - ключ таблицы callbacks
+def handler_name(event, handler):
+    if isinstance(event, CallbackQuery):
+        key = callbacks.key(event.data or "")
+        if key is not None:
+            return f"callback:{key}"
+    return handler.callback.__name__
+
+
+# Лимиты Telegram на исходящие сообщения: общий и на чат.
+# Общий лимит - на бота, поэтому шарды делят его поровну; чат обслуживает один шард
+send_limiter = SendLimiter(rate=30.0 / SHARD_COUNT, burst=max(1, 30 // SHARD_COUNT))
+bot.session.middleware(RateLimitMiddleware(send_limiter))
+
+# Метрики обработчиков и запросов к Bot API (отдаются webhook.py на /metrics)
+metrics = Metrics()
+dp.message.middleware(HandlerMetricsMiddleware(metrics, handler_name))
+dp.callback_query.middleware(HandlerMetricsMiddleware(metrics, handler_name))
+bot.session.middleware(ApiMetricsMiddleware(metrics))
+
+# Коллекции данных пользователей
+# Данные неактивных пользователей выгружаются из памяти (tiered) и читаются с диска заново
+user_schedule = storage.collection("schedule", ScheduleEntry, tiered=True)  # Расписание пользователя
+user_homework = storage.collection("homework", Homework, tiered=True)       # Домашние задания
+user_notes = storage.collection("notes", Note, tiered=True)                 # Заметки
+user_reminders = storage.collection("reminders", Reminder, tiered=True)     # Напоминания
+digest_subscribers = storage.collection("digest")  # Подписка на утреннюю сводку
+
+# Группы: общее расписание хранится один раз, у участника - только его изменения.
+# При нескольких процессах группы и их расписание - в общей для них базе
+group_storage = SharedSQLiteStorage(GROUPS_DATABASE_PATH) if GROUPS_DATABASE_PATH else storage
+group_schedule = group_storage.collection("group_schedule", ScheduleEntry)  # Расписание группы (ключ - группа)
+schedule_hidden = storage.collection("schedule_hidden", tiered=True)         # Скрытые пользователем занятия группы
+group_directory = GroupDirectory(group_storage.collection("groups"), storage.collection("group"))
+
+# Данные пользователя - в память до обработчиков (чтение с диска в потоке)
+dp.update.outer_middleware(LoadUserMiddleware(storage))
+
+# Окно последних update_id для отсева повторных доставок webhook
+update_dedup = UpdateDeduplicator(collection=storage.collection("dedup"))
+
+# Служебные отметки хранилища (версия данных для однократных миграций)
+storage_meta = storage.collection("meta")
+
+# Планировщик доставки напоминаний
+reminder_scheduler = TimerScheduler()
+
+# Задания по сроку сдачи (для экранов "скоро сдавать", "просрочено" и напоминаний).
+# Сроки и таймеры напоминаний всех пользователей - в невыгружаемых выжимках,
+# чтобы при старте не читать с диска данные каждого пользователя
+homework_dues = Projection(user_homework, storage.collection("homework_dues"), due_entry)
+deadline_index = DeadlineIndex(user_homework, homework_dues.target)
+undone_index = UndoneIndex(user_homework)  # Невыполненные - для экрана отметки
+
+# Поисковый индекс по заметкам
+note_search = NoteSearch(user_notes)
+
+# Расписание по дням недели, отсортированное по времени: личное и групп
+schedule_index = ScheduleIndex(user_schedule)
+group_index = ScheduleIndex(group_schedule)
+timetable = Timetable(group_directory, group_schedule, group_index, user_schedule, schedule_index, schedule_hidden)
+
+# Кэш отрисованных экранов и редактор сообщений без лишних запросов
+render_cache = RenderCache()
+for collection in (user_schedule, user_homework, user_notes, user_reminders,
+                   group_schedule, schedule_hidden, group_directory.membership):
+    render_cache.track(collection)
+screens = ScreenEditor()
+
+
+# Расписание группы пользователя - зависимость экранов расписания
+def user_group_schedule(user_id):
+    return "group_schedule", group_directory.group_of(user_id)
+
+
+SCHEDULE_DEPENDS = ("schedule", "schedule_hidden", "group", user_group_schedule)
+
+# Словарь предметов из расписания (для распознавания домашних заданий)
+subject_vocab = SubjectVocabulary(user_schedule)
+group_vocab = SubjectVocabulary(group_schedule)
+
+
+# Предметы пользователя: из личного расписания и расписания группы
+def user_subjects(user_id):
+    key = group_directory.group_of(user_id)
+    if key is None:
+        return subject_vocab.for_user(user_id)
+    return ChainMap(subject_vocab.for_user(user_id), group_vocab.for_user(key))
+
+metrics.gauge("bot_reminders_scheduled", "Напоминаний в планировщике", lambda: len(reminder_scheduler))
+metrics.gauge("bot_send_queue", "Запросов в очереди на отправку", lambda: len(send_limiter))
+metrics.gauge("bot_edits_coalesced_total", "Схлопнутые правки сообщений", lambda: send_limiter.coalesced, "counter")
+metrics.gauge("bot_send_retries_total", "Повторы отправки после 429", lambda: send_limiter.retried, "counter")
+metrics.gauge("bot_user_locks", "Пользователей в обработке", lambda: len(user_locks))
+metrics.gauge("bot_render_cache_hits_total", "Попадания в кэш экранов", lambda: render_cache.hits, "counter")
+metrics.gauge("bot_render_cache_misses_total", "Промахи кэша экранов", lambda: render_cache.misses, "counter")
+metrics.gauge("bot_edits_skipped_total", "Пропущенные повторные правки сообщений", lambda: screens.skipped, "counter")
+metrics.gauge("bot_duplicate_updates_total", "Отброшенные повторные обновления", lambda: update_dedup.duplicates, "counter")
+metrics.gauge("bot_homework_deadlines", "Невыполненных заданий со сроком", lambda: len(deadline_index))
+metrics.gauge("bot_resident_users", "Пользователей, чьи данные в памяти", lambda: len(storage))
+metrics.gauge("bot_storage_loads_total", "Загрузки данных пользователя с диска", lambda: storage.loads, "counter")
+metrics.gauge("bot_storage_evictions_total", "Выгрузки данных пользователя из памяти", lambda: storage.evictions, "counter")
+metrics.gauge("bot_digest_subscribers", "Подписчиков утренней сводки", lambda: len(digest_users()))
+metrics.gauge("bot_fsm_cache_hits_total", "Попадания в кэш состояний диалогов", lambda: fsm_storage.hits, "counter")
+metrics.gauge("bot_fsm_cache_misses_total", "Промахи кэша состояний диалогов", lambda: fsm_storage.misses, "counter")
+metrics.gauge("bot_fsm_expired_total", "Брошенные диалоги, удалённые по сроку", lambda: fsm_storage.expired, "counter")
+
+
+# Состояние ожидания поискового запроса
+class NotesSearch(StatesGroup):
+    query = State()
+
+
+# Экраны удаления и отметки: ожидание номеров записей
+class ItemPick(StatesGroup):
+    schedule_delete = State()
+    homework_done = State()
+    homework_delete = State()
+    notes_delete = State()
+    reminders_delete = State()
+
+
+# Новый идентификатор записи
+def new_id():
+    return uuid.uuid4().hex[:8]
+
+
+# Присвоение id записям, сохранённым до их появления
+def ensure_ids(collection):
+    for user_id, items in collection.items():
+        for i, item in enumerate(items):
+            if 'id' not in item:
+                collection.update(user_id, i, id=new_id())
+
+
+# Отправка сработавшего напоминания
+async def send_reminder(bot: Bot, user_id, reminder_id):
+    i = user_reminders.find(user_id, reminder_id)
+    if i is None:
+        return
+    r = user_reminders.get(user_id)[i]
+    # Напоминания уступают очередь ответам пользователям
+    with bulk():
+        await bot.send_message(
+            user_id,
+            f"⏰ <b>Напоминание!</b>\n\n{escape(r.text)}\n📅 {escape(r.get('date', ''))}",
+            parse_mode="HTML"
+        )
+    # Пока сообщение ждало отправки, список мог измениться - ищем заново
+    i = user_reminders.find(user_id, reminder_id)
+    if i is not None:
+        user_reminders.update(user_id, i, sent=True)
+
+
+# Таймер напоминания {"id", "at"} или None, если оно отправлено или без срока
+def reminder_timer(reminder):
+    if reminder.get('sent') or 'id' not in reminder:
+        return None
+    at = reminder.get('at')
+    if at is None:
+        when = parse_reminder_date(reminder.get('date', ''))
+        if when is None:
+            return None
+        at = when.timestamp()
+    return {"id": reminder['id'], "at": at}
+
+
+reminder_timers = Projection(user_reminders, storage.collection("reminder_timers"), reminder_timer)
+
+
+# Постановка таймера напоминания в планировщик
+def schedule_timer(bot: Bot, user_id, timer):
+    reminder_id = timer['id']
+    reminder_scheduler.schedule(
+        (user_id, reminder_id), timer['at'],
+        lambda: send_reminder(bot, user_id, reminder_id)
+    )
+
+
+# Постановка напоминания в планировщик
+def schedule_reminder(bot: Bot, user_id, reminder):
+    timer = reminder_timer(reminder)
+    if timer is not None:
+        schedule_timer(bot, user_id, timer)
+
+
+# Подписчики утренней сводки
+def digest_users():
+    return [user_id for user_id, items in digest_subscribers.items() if items]
+
+
+# Тексты утренней сводки: расписание группы отрисовывается один раз на группу,
+# у пользователя - только его изменения расписания и задания
+def plan_digests(now):
+    day = weekday_name(now)
+    today = now.date()
+
+    def render_shared(key):
+        if key is None:
+            return None
+        return schedule_lines(group_index.day(key, day)) or None
+
+    def render_personal(user_id):
+        schedule = None
+        if timetable.differs(user_id, day):
+            schedule = schedule_lines(timetable.day(user_id, day))
+        # Невыполненные со сроком до завтра включительно (и просроченные)
+        homework = deadline_index.until(user_id, today + timedelta(days=1))
+        if schedule is None and not homework:
+            return None
+        return schedule, homework_lines(homework) if homework else None
+
+    def compose(shared, personal):
+        schedule, homework = personal or (None, None)
+        if schedule is None:
+            schedule = shared
+        if not schedule and not homework:
+            return None
+        text = (
+            "🌅 <b>Доброе утро!</b>\n\n"
+            f"📅 <b>Расписание на сегодня ({day})</b>\n\n"
+            f"{schedule.rstrip() if schedule else 'Занятий нет! 🎉'}"
+        )
+        if homework:
+            text += f"\n\n📝 <b>Скоро сдавать</b>\n\n{homework.rstrip()}"
+        return text
+
+    return build_digests(digest_users(), group_directory.group_of, render_shared, render_personal, compose)
+
+
+# Рассылка одному пользователю (уступает очередь ответам)
+async def send_bulk(bot: Bot, user_id, text, keyboard=None):
+    with bulk():
+        try:
+            await bot.send_message(user_id, text, parse_mode="HTML", reply_markup=keyboard)
+        except TelegramForbiddenError:
+            # Бот заблокирован - больше не присылаем
+            digest_subscribers.clear(user_id)
+            raise
+
+
+# Утренняя сводка всем подписчикам, растянутая на DIGEST_WINDOW секунд
+async def run_digest(bot: Bot):
+    schedule_digest(bot)
+    # Данные подписчиков - в память одним чтением в потоке, а не по одному в цикле событий
+    await storage.load_users(digest_users())
+    plan = plan_digests(datetime.now())
+    keyboard = button_keyboard("📅 Расписание", "schedule")
+    sent = await deliver(plan, lambda user_id, text: send_bulk(bot, user_id, text, keyboard), DIGEST_WINDOW)
+    logger.info(f"Утренняя сводка: отправлено {sent} из {len(plan)}")
+
+
+# Постановка следующей сводки в планировщик
+def schedule_digest(bot: Bot):
+    if DIGEST_TIME:
+        reminder_scheduler.schedule(("digest",), next_run(DIGEST_TIME).timestamp(), lambda: run_digest(bot))
+
+
+# Напоминания о заданиях со сроком на завтра: выборка из общего индекса сроков
+async def run_deadline_reminders(bot: Bot):
+    schedule_deadline_reminders(bot)
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    users = deadline_index.users_between(tomorrow, tomorrow)
+    # Задания этих пользователей - в память одним чтением в потоке
+    await storage.load_users(users)
+    plan = [
+        (user_id, f"⏰ <b>Завтра срок сдачи!</b>\n\n"
+                  f"{homework_lines(deadline_index.between(user_id, tomorrow, tomorrow)).rstrip()}")
+        for user_id in users
+    ]
+    keyboard = button_keyboard("✅ Отметить выполненным", "homework_done")
+    sent = await deliver(plan, lambda user_id, text: send_bulk(bot, user_id, text, keyboard), DIGEST_WINDOW)
+    logger.info(f"Напоминания о сроках: отправлено {sent} из {len(plan)}")
+
+
+# Постановка следующих напоминаний о сроках в планировщик
+def schedule_deadline_reminders(bot: Bot):
+    if DEADLINE_REMINDER_TIME:
+        reminder_scheduler.schedule(
+            ("deadlines",), next_run(DEADLINE_REMINDER_TIME).timestamp(),
+            lambda: run_deadline_reminders(bot)
+        )
+
+
+# Удаление брошенных диалогов (состояний старше FSM_TTL), в том числе у выгруженных пользователей
+async def sweep_fsm():
+    schedule_fsm_sweep()
+    removed = await fsm_storage.sweep()
+    if removed:
+        logger.info(f"Удалено брошенных диалогов: {removed}")
+
+
+# Постановка следующей очистки диалогов в планировщик
+def schedule_fsm_sweep():
+    reminder_scheduler.schedule(("fsm",), datetime.now().timestamp() + FSM_TTL, sweep_fsm)
+
+
+# Срок сдачи для заданий, сохранённых до появления поля due
+def ensure_due(collection):
+    for user_id, items in collection.items():
+        for i, item in enumerate(items):
+            if 'due' not in item:
+                collection.update(user_id, i, due=parse_deadline(item.get('deadline')))
+
+
+DATA_VERSION = 2  # Версия данных: миграции до неё уже выполнены
+
+
+# Однократные миграции: читают данные всех пользователей, поэтому выполняются,
+# только пока сохранённая версия данных меньше DATA_VERSION
+def migrate_data():
+    meta = storage_meta.get(0)
+    version = meta[0].get('version', 0) if meta else 0
+    if version >= DATA_VERSION:
+        return
+    logger.info(f"Миграция данных с версии {version} до {DATA_VERSION}")
+    if version < 1:
+        for collection in (user_schedule, user_homework, user_notes, user_reminders, group_schedule):
+            ensure_ids(collection)
+        ensure_due(user_homework)
+        homework_dues.build()
+        reminder_timers.build()
+    if version < 2:
+        fsm_expiries.build()
+    storage_meta.replace(0, [{"version": DATA_VERSION}])
+
+
+# Запуск и остановка хранилища и планировщика (и для polling, и для webhook)
+@dp.startup()
+async def on_bot_startup(bot: Bot):
+    await storage.start()
+    if group_storage is not storage:
+        await group_storage.start()
+    update_dedup.load()
+    migrate_data()
+    # Индекс сроков и таймеры - из невыгружаемых выжимок, без чтения данных пользователей с диска.
+    # Сортировка всех сроков - в потоке: обновления ещё не обрабатываются, выжимку никто не меняет
+    await asyncio.to_thread(deadline_index.build)
+    for user_id, timers in reminder_timers.target.items():
+        for timer in timers:
+            schedule_timer(bot, user_id, timer)
+    reminder_scheduler.start()
+    logger.info(f"Запланировано напоминаний: {len(reminder_scheduler)}")
+    schedule_digest(bot)
+    schedule_deadline_reminders(bot)
+    schedule_fsm_sweep()
+
+
+@dp.shutdown()
+async def on_bot_shutdown():
+    await reminder_scheduler.stop()
+    await send_limiter.stop()
+    update_dedup.save()
+    await storage.close()
+    if group_storage is not storage:
+        await group_storage.close()
+
+
+PAGE_SIZE = 10  # Записей на одной странице списка
+
+
+# Страница списка: (смещение, записи страницы, кнопки навигации)
+def paginate(items, offset, screen):
+    return paginate_range(len(items), lambda start, size: items[start:start + size], offset, screen)
+
+
+# Страница без сборки всего списка: total - число записей, fetch(смещение, размер) - записи страницы
+def paginate_range(total, fetch, offset, screen):
+    if offset >= total:
+        offset = max(0, (total - 1) // PAGE_SIZE * PAGE_SIZE)
+    return offset, fetch(offset, PAGE_SIZE), page_nav(screen, offset, total, PAGE_SIZE)
+
+
+# Страница расписания недели: по числу занятий в каждом дне, без сборки всего расписания
+def paginate_week(user_id, offset, screen):
+    days = timetable.days(user_id)
+    total = sum(count for count, _ in days)
+    return paginate_range(total, lambda start, size: slice_days(days, start, start + size), offset, screen)
+
+
+# Клавиатура с кнопкой на каждую запись: items - пары (номер, запись).
+# В callback_data кнопки кладётся смещение страницы, чтобы после действия вернуться на неё
+def get_items_keyboard(items, icon, label, action, back, clear=None, nav=(), offset=0):
+    buttons = tuple(
+        (f"{icon} {number}. {label(item)}"[:60], pack(*action, item.id, offset))
+        for number, item in items
+    )
+    return items_keyboard(buttons, back, clear, nav)
+
+
+# Статичный экран: готовые текст и клавиатура
+def static_screen(text, keyboard):
+    async def handler(callback: CallbackQuery):
+        await screens.edit(callback, text, keyboard)
+        await callback.answer()
+    return handler
+
+
+for data, (text, keyboard) in STATIC_SCREENS.items():
+    callbacks.on(data)(static_screen(text, keyboard))
 
 
 # Обработчик команды /start
 @dp.message(Command("start"))
-async def cmd_start(message: types.Message):
-    keyboard = get_main_menu()
-    user_id = message.from_user.id
-    
-    # Инициализируем данные пользователя
-    if user_id not in user_schedule:
-        user_schedule[user_id] = []
-    if user_id not in user_homework:
-        user_homework[user_id] = []
-    if user_id not in user_notes:
-        user_notes[user_id] = []
-    if user_id not in user_reminders:
-        user_reminders[user_id] = []
+async def cmd_start(message: types.Message, state: FSMContext):
+    await state.clear()
+    keyboard = MAIN_MENU
     
     await message.answer(
         f"👋 Привет, {message.from_user.first_name}!\n\n"
@@ -133,6 +515,8 @@ async def cmd_help(message: types.Message):
         "📚 <b>Команды бота:</b>\n\n"
         "/start - Главное меню\n"
         "/help - Помощь\n"
+        "/group название - Вступить в группу или создать её\n"
+        "/digest - Утренняя сводка (вкл/выкл)\n"
         "/schedule - Расписание\n"
         "/homework - Домашние задания\n"
         "/notes - Заметки\n\n"
@@ -141,541 +525,611 @@ async def cmd_help(message: types.Message):
     )
 
 
-# Обработчик callback для главного меню
-@dp.callback_query(F.data == "main_menu")
-async def callback_main_menu(callback: CallbackQuery):
-    keyboard = get_main_menu()
-    await callback.message.edit_text(
-        "🎓 <b>Главное меню</b>\n\n"
-        "Выбери действие:",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
-    await callback.answer()
+# Строки занятий дня (экран дня и утренняя сводка); текст пользователя экранируется для HTML
+def schedule_lines(entries):
+    return "\n".join([
+        f"🕐 {escape(s.time)} - {escape(s.subject)}\n   📍 {escape(s.get('room', 'Аудитория не указана'))}\n"
+        for s in entries
+    ])
 
 
-# Обработчик callback для расписания
-@dp.callback_query(F.data == "schedule")
-async def callback_schedule(callback: CallbackQuery):
-    keyboard = get_schedule_keyboard()
-    await callback.message.edit_text(
-        "📅 <b>Расписание занятий</b>\n\n"
-        "Выбери действие:",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
-    await callback.answer()
+# Строки домашних заданий с номерами от start + 1 (список заданий и сводка)
+def homework_lines(homework, start=0):
+    return "\n".join([
+        f"{i+1}. 📚 {escape(h.subject)}\n"
+        f"   📝 {escape(h.task)}\n"
+        f"   📅 Дедлайн: {escape(h.get('deadline', 'Не указан'))}\n"
+        f"   {'✅ Выполнено' if h.get('done', False) else '⏳ В работе'}\n"
+        for i, h in enumerate(homework, start)
+    ])
+
+
+# Экран расписания на день (page - название дня)
+@render_cache.screen("schedule_day", depends=SCHEDULE_DEPENDS)
+def render_schedule_day(user_id, day):
+    day_schedule = timetable.day(user_id, day)
+    keyboard = button_keyboard("⬅️ Назад к расписанию", "schedule")
+    if not day_schedule:
+        return None, keyboard
+    return schedule_lines(day_schedule), keyboard
 
 
 # Обработчик callback для расписания на сегодня
-@dp.callback_query(F.data == "schedule_today")
+@callbacks.on("schedule_today")
 async def callback_schedule_today(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    today = datetime.now().strftime("%A")
-    today_ru = {
-        "Monday": "Понедельник",
-        "Tuesday": "Вторник",
-        "Wednesday": "Среда",
-        "Thursday": "Четверг",
-        "Friday": "Пятница",
-        "Saturday": "Суббота",
-        "Sunday": "Воскресенье"
-    }.get(today, today)
-    
-    schedule = user_schedule.get(user_id, [])
-    today_schedule = [s for s in schedule if s.get('day') == today_ru]
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад к расписанию", callback_data="schedule")
-    ]])
-    
-    if today_schedule:
-        schedule_text = "\n".join([
-            f"🕐 {s['time']} - {s['subject']}\n   📍 {s.get('room', 'Аудитория не указана')}\n"
-            for s in sorted(today_schedule, key=lambda x: x.get('time', ''))
-        ])
-        await callback.message.edit_text(
-            f"📅 <b>Расписание на сегодня ({today_ru})</b>\n\n{schedule_text}",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
+    today_ru = weekday_name(datetime.now())
+    schedule_text, keyboard = render_schedule_day(callback.from_user.id, today_ru)
+    if schedule_text:
+        text = f"📅 <b>Расписание на сегодня ({today_ru})</b>\n\n{schedule_text}"
     else:
-        await callback.message.edit_text(
+        text = (
             f"📅 <b>Расписание на сегодня ({today_ru})</b>\n\n"
             "На сегодня занятий нет! 🎉\n"
-            "Или добавь расписание через кнопку '➕ Добавить занятие'",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            "Или добавь расписание через кнопку '➕ Добавить занятие'"
         )
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
 # Обработчик callback для расписания на завтра
-@dp.callback_query(F.data == "schedule_tomorrow")
+@callbacks.on("schedule_tomorrow")
 async def callback_schedule_tomorrow(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%A")
-    tomorrow_ru = {
-        "Monday": "Понедельник",
-        "Tuesday": "Вторник",
-        "Wednesday": "Среда",
-        "Thursday": "Четверг",
-        "Friday": "Пятница",
-        "Saturday": "Суббота",
-        "Sunday": "Воскресенье"
-    }.get(tomorrow, tomorrow)
-    
-    schedule = user_schedule.get(user_id, [])
-    tomorrow_schedule = [s for s in schedule if s.get('day') == tomorrow_ru]
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад к расписанию", callback_data="schedule")
-    ]])
-    
-    if tomorrow_schedule:
-        schedule_text = "\n".join([
-            f"🕐 {s['time']} - {s['subject']}\n   📍 {s.get('room', 'Аудитория не указана')}\n"
-            for s in sorted(tomorrow_schedule, key=lambda x: x.get('time', ''))
-        ])
-        await callback.message.edit_text(
-            f"📅 <b>Расписание на завтра ({tomorrow_ru})</b>\n\n{schedule_text}",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
+    tomorrow_ru = weekday_name(datetime.now() + timedelta(days=1))
+    schedule_text, keyboard = render_schedule_day(callback.from_user.id, tomorrow_ru)
+    if schedule_text:
+        text = f"📅 <b>Расписание на завтра ({tomorrow_ru})</b>\n\n{schedule_text}"
     else:
-        await callback.message.edit_text(
+        text = (
             f"📅 <b>Расписание на завтра ({tomorrow_ru})</b>\n\n"
-            "На завтра занятий нет! 🎉",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            "На завтра занятий нет! 🎉"
         )
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
-# Обработчик callback для расписания на всю неделю
-@dp.callback_query(F.data == "schedule_week")
-async def callback_schedule_week(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    schedule = user_schedule.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад к расписанию", callback_data="schedule")
-    ]])
-    
-    if schedule:
-        days_order = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
-        schedule_by_day = {}
-        for s in schedule:
-            day = s.get('day', '')
-            if day not in schedule_by_day:
-                schedule_by_day[day] = []
-            schedule_by_day[day].append(s)
-        
-        week_text = ""
-        for day in days_order:
-            if day in schedule_by_day:
-                week_text += f"\n<b>{day}:</b>\n"
-                for s in sorted(schedule_by_day[day], key=lambda x: x.get('time', '')):
-                    week_text += f"🕐 {s['time']} - {s['subject']} ({s.get('room', '?')})\n"
-        
-        await callback.message.edit_text(
-            f"📅 <b>Расписание на неделю</b>\n{week_text}",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-    else:
-        await callback.message.edit_text(
+# Экран расписания на неделю
+@render_cache.screen("schedule_week", depends=SCHEDULE_DEPENDS)
+def render_schedule_week(user_id, page=0):
+    page, entries, nav = paginate_week(user_id, page, "schedule_week")
+    if not entries:
+        return (
             "📅 <b>Расписание на неделю</b>\n\n"
             "Расписание пусто. Добавь занятия!",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            button_keyboard("⬅️ Назад к расписанию", "schedule")
         )
+    week_text = ""
+    day = None
+    for s in entries:
+        if s.get('day') != day:
+            day = s.get('day')
+            week_text += f"\n<b>{escape(day)}:</b>\n"
+        week_text += escape(f"🕐 {s.time} - {s.subject} ({s.get('room', '?')})\n")
+    keyboard = paged_keyboard(nav, (("⬅️ Назад к расписанию", "schedule"),))
+    return f"📅 <b>Расписание на неделю</b>\n{week_text}", keyboard
+
+
+# Обработчик callback для расписания на всю неделю
+@callbacks.on("schedule_week")
+async def callback_schedule_week(callback: CallbackQuery):
+    text, keyboard = render_schedule_week(callback.from_user.id)
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
-# Обработчик callback для удаления занятия
-@dp.callback_query(F.data == "schedule_delete")
-async def callback_schedule_delete(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    schedule = user_schedule.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="schedule")
-    ]])
-    
-    if not schedule:
-        await callback.message.edit_text(
+# Экран удаления занятий
+@render_cache.screen("schedule_delete", depends=SCHEDULE_DEPENDS)
+def render_schedule_delete(user_id, page=0):
+    page, items, nav = paginate_week(user_id, page, "schedule_delete")
+    if not items:
+        return (
             "🗑️ <b>Удалить занятие</b>\n\n"
             "Расписание пусто. Нечего удалять!",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            button_keyboard("⬅️ Назад", "schedule")
         )
-    else:
-        await callback.message.edit_text(
-            "🗑️ <b>Удалить занятие</b>\n\n"
-            "Отправь номер занятия для удаления.\n"
-            "Или отправь: <code>Все</code> для очистки расписания.",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+    numbered_page = enumerate(items, page + 1)
+    return (
+        "🗑️ <b>Удалить занятие</b>\n\n"
+        "Нажми на занятие, чтобы удалить его.\n"
+        "Или нажми «Удалить все» для очистки расписания.\n"
+        "Или отправь номер (можно несколько через пробел).",
+        get_items_keyboard(
+            numbered_page, "🗑️", lambda s: f"{s.day} {s.time} {s.subject}",
+            ("sch", "del"), back="schedule", clear="schedule_clear", nav=nav, offset=page
         )
-    await callback.answer()
+    )
 
 
-# Обработчик callback для добавления занятия
-@dp.callback_query(F.data == "schedule_add")
-async def callback_schedule_add(callback: CallbackQuery):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="schedule")
-    ]])
-    await callback.message.edit_text(
-        "➕ <b>Добавить занятие</b>\n\n"
-        "Отправь информацию в формате:\n"
-        "<code>День недели | Время | Предмет | Аудитория</code>\n\n"
-        "Пример:\n"
-        "<code>Понедельник | 09:00 | Математика | 201</code>\n\n"
-        "Или:\n"
-        "<code>Пн | 09:00 | Математика | 201</code>",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
+# Обработчик callback для удаления занятия
+@callbacks.on("schedule_delete")
+async def callback_schedule_delete(callback: CallbackQuery, state: FSMContext):
+    await show_pick_screen(callback, state, ItemPick.schedule_delete)
     await callback.answer()
 
 
-# Обработчик callback для домашних заданий
-@dp.callback_query(F.data == "homework")
-async def callback_homework(callback: CallbackQuery):
-    keyboard = get_homework_keyboard()
-    await callback.message.edit_text(
-        "📝 <b>Домашние задания</b>\n\n"
-        "Управляй своими заданиями:",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
+# Удаление занятия по кнопке
+@callbacks.on("sch:del")
+async def callback_schedule_delete_item(callback: CallbackQuery, item_id, offset="0", *, state: FSMContext):
+    removed = timetable.remove(callback.from_user.id, item_id)
+    await show_pick_screen(callback, state, ItemPick.schedule_delete, int(offset))
+    await callback.answer("🗑️ Занятие удалено" if removed else "Занятие уже удалено")
+
+
+# Очистка расписания
+@callbacks.on("schedule_clear")
+async def callback_schedule_clear(callback: CallbackQuery):
+    user_id = callback.from_user.id
+    timetable.clear(user_id)
+    text, keyboard = render_schedule_delete(user_id)
+    await screens.edit(callback, text, keyboard)
+    await callback.answer("🗑️ Расписание очищено")
+
+
+# Обработчик команды /digest: подписка на утреннюю сводку и отписка
+@dp.message(Command("digest"))
+async def cmd_digest(message: types.Message):
+    user_id = message.from_user.id
+    if not DIGEST_TIME:
+        await message.answer("🌅 Утренняя сводка сейчас не рассылается")
+    elif digest_subscribers.get(user_id):
+        digest_subscribers.clear(user_id)
+        await message.answer("🔕 Утренняя сводка отключена")
+    else:
+        digest_subscribers.replace(user_id, [{"on": True}])
+        await message.answer(
+            f"🌅 Каждый день около {DIGEST_TIME} пришлю расписание на сегодня "
+            "и задания, которые скоро сдавать.\n"
+            "Отключить - снова /digest"
+        )
+
+
+# Экран учебной группы (не кэшируется: число участников меняют чужие действия)
+def render_group(user_id, page=0):
+    key = group_directory.group_of(user_id)
+    info = group_directory.info(key) if key is not None else None
+    if info is None:
+        return (
+            "👥 <b>Группа</b>\n\n"
+            "Ты не состоишь в группе.\n\n"
+            "Чтобы вступить или создать новую, отправь:\n"
+            "<code>/group Название группы</code>\n\n"
+            "Создатель группы ведёт общее расписание, участники видят его "
+            "и могут менять у себя: удалённые и добавленные ими занятия "
+            "остальных не затрагивают."
+        ), button_keyboard("⬅️ Назад к расписанию", "schedule")
+    role = "создатель" if info.get('owner') == user_id else "участник"
+    return (
+        f"👥 <b>Группа {escape(info['name'])}</b>\n\n"
+        f"Ты - {role}\n"
+        f"Участников: {len(group_directory.members(key))}\n"
+        f"Занятий в общем расписании: {len(group_schedule.get(key))}"
+    ), GROUP_KEYBOARD
+
+
+# Обработчик callback для экрана группы
+@callbacks.on("group")
+async def callback_group(callback: CallbackQuery):
+    text, keyboard = render_group(callback.from_user.id)
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
-# Обработчик callback для списка домашних заданий
-@dp.callback_query(F.data == "homework_list")
-async def callback_homework_list(callback: CallbackQuery):
+# Выход из группы
+@callbacks.on("group_leave")
+async def callback_group_leave(callback: CallbackQuery):
     user_id = callback.from_user.id
-    homework = user_homework.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад к заданиям", callback_data="homework")
-    ]])
-    
-    if homework:
-        homework_text = "\n".join([
-            f"{i+1}. 📚 {h['subject']}\n"
-            f"   📝 {h['task']}\n"
-            f"   📅 Дедлайн: {h.get('deadline', 'Не указан')}\n"
-            f"   {'✅ Выполнено' if h.get('done', False) else '⏳ В работе'}\n"
-            for i, h in enumerate(homework)
-        ])
-        await callback.message.edit_text(
-            f"📋 <b>Мои домашние задания</b>\n\n{homework_text}",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+    left = timetable.leave(user_id)
+    text, keyboard = render_group(user_id)
+    await screens.edit(callback, text, keyboard)
+    await callback.answer("🚪 Ты вышел из группы" if left else "Ты не состоишь в группе")
+
+
+# Обработчик команды /group: вступление в группу или её создание
+@dp.message(Command("group"))
+async def cmd_group(message: types.Message):
+    user_id = message.from_user.id
+    name = (message.text or "").partition(" ")[2].strip()
+    if not name:
+        text, keyboard = render_group(user_id)
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+        return
+    if len(name) > 64:
+        await message.answer("❌ Слишком длинное название группы")
+        return
+    key, created = timetable.join(user_id, name)
+    info = group_directory.info(key)
+    if created:
+        text = (
+            f"✅ Группа <b>{escape(info['name'])}</b> создана!\n\n"
+            "Твоё расписание стало общим: новые занятия увидят все участники. "
+            f"Пригласи одногруппников командой <code>/group {escape(info['name'])}</code>"
         )
     else:
-        await callback.message.edit_text(
+        text = (
+            f"✅ Ты вступил в группу <b>{escape(info['name'])}</b>!\n\n"
+            "Теперь в расписании есть занятия группы. Добавленные и удалённые "
+            "тобой занятия меняют только твоё расписание."
+        )
+    await message.answer(text, reply_markup=button_keyboard("📅 Расписание", "schedule"), parse_mode="HTML")
+
+
+# Экран списка домашних заданий
+@render_cache.screen("homework_list", depends=("homework",))
+def render_homework_list(user_id, page=0):
+    homework = user_homework.get(user_id)
+    if not homework:
+        return (
             "📋 <b>Мои домашние задания</b>\n\n"
             "Заданий пока нет! 🎉\n"
             "Добавь задание через кнопку '➕ Добавить задание'",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            button_keyboard("⬅️ Назад к заданиям", "homework")
         )
+    page, homework, nav = paginate(homework, page, "homework_list")
+    keyboard = paged_keyboard(nav, (("⬅️ Назад к заданиям", "homework"),))
+    homework_text = homework_lines(homework, page)
+    return f"📋 <b>Мои домашние задания</b>\n\n{homework_text}", keyboard
+
+
+# Обработчик callback для списка домашних заданий
+@callbacks.on("homework_list")
+async def callback_homework_list(callback: CallbackQuery):
+    text, keyboard = render_homework_list(callback.from_user.id)
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
-# Обработчик callback для добавления домашнего задания
-@dp.callback_query(F.data == "homework_add")
-async def callback_homework_add(callback: CallbackQuery):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="homework")
-    ]])
-    await callback.message.edit_text(
-        "➕ <b>Добавить домашнее задание</b>\n\n"
-        "Отправь информацию в формате:\n"
-        "<code>Предмет | Задание | Дедлайн</code>\n\n"
-        "Пример:\n"
-        "<code>Математика | Решить задачи 1-5 | 25.12.2024</code>\n\n"
-        "Или без дедлайна:\n"
-        "<code>Физика | Подготовить доклад</code>",
-        reply_markup=keyboard,
-        parse_mode="HTML"
+DUE_SOON_DAYS = 7  # "Скоро сдавать" - срок в ближайшие дни
+
+
+# Сколько осталось до срока: "сегодня", "завтра", "через 3 дн.", "просрочено на 2 дн."
+def days_left(due, today):
+    days = (date.fromisoformat(due) - today).days
+    if days < 0:
+        return f"просрочено на {-days} дн."
+    return {0: "сегодня", 1: "завтра"}.get(days, f"через {days} дн.")
+
+
+# Задания по сроку: номер, предмет, задание и сколько осталось
+def deadline_lines(homework, today, start=0):
+    return "\n".join([
+        f"{i+1}. 📚 {escape(h.subject)}\n"
+        f"   📝 {escape(h.task)}\n"
+        f"   📅 {escape(h.get('deadline'))} ({days_left(h.due, today)})\n"
+        for i, h in enumerate(homework, start)
+    ])
+
+
+# Экран заданий по сроку (не кэшируется: зависит от текущей даты)
+def deadline_screen(title, screen, homework, empty, page, today):
+    back = (("⬅️ Назад к заданиям", "homework"),)
+    if not homework:
+        return f"{title}\n\n{empty}", button_keyboard(*back[0])
+    page, homework, nav = paginate(homework, page, screen)
+    return f"{title}\n\n{deadline_lines(homework, today, page)}", paged_keyboard(nav, back)
+
+
+# Экран заданий со сроком в ближайшие DUE_SOON_DAYS дней
+def render_homework_soon(user_id, page=0):
+    today = date.today()
+    homework = deadline_index.between(user_id, today, today + timedelta(days=DUE_SOON_DAYS))
+    return deadline_screen(
+        "⏳ <b>Скоро сдавать</b>", "homework_soon", homework,
+        f"В ближайшие {DUE_SOON_DAYS} дней сдавать нечего! 🎉", page, today
     )
+
+
+# Экран просроченных заданий
+def render_homework_overdue(user_id, page=0):
+    today = date.today()
+    return deadline_screen(
+        "⚠️ <b>Просрочено</b>", "homework_overdue", deadline_index.before(user_id, today),
+        "Просроченных заданий нет! 🎉", page, today
+    )
+
+
+# Обработчик callback для заданий со скорым сроком
+@callbacks.on("homework_soon")
+async def callback_homework_soon(callback: CallbackQuery):
+    text, keyboard = render_homework_soon(callback.from_user.id)
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
-# Обработчик callback для отметки задания выполненным
-@dp.callback_query(F.data == "homework_done")
-async def callback_homework_done(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    homework = user_homework.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="homework")
-    ]])
-    
-    if not homework:
-        await callback.message.edit_text(
-            "✅ <b>Выполнено</b>\n\n"
-            "Заданий нет!",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+# Обработчик callback для просроченных заданий
+@callbacks.on("homework_overdue")
+async def callback_homework_overdue(callback: CallbackQuery):
+    text, keyboard = render_homework_overdue(callback.from_user.id)
+    await screens.edit(callback, text, keyboard)
+    await callback.answer()
+
+
+# Экран отметки выполненных заданий
+@render_cache.screen("homework_done", depends=("homework",))
+def render_homework_done(user_id, page=0):
+    total = undone_index.count(user_id)
+    if not total:
+        return (
+            "✅ <b>Выполнено</b>\n\n" + ("Все задания выполнены! 🎉" if user_homework.get(user_id) else "Заданий нет!"),
+            button_keyboard("⬅️ Назад", "homework")
         )
-    else:
-        undone = [h for h in homework if not h.get('done', False)]
-        if undone:
-            await callback.message.edit_text(
-                "✅ <b>Отметить выполненным</b>\n\n"
-                "Отправь номер задания для отметки.",
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-        else:
-            await callback.message.edit_text(
-                "✅ <b>Выполнено</b>\n\n"
-                "Все задания выполнены! 🎉",
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
+    page, numbered_page, nav = paginate_range(total, partial(undone_index.page, user_id), page, "homework_done")
+    return (
+        "✅ <b>Отметить выполненным</b>\n\n"
+        "Нажми на задание, чтобы отметить его.\n"
+        "Или отправь номер (можно несколько через пробел).",
+        get_items_keyboard(
+            numbered_page, "✅", lambda h: f"{h.subject}: {h.task}",
+            ("hw", "done"), back="homework", nav=nav, offset=page
+        )
+    )
+
+
+# Обработчик callback для отметки задания выполненным
+@callbacks.on("homework_done")
+async def callback_homework_done(callback: CallbackQuery, state: FSMContext):
+    await show_pick_screen(callback, state, ItemPick.homework_done)
     await callback.answer()
 
 
-# Обработчик callback для удаления задания
-@dp.callback_query(F.data == "homework_delete")
-async def callback_homework_delete(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    homework = user_homework.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="homework")
-    ]])
-    
+# Отметка задания выполненным: False, если задания нет
+def mark_homework_done(user_id, item_id):
+    index = user_homework.find(user_id, item_id)
+    if index is None:
+        return False
+    user_homework.update(user_id, index, done=True)
+    return True
+
+
+# Отметка задания выполненным по кнопке
+@callbacks.on("hw:done")
+async def callback_homework_done_item(callback: CallbackQuery, item_id, offset="0", *, state: FSMContext):
+    marked = mark_homework_done(callback.from_user.id, item_id)
+    await show_pick_screen(callback, state, ItemPick.homework_done, int(offset))
+    await callback.answer("✅ Отмечено" if marked else "Задание уже удалено")
+
+
+# Экран удаления заданий
+@render_cache.screen("homework_delete", depends=("homework",))
+def render_homework_delete(user_id, page=0):
+    homework = user_homework.get(user_id)
     if not homework:
-        await callback.message.edit_text(
+        return (
             "🗑️ <b>Удалить задание</b>\n\n"
             "Заданий нет!",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            button_keyboard("⬅️ Назад", "homework")
         )
-    else:
-        await callback.message.edit_text(
-            "🗑️ <b>Удалить задание</b>\n\n"
-            "Отправь номер задания для удаления.\n"
-            "Или отправь: <code>Все</code> для очистки.",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+    page, items, nav = paginate(homework, page, "homework_delete")
+    numbered_page = enumerate(items, page + 1)
+    return (
+        "🗑️ <b>Удалить задание</b>\n\n"
+        "Нажми на задание, чтобы удалить его.\n"
+        "Или нажми «Удалить все» для очистки.\n"
+        "Или отправь номер (можно несколько через пробел).",
+        get_items_keyboard(
+            numbered_page, "🗑️", lambda h: f"{h.subject}: {h.task}",
+            ("hw", "del"), back="homework", clear="homework_clear", nav=nav, offset=page
         )
-    await callback.answer()
+    )
 
 
-# Обработчик callback для заметок
-@dp.callback_query(F.data == "notes")
-async def callback_notes(callback: CallbackQuery):
-    keyboard = get_notes_keyboard()
-    await callback.message.edit_text(
-        "📌 <b>Заметки</b>\n\n"
-        "Сохраняй важную информацию:",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
+# Обработчик callback для удаления задания
+@callbacks.on("homework_delete")
+async def callback_homework_delete(callback: CallbackQuery, state: FSMContext):
+    await show_pick_screen(callback, state, ItemPick.homework_delete)
     await callback.answer()
 
 
-# Обработчик callback для списка заметок
-@dp.callback_query(F.data == "notes_list")
-async def callback_notes_list(callback: CallbackQuery):
+# Удаление записи коллекции по id: False, если её нет
+def delete_item(collection, user_id, item_id):
+    index = collection.find(user_id, item_id)
+    if index is None:
+        return False
+    collection.pop(user_id, index)
+    return True
+
+
+# Удаление задания по кнопке
+@callbacks.on("hw:del")
+async def callback_homework_delete_item(callback: CallbackQuery, item_id, offset="0", *, state: FSMContext):
+    removed = delete_item(user_homework, callback.from_user.id, item_id)
+    await show_pick_screen(callback, state, ItemPick.homework_delete, int(offset))
+    await callback.answer("🗑️ Задание удалено" if removed else "Задание уже удалено")
+
+
+# Очистка заданий
+@callbacks.on("homework_clear")
+async def callback_homework_clear(callback: CallbackQuery):
     user_id = callback.from_user.id
-    notes = user_notes.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад к заметкам", callback_data="notes")
-    ]])
-    
-    if notes:
-        notes_text = "\n".join([
-            f"{i+1}. 📌 {note['title']}\n   {note['text'][:50]}...\n"
-            for i, note in enumerate(notes[:10])  # Показываем первые 10
-        ])
-        await callback.message.edit_text(
-            f"📋 <b>Мои заметки</b>\n\n{notes_text}",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-    else:
-        await callback.message.edit_text(
+    user_homework.clear(user_id)
+    text, keyboard = render_homework_delete(user_id)
+    await screens.edit(callback, text, keyboard)
+    await callback.answer("🗑️ Задания удалены")
+
+
+# Экран списка заметок
+@render_cache.screen("notes_list", depends=("notes",))
+def render_notes_list(user_id, page=0):
+    notes = user_notes.get(user_id)
+    if not notes:
+        return (
             "📋 <b>Мои заметки</b>\n\n"
             "Заметок пока нет!\n"
             "Создай заметку через кнопку '➕ Новая заметка'",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            button_keyboard("⬅️ Назад к заметкам", "notes")
         )
-    await callback.answer()
+    page, notes, nav = paginate(notes, page, "notes_list")
+    keyboard = paged_keyboard(nav, (("⬅️ Назад к заметкам", "notes"),))
+    # В строках только текст пользователя, без разметки - экранируется одним вызовом
+    notes_text = escape("\n".join([
+        f"{i+1}. 📌 {note.title}\n   {note.text[:50]}...\n"
+        for i, note in enumerate(notes, page)
+    ]))
+    return f"📋 <b>Мои заметки</b>\n\n{notes_text}", keyboard
 
 
-# Обработчик callback для добавления заметки
-@dp.callback_query(F.data == "notes_add")
-async def callback_notes_add(callback: CallbackQuery):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="notes")
-    ]])
-    await callback.message.edit_text(
-        "➕ <b>Новая заметка</b>\n\n"
-        "Отправь заметку в формате:\n"
-        "<code>Заголовок | Текст заметки</code>\n\n"
-        "Пример:\n"
-        "<code>Важная формула | E = mc²</code>\n\n"
-        "Или просто текст (первая строка станет заголовком):\n"
-        "<code>Лекция по физике\nСегодня разбирали квантовую механику...</code>",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
+# Обработчик callback для списка заметок
+@callbacks.on("notes_list")
+async def callback_notes_list(callback: CallbackQuery):
+    text, keyboard = render_notes_list(callback.from_user.id)
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
+# Экран напоминаний
+@render_cache.screen("reminders", depends=("reminders",))
+def render_reminders(user_id, page=0):
+    reminders = user_reminders.get(user_id)
+    if not reminders:
+        return "⏰ <b>Напоминания</b>\n\nНапоминаний пока нет!", paged_keyboard((), REMINDERS_BUTTONS_EMPTY)
+    page, reminders, nav = paginate(reminders, page, "reminders")
+    reminders_text = escape("\n".join([
+        f"{i+1}. {'🔔' if r.get('sent') else '⏰'} {r.text}\n   📅 {r.get('date', 'Не указано')}\n"
+        for i, r in enumerate(reminders, page)
+    ]))
+    return f"⏰ <b>Напоминания</b>\n\n{reminders_text}", paged_keyboard(nav, REMINDERS_BUTTONS)
+
+
 # Обработчик callback для напоминаний
-@dp.callback_query(F.data == "reminders")
+@callbacks.on("reminders")
 async def callback_reminders(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    reminders = user_reminders.get(user_id, [])
-    
-    keyboard = InlineKeyboardBuilder()
-    keyboard.add(InlineKeyboardButton(text="➕ Добавить напоминание", callback_data="reminders_add"))
-    if reminders:
-        keyboard.add(InlineKeyboardButton(text="🗑️ Удалить", callback_data="reminders_delete"))
-    keyboard.add(InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu"))
-    keyboard.adjust(1, 1, 1)
-    
-    if reminders:
-        reminders_text = "\n".join([
-            f"{i+1}. ⏰ {r['text']}\n   📅 {r.get('date', 'Не указано')}\n"
-            for i, r in enumerate(reminders)
-        ])
-        text = f"⏰ <b>Напоминания</b>\n\n{reminders_text}"
-    else:
-        text = "⏰ <b>Напоминания</b>\n\nНапоминаний пока нет!"
-    
-    await callback.message.edit_text(
-        text,
-        reply_markup=keyboard.as_markup(),
-        parse_mode="HTML"
-    )
+    text, keyboard = render_reminders(callback.from_user.id)
+    await screens.edit(callback, text, keyboard)
     await callback.answer()
 
 
 # Обработчик callback для поиска заметок
-@dp.callback_query(F.data == "notes_search")
-async def callback_notes_search(callback: CallbackQuery):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="notes")
-    ]])
-    await callback.message.edit_text(
+@callbacks.on("notes_search")
+async def callback_notes_search(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(NotesSearch.query)
+    await screens.edit(
+        callback,
         "🔍 <b>Поиск заметок</b>\n\n"
         "Отправь ключевое слово для поиска:",
-        reply_markup=keyboard,
-        parse_mode="HTML"
+        button_keyboard("⬅️ Назад", "notes")
     )
     await callback.answer()
 
 
-# Обработчик callback для удаления заметки
-@dp.callback_query(F.data == "notes_delete")
-async def callback_notes_delete(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    notes = user_notes.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="notes")
-    ]])
-    
+# Экран удаления заметок
+@render_cache.screen("notes_delete", depends=("notes",))
+def render_notes_delete(user_id, page=0):
+    notes = user_notes.get(user_id)
     if not notes:
-        await callback.message.edit_text(
+        return (
             "🗑️ <b>Удалить заметку</b>\n\n"
             "Заметок нет!",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            button_keyboard("⬅️ Назад", "notes")
         )
-    else:
-        await callback.message.edit_text(
-            "🗑️ <b>Удалить заметку</b>\n\n"
-            "Отправь номер заметки для удаления.\n"
-            "Или отправь: <code>Все</code> для очистки.",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+    page, items, nav = paginate(notes, page, "notes_delete")
+    numbered_page = enumerate(items, page + 1)
+    return (
+        "🗑️ <b>Удалить заметку</b>\n\n"
+        "Нажми на заметку, чтобы удалить её.\n"
+        "Или нажми «Удалить все» для очистки.\n"
+        "Или отправь номер (можно несколько через пробел).",
+        get_items_keyboard(
+            numbered_page, "🗑️", lambda n: n.title,
+            ("note", "del"), back="notes", clear="notes_clear", nav=nav, offset=page
         )
-    await callback.answer()
+    )
 
 
-# Обработчик callback для добавления напоминания
-@dp.callback_query(F.data == "reminders_add")
-async def callback_reminders_add(callback: CallbackQuery):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="reminders")
-    ]])
-    await callback.message.edit_text(
-        "➕ <b>Добавить напоминание</b>\n\n"
-        "Отправь в формате:\n"
-        "<code>Текст напоминания | Дата</code>\n\n"
-        "Пример:\n"
-        "<code>Экзамен по математике | 25.12.2024</code>",
-        reply_markup=keyboard,
-        parse_mode="HTML"
-    )
+# Обработчик callback для удаления заметки
+@callbacks.on("notes_delete")
+async def callback_notes_delete(callback: CallbackQuery, state: FSMContext):
+    await show_pick_screen(callback, state, ItemPick.notes_delete)
     await callback.answer()
 
 
-# Обработчик callback для удаления напоминания
-@dp.callback_query(F.data == "reminders_delete")
-async def callback_reminders_delete(callback: CallbackQuery):
+# Удаление заметки по кнопке
+@callbacks.on("note:del")
+async def callback_notes_delete_item(callback: CallbackQuery, item_id, offset="0", *, state: FSMContext):
+    removed = delete_item(user_notes, callback.from_user.id, item_id)
+    await show_pick_screen(callback, state, ItemPick.notes_delete, int(offset))
+    await callback.answer("🗑️ Заметка удалена" if removed else "Заметка уже удалена")
+
+
+# Очистка заметок
+@callbacks.on("notes_clear")
+async def callback_notes_clear(callback: CallbackQuery):
     user_id = callback.from_user.id
-    reminders = user_reminders.get(user_id, [])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="reminders")
-    ]])
-    
+    user_notes.clear(user_id)
+    text, keyboard = render_notes_delete(user_id)
+    await screens.edit(callback, text, keyboard)
+    await callback.answer("🗑️ Заметки удалены")
+
+
+# Экран удаления напоминаний
+@render_cache.screen("reminders_delete", depends=("reminders",))
+def render_reminders_delete(user_id, page=0):
+    reminders = user_reminders.get(user_id)
     if not reminders:
-        await callback.message.edit_text(
+        return (
             "🗑️ <b>Удалить напоминание</b>\n\n"
             "Напоминаний нет!",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+            button_keyboard("⬅️ Назад", "reminders")
         )
-    else:
-        await callback.message.edit_text(
-            "🗑️ <b>Удалить напоминание</b>\n\n"
-            "Отправь номер напоминания для удаления.\n"
-            "Или отправь: <code>Все</code> для очистки.",
-            reply_markup=keyboard,
-            parse_mode="HTML"
+    page, items, nav = paginate(reminders, page, "reminders_delete")
+    numbered_page = enumerate(items, page + 1)
+    return (
+        "🗑️ <b>Удалить напоминание</b>\n\n"
+        "Нажми на напоминание, чтобы удалить его.\n"
+        "Или нажми «Удалить все» для очистки.\n"
+        "Или отправь номер (можно несколько через пробел).",
+        get_items_keyboard(
+            numbered_page, "🗑️", lambda r: f"{r.text} ({r.get('date', '')})",
+            ("rem", "del"), back="reminders", clear="reminders_clear", nav=nav, offset=page
         )
+    )
+
+
+# Обработчик callback для удаления напоминания
+@callbacks.on("reminders_delete")
+async def callback_reminders_delete(callback: CallbackQuery, state: FSMContext):
+    await show_pick_screen(callback, state, ItemPick.reminders_delete)
     await callback.answer()
 
 
+# Удаление напоминания вместе с его таймером: False, если его нет
+def delete_reminder(user_id, item_id):
+    if not delete_item(user_reminders, user_id, item_id):
+        return False
+    reminder_scheduler.cancel((user_id, item_id))
+    return True
+
+
+# Удаление напоминания по кнопке
+@callbacks.on("rem:del")
+async def callback_reminders_delete_item(callback: CallbackQuery, item_id, offset="0", *, state: FSMContext):
+    removed = delete_reminder(callback.from_user.id, item_id)
+    await show_pick_screen(callback, state, ItemPick.reminders_delete, int(offset))
+    await callback.answer("🗑️ Напоминание удалено" if removed else "Напоминание уже удалено")
+
+
+# Очистка напоминаний
+@callbacks.on("reminders_clear")
+async def callback_reminders_clear(callback: CallbackQuery):
+    user_id = callback.from_user.id
+    for r in user_reminders.get(user_id):
+        reminder_scheduler.cancel((user_id, r.get('id')))
+    user_reminders.clear(user_id)
+    text, keyboard = render_reminders_delete(user_id)
+    await screens.edit(callback, text, keyboard)
+    await callback.answer("🗑️ Напоминания удалены")
+
+
 # Обработчик callback для полезных ссылок
-@dp.callback_query(F.data == "links")
+@callbacks.on("links")
 async def callback_links(callback: CallbackQuery):
     try:
-        keyboard = get_links_keyboard()
-        await callback.message.edit_text(
-            "📚 <b>Полезные ссылки</b>\n\n"
-            "Быстрый доступ к важным ресурсам:",
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
+        await screens.edit(callback, LINKS_TEXT, LINKS_KEYBOARD)
         await callback.answer()
     except Exception as e:
         logger.error(f"Ошибка в callback_links: {e}", exc_info=True)
         # Попробуем отправить новое сообщение вместо редактирования
         try:
-            keyboard = get_links_keyboard()
             await callback.message.answer(
-                "📚 <b>Полезные ссылки</b>\n\n"
-                "Быстрый доступ к важным ресурсам:",
-                reply_markup=keyboard,
+                LINKS_TEXT,
+                reply_markup=LINKS_KEYBOARD,
                 parse_mode="HTML"
             )
             await callback.answer()
@@ -684,148 +1138,217 @@ async def callback_links(callback: CallbackQuery):
             await callback.answer("Произошла ошибка", show_alert=True)
 
 
-# Обработчик callback для информации о боте
-@dp.callback_query(F.data == "about")
-async def callback_about(callback: CallbackQuery):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="⬅️ Назад", callback_data="main_menu")
-    ]])
-    await callback.message.edit_text(
-        "ℹ️ <b>О боте</b>\n\n"
-        "🎓 Бот-помощник для студентов колледжа\n\n"
-        "<b>Возможности:</b>\n"
-        "• 📅 Управление расписанием\n"
-        "• 📝 Отслеживание домашних заданий\n"
-        "• 📌 Сохранение заметок\n"
-        "• ⏰ Напоминания о важных событиях\n"
-        "• 📚 Полезные ссылки\n\n"
-        "<b>Версия:</b> 1.0\n"
-        "<b>Разработчик:</b> Гриськов Артем 2исп2\n\n"
-        "Используй /help для списка команд",
-        reply_markup=keyboard,
-        parse_mode="HTML"
+# Переход по страницам списка: page:<экран>:<смещение>
+def page_handler(render):
+    async def handler(callback: CallbackQuery, offset):
+        text, keyboard = render(callback.from_user.id, int(offset))
+        await screens.edit(callback, text, keyboard)
+        await callback.answer()
+    return handler
+
+
+for screen, render in {
+    "schedule_week": render_schedule_week,
+    "homework_list": render_homework_list,
+    "homework_soon": render_homework_soon,
+    "homework_overdue": render_homework_overdue,
+    "notes_list": render_notes_list,
+    "reminders": render_reminders,
+}.items():
+    callbacks.on(pack("page", screen))(page_handler(render))
+
+
+# Экраны, где можно отправить номера записей:
+# состояние -> (экран, отрисовка, записи пользователя, действие по id, итог)
+PICK_SCREENS = {
+    ItemPick.schedule_delete.state: (
+        "schedule_delete", render_schedule_delete, timetable.entries, timetable.remove, "🗑️ Удалено занятий"
+    ),
+    ItemPick.homework_done.state: (
+        "homework_done", render_homework_done, user_homework.get, mark_homework_done, "✅ Отмечено заданий"
+    ),
+    ItemPick.homework_delete.state: (
+        "homework_delete", render_homework_delete, user_homework.get,
+        lambda user_id, item_id: delete_item(user_homework, user_id, item_id), "🗑️ Удалено заданий"
+    ),
+    ItemPick.notes_delete.state: (
+        "notes_delete", render_notes_delete, user_notes.get,
+        lambda user_id, item_id: delete_item(user_notes, user_id, item_id), "🗑️ Удалено заметок"
+    ),
+    ItemPick.reminders_delete.state: (
+        "reminders_delete", render_reminders_delete, user_reminders.get, delete_reminder, "🗑️ Удалено напоминаний"
+    ),
+}
+
+
+# Экран удаления или отметки; пока он открыт, номера записей можно отправить сообщением
+async def show_pick_screen(callback: CallbackQuery, state: FSMContext, pick, offset=0):
+    render = PICK_SCREENS[pick.state][1]
+    text, keyboard = render(callback.from_user.id, offset)
+    await screens.edit(callback, text, keyboard)
+    await state.set_state(pick)
+    await state.set_data({"offset": offset})
+
+
+# Переход по страницам экрана удаления или отметки (с ожиданием номеров)
+def pick_page_handler(pick):
+    async def handler(callback: CallbackQuery, offset, *, state: FSMContext):
+        await show_pick_screen(callback, state, pick, int(offset))
+        await callback.answer()
+    return handler
+
+
+for pick in ItemPick.__states__:
+    callbacks.on(pack("page", PICK_SCREENS[pick.state][0]))(pick_page_handler(pick))
+
+
+# Все нажатия кнопок идут через таблицу обработчиков
+@dp.callback_query()
+async def handle_callback(callback: CallbackQuery, state: FSMContext, **kwargs):
+    # Любая кнопка завершает начатый ввод (поиск, номера записей);
+    # экраны, которые ждут ввода, ставят состояние заново
+    if await state.get_state() is not None:
+        await state.clear()
+    await callbacks.dispatch(callback, state=state, **kwargs)
+
+
+# Обработчик поискового запроса по заметкам
+@dp.message(NotesSearch.query, F.text)
+async def handle_notes_search(message: types.Message, state: FSMContext):
+    await state.clear()
+    query = message.text.strip()
+    found = note_search.search(message.from_user.id, query)
+    
+    keyboard = NOTES_SEARCH_KEYBOARD
+    
+    if found:
+        notes_text = "\n".join([
+            f"{i+1}. 📌 {escape(note.title)}\n   {escape(note.text[:50])}...\n"
+            for i, note in enumerate(found)
+        ])
+        await message.answer(
+            f"🔍 <b>Найдено по запросу «{escape(query)}»</b>\n\n{notes_text}",
+            reply_markup=keyboard,
+            parse_mode="HTML"
+        )
+    else:
+        await message.answer(
+            f"🔍 По запросу «{query}» ничего не найдено.",
+            reply_markup=keyboard
+        )
+
+
+# Номера записей, отправленные на экране удаления или отметки
+@dp.message(StateFilter(ItemPick), F.text.regexp(r"^\s*\d+(?:[\s,]+\d+)*\s*$"))
+async def handle_item_numbers(message: types.Message, state: FSMContext):
+    user_id = message.from_user.id
+    _, render, get_items, action, done = PICK_SCREENS[await state.get_state()]
+    items = get_items(user_id)
+    numbers = sorted({int(n) for n in re.findall(r"\d+", message.text)})
+    # id собираются заранее: после удаления номера остальных записей сдвигаются
+    ids = [items[n - 1].id for n in numbers if 1 <= n <= len(items)]
+    changed = sum(action(user_id, item_id) for item_id in ids)
+    text, keyboard = render(user_id, (await state.get_data()).get("offset", 0))
+    summary = f"{done}: {changed}" if changed else "⚠️ Записей с такими номерами нет"
+    await message.answer(f"{summary}\n\n{text}", reply_markup=keyboard, parse_mode="HTML")
+
+
+# Добавление занятия в расписание
+async def add_schedule_entry(message: types.Message, fields):
+    timetable.add(message.from_user.id, {"id": new_id(), **fields})
+    await message.answer(
+        f"✅ Занятие добавлено!\n\n"
+        f"📅 {fields['day']}\n"
+        f"🕐 {fields['time']}\n"
+        f"📚 {fields['subject']}\n"
+        f"📍 {fields['room']}",
+        reply_markup=button_keyboard("📅 Расписание", "schedule")
     )
-    await callback.answer()
+
+
+# Добавление напоминания
+async def add_reminder(message: types.Message, fields):
+    when = fields['when']
+    if when <= datetime.now():
+        await message.answer("⚠️ Эта дата уже прошла. Укажи дату в будущем.")
+        return
+    user_id = message.from_user.id
+    reminder = user_reminders.add(user_id, {
+        "id": new_id(),
+        "text": fields['text'],
+        "date": fields['date'],
+        "at": when.timestamp(),
+        "sent": False
+    })
+    schedule_reminder(message.bot, user_id, reminder)
+    
+    await message.answer(
+        f"✅ Напоминание добавлено!\n\n"
+        f"⏰ {fields['text']}\n"
+        f"📅 {when.strftime('%d.%m.%Y %H:%M')}",
+        reply_markup=button_keyboard("⏰ Напоминания", "reminders")
+    )
+
+
+# Добавление домашнего задания
+async def add_homework(message: types.Message, fields):
+    user_homework.add(message.from_user.id, {
+        "id": new_id(),
+        "subject": fields['subject'],
+        "task": fields['task'],
+        "deadline": fields['deadline'],
+        "due": parse_deadline(fields['deadline']),
+        "done": False
+    })
+    await message.answer(
+        f"✅ Задание добавлено!\n\n"
+        f"📚 {fields['subject']}\n"
+        f"📝 {fields['task']}\n"
+        f"📅 Дедлайн: {fields['deadline']}",
+        reply_markup=button_keyboard("📝 Задания", "homework")
+    )
+
+
+# Сохранение заметки
+async def add_note(message: types.Message, fields):
+    user_notes.add(message.from_user.id, {
+        "id": new_id(),
+        "title": fields['title'],
+        "text": fields['text']
+    })
+    await message.answer(
+        f"✅ Заметка сохранена!\n\n"
+        f"📌 {fields['title']}\n"
+        f"{fields['text'][:100]}...",
+        reply_markup=button_keyboard("📌 Заметки", "notes")
+    )
+
+
+# Обработчики распознанных сообщений по типу
+INTENT_HANDLERS = {
+    "schedule": add_schedule_entry,
+    "reminder": add_reminder,
+    "homework": add_homework,
+    "note": add_note,
+}
 
 
 # Обработчик текстовых сообщений для добавления данных
 @dp.message(F.text)
-async def handle_text(message: types.Message):
+async def handle_text(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    text = message.text.strip()
-    
-    # Проверяем, добавляется ли расписание
-    if "|" in text and any(word in text.lower() for word in ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье", "пн", "вт", "ср", "чт", "пт", "сб", "вс"]):
-        try:
-            parts = [p.strip() for p in text.split("|")]
-            if len(parts) >= 3:
-                day = parts[0]
-                time = parts[1]
-                subject = parts[2]
-                room = parts[3] if len(parts) > 3 else "Не указана"
-                
-                # Нормализуем день недели
-                day_map = {
-                    "пн": "Понедельник", "понедельник": "Понедельник",
-                    "вт": "Вторник", "вторник": "Вторник",
-                    "ср": "Среда", "среда": "Среда",
-                    "чт": "Четверг", "четверг": "Четверг",
-                    "пт": "Пятница", "пятница": "Пятница",
-                    "сб": "Суббота", "суббота": "Суббота",
-                    "вс": "Воскресенье", "воскресенье": "Воскресенье"
-                }
-                day = day_map.get(day.lower(), day)
-                
-                if user_id not in user_schedule:
-                    user_schedule[user_id] = []
-                
-                user_schedule[user_id].append({
-                    "day": day,
-                    "time": time,
-                    "subject": subject,
-                    "room": room
-                })
-                
-                await message.answer(
-                    f"✅ Занятие добавлено!\n\n"
-                    f"📅 {day}\n"
-                    f"🕐 {time}\n"
-                    f"📚 {subject}\n"
-                    f"📍 {room}",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
-                        InlineKeyboardButton(text="📅 Расписание", callback_data="schedule")
-                    ]])
-                )
-                return
-        except Exception as e:
-            pass
+    # Не номер на экране удаления - значит, пользователь ушёл с него
+    if await state.get_state() is not None:
+        await state.clear()
+    intent = parse_message(message.text, user_subjects(user_id))
     
-    # Проверяем, добавляется ли домашнее задание
-    if "|" in text and any(word in text.lower() for word in ["математика", "физика", "химия", "история", "литература", "английский", "русский"]):
-        try:
-            parts = [p.strip() for p in text.split("|")]
-            if len(parts) >= 2:
-                subject = parts[0]
-                task = parts[1]
-                deadline = parts[2] if len(parts) > 2 else "Не указан"
-                
-                if user_id not in user_homework:
-                    user_homework[user_id] = []
-                
-                user_homework[user_id].append({
-                    "subject": subject,
-                    "task": task,
-                    "deadline": deadline,
-                    "done": False
-                })
-                
-                await message.answer(
-                    f"✅ Задание добавлено!\n\n"
-                    f"📚 {subject}\n"
-                    f"📝 {task}\n"
-                    f"📅 Дедлайн: {deadline}",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
-                        InlineKeyboardButton(text="📝 Задания", callback_data="homework")
-                    ]])
-                )
-                return
-        except Exception as e:
-            pass
-    
-    # Проверяем, добавляется ли заметка
-    if "|" in text or "\n" in text:
-        try:
-            if "|" in text:
-                parts = text.split("|", 1)
-                title = parts[0].strip()
-                note_text = parts[1].strip() if len(parts) > 1 else ""
-            else:
-                lines = text.split("\n", 1)
-                title = lines[0].strip()
-                note_text = lines[1].strip() if len(lines) > 1 else title
-            
-            if user_id not in user_notes:
-                user_notes[user_id] = []
-            
-            user_notes[user_id].append({
-                "title": title,
-                "text": note_text
-            })
-            
-            await message.answer(
-                f"✅ Заметка сохранена!\n\n"
-                f"📌 {title}\n"
-                f"{note_text[:100]}...",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
-                    InlineKeyboardButton(text="📌 Заметки", callback_data="notes")
-                ]])
-            )
-            return
-        except Exception as e:
-            pass
+    handler = INTENT_HANDLERS.get(intent.kind)
+    if handler is not None:
+        await handler(message, intent.fields)
+        return
     
     # Если не распознано, показываем главное меню
-    keyboard = get_main_menu()
+    keyboard = MAIN_MENU
     await message.answer(
         "Не понял команду. Используй кнопки меню или команду /start",
         reply_markup=keyboard
@@ -0,0 +1,68 @@
+"""
+Диспетчеризация callback-кнопок через таблицу: O(1) на нажатие
+"""
+import logging
+
+from aiogram.dispatcher.event.handler import HandlerObject
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = ":"
+
+
+def pack(*parts):
+    """Сборка callback_data с параметрами: pack("note", "del", 3) -> "note:del:3" """
+    data = SEPARATOR.join(str(p) for p in parts)
+    if len(data.encode()) > 64:
+        raise ValueError(f"callback_data длиннее 64 байт: {data}")
+    return data
+
+
+class CallbackRouter:
+    """
+    Таблица обработчиков callback_data.
+    Точные значения ("notes_list") ищутся целиком, параметризованные
+    ("note:del:3") - по первым двум частям, остальные части
+    передаются обработчику как аргументы
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def on(self, key):
+        """Декоратор регистрации обработчика для callback_data или префикса "ns:action" """
+        def decorator(func):
+            if key in self._handlers:
+                raise ValueError(f"Обработчик для {key!r} уже зарегистрирован")
+            self._handlers[key] = HandlerObject(callback=func)
+            return func
+        return decorator
+
+    def resolve(self, data):
+        """(обработчик, аргументы) или (None, ()) для неизвестных данных"""
+        handler = self._handlers.get(data)
+        if handler is not None:
+            return handler, ()
+        parts = data.split(SEPARATOR)
+        if len(parts) > 2:
+            handler = self._handlers.get(parts[0] + SEPARATOR + parts[1])
+            if handler is not None:
+                return handler, tuple(parts[2:])
+        return None, ()
+
+    def key(self, data):
+        """Ключ таблицы, под который попадает callback_data, или None"""
+        if data in self._handlers:
+            return data
+        parts = data.split(SEPARATOR, 2)
+        if len(parts) > 2 and parts[0] + SEPARATOR + parts[1] in self._handlers:
+            return parts[0] + SEPARATOR + parts[1]
+        return None
+
+    async def dispatch(self, callback, **kwargs):
+        handler, args = self.resolve(callback.data or "")
+        if handler is None:
+            logger.warning(f"Неизвестный callback_data: {callback.data!r}")
+            await callback.answer()
+            return
+        await handler.call(callback, *args, **kwargs)
@@ -0,0 +1,179 @@
+"""
+Индекс сроков домашних заданий: по каждому пользователю и общий,
+отсортированные по дате. В индексе только невыполненные задания
+с распознанным сроком; выборка по диапазону дат - бинарным поиском.
+Отдельно - номера невыполненных заданий для постраничного экрана отметки
+"""
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+
+from scheduler import parse_reminder_date
+
+_due = itemgetter(0)
+
+
+def parse_deadline(text, now=None):
+    """Срок задания в виде ISO-даты ("2024-12-25") или None ("Не указан" и т.п.)"""
+    when = parse_reminder_date(text or "", now)
+    return when.date().isoformat() if when is not None else None
+
+
+def due_entry(item):
+    """Запись выжимки сроков (storage.Projection) для задания: {"id", "due"} или None"""
+    due = item.get('due')
+    if due is None or item.get('done', False) or 'id' not in item:
+        return None
+    return {"id": item['id'], "due": due}
+
+
+def _iso(day):
+    return day if isinstance(day, str) else day.isoformat()
+
+
+class DeadlineIndex:
+    """
+    Задания по сроку: общий список [(срок, user_id, id)], отсортированный
+    для выборки бинарным поиском, и сроки каждого пользователя, которые
+    сортируются при первом обращении к ним. Строится по невыгружаемой
+    коллекции сроков dues (user_id -> [{"id", "due"}], выжимка заданий -
+    due_entry), поэтому не читает задания с диска; сами задания берутся
+    из homework при выборке. Поддерживается по событиям dues
+    """
+
+    def __init__(self, homework, dues):
+        self.homework = homework
+        self.dues = dues
+        self._dues = None     # user_id -> {id: срок}
+        self._all = []
+        self._sorted = {}     # user_id -> [(срок, id)]
+        dues.subscribe(self._on_change)
+
+    def __len__(self):
+        return len(self.build())
+
+    def build(self):
+        """Построить индекс, если ещё не построен; общий список сроков"""
+        if self._dues is None:
+            dues = {}
+            entries = []
+            for user_id, items in self.dues.items():
+                if items:
+                    dues[user_id] = {item['id']: item['due'] for item in items}
+                    entries += [(item['due'], user_id, item['id']) for item in items]
+            entries.sort()
+            self._all = entries
+            self._dues = dues
+        return self._all
+
+    def _insert(self, user_id, item_id, due):
+        self._dues.setdefault(user_id, {})[item_id] = due
+        insort(self._all, (due, user_id, item_id))
+
+    def _remove(self, user_id, item_id):
+        user = self._dues.get(user_id)
+        due = user.pop(item_id, None) if user else None
+        if due is None:
+            return
+        if not user:
+            del self._dues[user_id]
+        i = bisect_left(self._all, (due, user_id, item_id))
+        if i < len(self._all) and self._all[i] == (due, user_id, item_id):
+            del self._all[i]
+
+    def _on_change(self, event, user_id, item):
+        if self._dues is None:
+            return
+        self._sorted.pop(user_id, None)
+        if event in ("add", "remove", "update"):
+            self._remove(user_id, item['id'])
+            if event != "remove":
+                self._insert(user_id, item['id'], item['due'])
+            return
+        # Очистка или замена сроков пользователя - пересобираем его
+        for item_id in list(self._dues.get(user_id, ())):
+            self._remove(user_id, item_id)
+        for entry in self.dues.get(user_id):
+            self._insert(user_id, entry['id'], entry['due'])
+
+    def _user(self, user_id):
+        self.build()
+        entries = self._sorted.get(user_id)
+        if entries is None:
+            entries = self._sorted[user_id] = sorted(
+                (due, item_id) for item_id, due in self._dues.get(user_id, {}).items()
+            )
+        return entries
+
+    def _items(self, user_id, entries):
+        """Задания по парам (срок, id) в том же порядке"""
+        if not entries:
+            return []
+        by_id = {item.get('id'): item for item in self.homework.get(user_id)}
+        return [by_id[item_id] for _, item_id in entries if item_id in by_id]
+
+    def between(self, user_id, start, end):
+        """Задания пользователя со сроком от start до end включительно"""
+        entries = self._user(user_id)
+        lo = bisect_left(entries, _iso(start), key=_due)
+        hi = bisect_right(entries, _iso(end), key=_due)
+        return self._items(user_id, entries[lo:hi])
+
+    def before(self, user_id, day):
+        """Задания пользователя со сроком раньше day (просроченные)"""
+        entries = self._user(user_id)
+        hi = bisect_left(entries, _iso(day), key=_due)
+        return self._items(user_id, entries[:hi])
+
+    def until(self, user_id, day):
+        """Задания пользователя со сроком не позже day, включая просроченные"""
+        entries = self._user(user_id)
+        hi = bisect_right(entries, _iso(day), key=_due)
+        return self._items(user_id, entries[:hi])
+
+    def users_between(self, start, end):
+        """Пользователи, у которых есть задания со сроком от start до end"""
+        entries = self.build()
+        lo = bisect_left(entries, _iso(start), key=_due)
+        hi = bisect_right(entries, _iso(end), key=_due)
+        return list(dict.fromkeys(user_id for _, user_id, _ in entries[lo:hi]))
+
+
+class UndoneIndex:
+    """
+    Номера невыполненных заданий пользователя (позиции в его списке по порядку),
+    чтобы страница экрана отметки собиралась без просмотра всех заданий.
+    Строится при первом обращении; добавление дописывает номер, остальные
+    изменения сбрасывают пользователя, и индекс строится заново
+    """
+
+    def __init__(self, homework):
+        self.homework = homework
+        self._users = {}  # user_id -> [позиции невыполненных]
+        homework.subscribe(self._on_change)
+
+    def _user(self, user_id):
+        positions = self._users.get(user_id)
+        if positions is None:
+            positions = self._users[user_id] = [
+                i for i, item in enumerate(self.homework.get(user_id)) if not item.get('done', False)
+            ]
+        return positions
+
+    def count(self, user_id):
+        return len(self._user(user_id))
+
+    def page(self, user_id, offset, size):
+        """Пары (номер с 1, задание) невыполненных заданий с offset по offset + size"""
+        items = self.homework.get(user_id)
+        return [(i + 1, items[i]) for i in self._user(user_id)[offset:offset + size]]
+
+    def _on_change(self, event, user_id, item):
+        positions = self._users.get(user_id)
+        if positions is None:
+            return
+        if event == "add":
+            if not item.get('done', False):
+                positions.append(len(self.homework.get(user_id)) - 1)
+        else:
+            # Номера сдвинулись, отметка изменилась или записи выгружены
+            del self._users[user_id]
@@ -0,0 +1,94 @@
+"""
+Отсев повторно доставленных обновлений по update_id
+"""
+from collections import deque
+from itertools import islice
+
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+
+class UpdateDeduplicator:
+    """
+    Окно последних size обновлений: кольцевой буфер для вытеснения
+    старых id и множество для проверки за O(1).
+    Окно можно сохранять в коллекцию хранилища, чтобы пережить перезапуск:
+    там оно лежит кусками по save_every id, и каждое сохранение дописывает
+    только новые id и убирает самые старые куски
+    """
+
+    def __init__(self, size=10000, collection=None, save_every=100):
+        self.size = size
+        self.collection = collection
+        self.save_every = save_every
+        self._ring = deque()
+        self._ids = set()
+        self._unsaved = 0
+        self.duplicates = 0
+
+    def load(self):
+        """Восстановление окна из хранилища"""
+        if self.collection is None:
+            return
+        stored = self.collection.get(0)
+        if stored and not isinstance(stored[0], list):
+            # Окно, сохранённое одним списком id, - переводим в куски
+            self.collection.replace(0, [stored[-self.size:]])
+            stored = self.collection.get(0)
+        ids = [update_id for chunk in stored for update_id in chunk]
+        for update_id in ids[-self.size:]:
+            self._remember(update_id)
+
+    def save(self):
+        """Дописать в хранилище id, принятые после прошлого сохранения"""
+        if self.collection is None or not self._unsaved:
+            return
+        new = list(islice(reversed(self._ring), min(self._unsaved, self.size)))
+        new.reverse()
+        self.collection.add(0, new)
+        chunks = self.collection.get(0)
+        stored = sum(len(chunk) for chunk in chunks)
+        while stored - len(chunks[0]) >= self.size:
+            stored -= len(chunks[0])
+            self.collection.pop(0, 0)
+        self._unsaved = 0
+
+    def _remember(self, update_id):
+        if len(self._ring) >= self.size:
+            self._ids.discard(self._ring.popleft())
+        self._ring.append(update_id)
+        self._ids.add(update_id)
+
+    def __contains__(self, update_id):
+        return update_id in self._ids
+
+    def seen(self, update_id):
+        """True для уже виденного update_id; новый id запоминается"""
+        if update_id in self._ids:
+            self.duplicates += 1
+            return True
+        self._remember(update_id)
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+        return False
+
+
+class DedupRequestHandler(SimpleRequestHandler):
+    """
+    Webhook без очереди: повтор уже виденного update_id подтверждается
+    прямо в обработчике запроса, не доходя до диспетчера и его middleware
+    """
+
+    def __init__(self, dedup, **kwargs):
+        super().__init__(**kwargs)
+        self.dedup = dedup
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            update_id = (await request.json()).get("update_id")
+        except Exception:
+            update_id = None  # разберётся обработчик aiogram
+        if isinstance(update_id, int) and self.dedup.seen(update_id):
+            return web.Response()
+        return await super().handle(request)
@@ -0,0 +1,78 @@
+"""
+Утренняя сводка: расписание на сегодня и задания с близким дедлайном.
+Общая часть (расписание группы) отрисовывается один раз на группу,
+личная добавка - только у тех, у кого она есть, а одинаковые сводки
+собираются один раз. Отправка растянута на окно рассылки
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def next_run(at, now=None):
+    """Ближайшее время рассылки at ("07:00") после now"""
+    now = now or datetime.now()
+    hour, _, minute = at.partition(":")
+    when = now.replace(hour=int(hour), minute=int(minute or 0), second=0, microsecond=0)
+    if when <= now:
+        when += timedelta(days=1)
+    return when
+
+
+def build_digests(users, shared_key, render_shared, render_personal, compose):
+    """
+    Тексты сводок: [(user_id, текст)].
+    shared_key(user_id) - ключ общей части (группа или None);
+    render_shared(ключ) вызывается один раз на ключ;
+    render_personal(user_id) - личная добавка (хешируемая) или None;
+    compose(общая часть, добавка) вызывается один раз на различное содержимое
+    и возвращает None, если присылать нечего
+    """
+    shared = {}
+    texts = {}
+    plan = []
+    for user_id in users:
+        key = shared_key(user_id)
+        if key not in shared:
+            shared[key] = render_shared(key)
+        content = (key, render_personal(user_id))
+        if content not in texts:
+            texts[content] = compose(shared[key], content[1])
+        text = texts[content]
+        if text:
+            plan.append((user_id, text))
+    logger.info(f"Сводки: {len(plan)} получателей, {len(shared)} общих частей, {len(texts)} разных текстов")
+    return plan
+
+
+async def deliver(plan, send, window, max_step=1.0):
+    """
+    Отправить сводки, равномерно распределив их по окну window секунд
+    (но не реже одной в max_step секунд - небольшая рассылка уходит сразу).
+    send(user_id, текст) - корутина; её ошибки записываются в лог
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    step = min(window / len(plan), max_step) if plan else 0
+    tasks = set()
+    sent = 0
+
+    async def one(user_id, text):
+        nonlocal sent
+        try:
+            await send(user_id, text)
+            sent += 1
+        except Exception as e:
+            logger.warning(f"Сводка для {user_id} не отправлена: {e}")
+
+    for i, (user_id, text) in enumerate(plan):
+        delay = start + i * step - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(one(user_id, text))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+    return sent
@@ -0,0 +1,142 @@
+"""
+Хранилище состояний FSM aiogram: LRU-кэш в памяти процесса поверх коллекции
+хранилища бота (storage.py). Состояние сохраняется на диск вместе с остальными
+данными и переживает перезапуск, а чтение состояния на каждое обновление -
+поиск в словаре. Состояние живёт ttl секунд с последнего изменения,
+чтобы брошенные диалоги не копились: сроки всех состояний хранятся
+выжимкой (storage.Projection, expiry_entry), по которой очистка находит
+пользователей с просроченными состояниями. Коллекция состояний не должна
+быть выгружаемой: aiogram читает состояние до загрузки данных пользователя,
+и чтение с диска шло бы в цикле событий
+"""
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+_MISSING = object()
+
+
+def _record_key(key):
+    """Ключ записи среди записей пользователя: всё, кроме user_id"""
+    return (
+        f"{key.bot_id}:{key.chat_id}:{key.thread_id or ''}:"
+        f"{getattr(key, 'business_connection_id', None) or ''}:{key.destiny}"
+    )
+
+
+def expiry_entry(item):
+    """Запись выжимки сроков состояний: {"key", "expires"}"""
+    return {"key": item['key'], "expires": item['expires']}
+
+
+class CollectionFSMStorage(BaseStorage):
+    """
+    FSM-хранилище на коллекции collection: user_id -> [{"key", "state", "data", "expires"}].
+    expiries - невыгружаемая выжимка сроков этой коллекции (user_id -> [{"key", "expires"}]).
+    В LRU-кэше до max_size ключей: (состояние, данные, срок) или None, если записи нет
+    """
+
+    def __init__(self, collection, expiries, max_size=10000, ttl=3600):
+        self.collection = collection
+        self.expiries = expiries
+        self.max_size = max_size
+        self.ttl = ttl
+        self._cache = OrderedDict()  # StorageKey -> (state, data, expires) или None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _find(self, key):
+        """Индекс записи ключа в коллекции или None"""
+        record_key = _record_key(key)
+        for i, item in enumerate(self.collection.get(key.user_id)):
+            if item['key'] == record_key:
+                return i
+        return None
+
+    def _remember(self, key, entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def _entry(self, key):
+        entry = self._cache.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            index = self._find(key)
+            if index is None:
+                entry = None
+            else:
+                item = self.collection.get(key.user_id)[index]
+                entry = (item['state'], item['data'], item['expires'])
+            self._remember(key, entry)
+        else:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        if entry is not None and entry[2] < time.time():
+            self.expired += 1
+            self._write(key, None, {})
+            return None
+        return entry
+
+    def _write(self, key, state, data):
+        index = self._find(key)
+        if state is None and not data:
+            if index is not None:
+                self.collection.pop(key.user_id, index)
+            self._remember(key, None)
+            return
+        expires = time.time() + self.ttl
+        data = dict(data)
+        if index is None:
+            self.collection.add(key.user_id, {
+                "key": _record_key(key), "state": state, "data": data, "expires": expires
+            })
+        else:
+            self.collection.update(key.user_id, index, state=state, data=data, expires=expires)
+        self._remember(key, (state, data, expires))
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        entry = self._entry(key)
+        self._write(key, state, entry[1] if entry is not None else {})
+
+    async def get_state(self, key):
+        entry = self._entry(key)
+        return entry[0] if entry is not None else None
+
+    async def set_data(self, key, data):
+        entry = self._entry(key)
+        self._write(key, entry[0] if entry is not None else None, data)
+
+    async def get_data(self, key):
+        entry = self._entry(key)
+        return dict(entry[1]) if entry is not None else {}
+
+    async def sweep(self):
+        """Удалить просроченные состояния всех пользователей, в том числе выгруженных; сколько удалено"""
+        now = time.time()
+        users = [
+            user_id for user_id, entries in self.expiries.items()
+            if any(entry['expires'] < now for entry in entries)
+        ]
+        # Состояния этих пользователей - в память одним чтением в потоке
+        await self.collection.storage.load_users(users)
+        removed = 0
+        for user_id in users:
+            items = self.collection.get(user_id)
+            for i in range(len(items) - 1, -1, -1):
+                if items[i]['expires'] < now:
+                    self.collection.pop(user_id, i)
+                    removed += 1
+        for key in [key for key, entry in self._cache.items() if entry is not None and entry[2] < now]:
+            self._cache[key] = None
+        self.expired += removed
+        return removed
+
+    async def close(self):
+        """Состояния сохраняет хранилище коллекции"""
+        pass
@@ -0,0 +1,267 @@
+"""
+Учебные группы: общее расписание группы и личные изменения поверх него.
+Занятия группы хранятся один раз; у участника - только его личные
+занятия и id скрытых им занятий группы (копирование при записи)
+"""
+from heapq import merge
+from itertools import islice
+
+from schedule import WEEKDAY_NAMES, sort_key
+
+
+_DAY_ORDER = {day: i for i, day in enumerate(WEEKDAY_NAMES)}
+
+
+def group_key(name):
+    """Ключ группы по названию: "2ИСП2 " -> "2исп2" """
+    return "".join(name.split()).casefold().replace("ё", "е")
+
+
+class GroupDirectory:
+    """
+    Группы и их участники.
+    groups: ключ группы -> [{"name": название, "owner": id создателя}]
+    membership: user_id -> [{"group": ключ группы}]
+    """
+
+    def __init__(self, groups, membership):
+        self.groups = groups
+        self.membership = membership
+        self._members = None  # ключ группы -> set(user_id), строится при первом обращении
+
+    def group_of(self, user_id):
+        """Ключ группы пользователя или None"""
+        entries = self.membership.get(user_id)
+        return entries[0]['group'] if entries else None
+
+    def info(self, key):
+        entries = self.groups.get(key)
+        return entries[0] if entries else None
+
+    def owner_group(self, user_id):
+        """
+        Ключ группы, если пользователь - её создатель (редактирует общее расписание).
+        Группу без создателя (он вышел) забирает участник, который первым её меняет
+        """
+        key = self.group_of(user_id)
+        info = self.info(key) if key is not None else None
+        if info is None:
+            return None
+        if info.get('owner') is None:
+            self._set_owner(key, user_id)
+            return key
+        return key if info['owner'] == user_id else None
+
+    def _set_owner(self, key, user_id):
+        self.groups.update(key, 0, owner=user_id)
+
+    def members(self, key):
+        if self._members is None:
+            self._members = {}
+            for user_id, entries in self.membership.items():
+                if entries:
+                    self._members.setdefault(entries[0]['group'], set()).add(user_id)
+        return self._members.get(key, set())
+
+    def all_groups(self):
+        """Ключи групп, у которых есть участники"""
+        self.members(None)
+        return [key for key, users in self._members.items() if users]
+
+    def join(self, user_id, name):
+        """Вступить в группу (или создать её); (ключ, создана ли)"""
+        key = group_key(name)
+        created = self.info(key) is None
+        if created:
+            self.groups.replace(key, [{"name": name.strip(), "owner": user_id}])
+        self.leave(user_id)
+        self.membership.replace(user_id, [{"group": key}])
+        self.members(key)
+        self._members.setdefault(key, set()).add(user_id)
+        return key, created
+
+    def leave(self, user_id):
+        """Выйти из группы; создатель передаёт её другому участнику (если их нет - первому, кто её изменит)"""
+        key = self.group_of(user_id)
+        if key is None:
+            return None
+        self.membership.clear(user_id)
+        members = self.members(key)
+        members.discard(user_id)
+        info = self.info(key)
+        if info is not None and info.get('owner') == user_id:
+            self._set_owner(key, min(members) if members else None)
+        return key
+
+
+class _LazyDay:
+    """Занятия дня, которые собираются только для запрошенного среза"""
+
+    def __init__(self, entries):
+        self.entries = entries  # () -> итератор занятий дня по порядку
+
+    def __getitem__(self, part):
+        return list(islice(self.entries(), part.start, part.stop))
+
+
+class Timetable:
+    """
+    Расписание, которое видит пользователь: занятия его группы, кроме
+    скрытых им, плюс личные занятия. Изменения создателя группы попадают
+    в общее расписание, изменения остальных - в их личный слой
+    """
+
+    def __init__(self, directory, group_schedule, group_index, personal, personal_index, hidden):
+        self.directory = directory
+        self.group_schedule = group_schedule
+        self.group_index = group_index
+        self.personal = personal
+        self.personal_index = personal_index
+        self.hidden = hidden  # user_id -> [{"id": id скрытого занятия группы}]
+
+    def _hidden_ids(self, user_id):
+        entries = self.hidden.get(user_id)
+        return {h['id'] for h in entries} if entries else ()
+
+    def _merged_day(self, key, user_id, day, hidden):
+        """Занятия дня группы key без скрытых вместе с личными (список или итератор)"""
+        personal = self.personal_index.day(user_id, day)
+        group = self.group_index.day(key, day)
+        if hidden:
+            group = (entry for entry in group if entry.id not in hidden)
+        if not personal:
+            return group
+        return merge(group, personal, key=sort_key)
+
+    def day(self, user_id, day):
+        """Занятия дня по времени начала"""
+        key = self.directory.group_of(user_id)
+        if key is None:
+            return self.personal_index.day(user_id, day)
+        entries = self._merged_day(key, user_id, day, self._hidden_ids(user_id))
+        return entries if isinstance(entries, list) else list(entries)
+
+    def _week_days(self, key, user_id):
+        """Дни, в которые есть занятия группы или личные, по порядку недели"""
+        days = [day for day, _ in self.group_index.week(key)]
+        days += [day for day, _ in self.personal_index.week(user_id) if day not in days]
+        days.sort(key=lambda day: _DAY_ORDER.get(day, len(_DAY_ORDER)))
+        return days
+
+    def week(self, user_id):
+        """Пары (день, занятия) по порядку дней недели, только непустые"""
+        key = self.directory.group_of(user_id)
+        if key is None:
+            return self.personal_index.week(user_id)
+        week = [(day, self.day(user_id, day)) for day in self._week_days(key, user_id)]
+        return [(day, entries) for day, entries in week if entries]
+
+    def days(self, user_id):
+        """
+        Пары (число занятий дня, занятия дня) по порядку недели для slice_days.
+        Число занятий считается по длине дней и скрытым занятиям, а дни
+        со скрытыми или личными занятиями собираются только при срезе
+        """
+        key = self.directory.group_of(user_id)
+        if key is None:
+            return self.personal_index.days(user_id)
+        hidden = self._hidden_ids(user_id)
+        hidden_days = {}
+        for entry_id in hidden:
+            entry = self.group_index.find(key, entry_id)
+            if entry is not None:
+                hidden_days[entry.get('day', '')] = hidden_days.get(entry.get('day', ''), 0) + 1
+        days = []
+        for day in self._week_days(key, user_id):
+            group = self.group_index.day(key, day)
+            personal = self.personal_index.day(user_id, day)
+            count = len(group) - hidden_days.get(day, 0) + len(personal)
+            if not count:
+                continue
+            if day in hidden_days or personal:
+                group = _LazyDay(lambda day=day: self._merged_day(key, user_id, day, hidden))
+            days.append((count, group))
+        return days
+
+    def differs(self, user_id, day):
+        """Отличается ли день пользователя от расписания его группы"""
+        if self.personal_index.day(user_id, day):
+            return True
+        key = self.directory.group_of(user_id)
+        hidden = self._hidden_ids(user_id)
+        if key is None or not hidden:
+            return False
+        return any(entry.id in hidden for entry in self.group_index.day(key, day))
+
+    def entries(self, user_id):
+        """Все занятия по порядку недели и времени"""
+        return [entry for _, bucket in self.week(user_id) for entry in bucket]
+
+    def add(self, user_id, entry):
+        key = self.directory.owner_group(user_id)
+        if key is not None:
+            return self.group_schedule.add(key, entry)
+        return self.personal.add(user_id, entry)
+
+    def remove(self, user_id, entry_id):
+        """Удалить занятие из расписания пользователя; False, если его нет"""
+        index = self.personal.find(user_id, entry_id)
+        if index is not None:
+            self.personal.pop(user_id, index)
+            return True
+        key = self.directory.group_of(user_id)
+        if key is None:
+            return False
+        index = self.group_schedule.find(key, entry_id)
+        if index is None or entry_id in self._hidden_ids(user_id):
+            return False
+        if self.directory.owner_group(user_id) == key:
+            self.group_schedule.pop(key, index)
+        else:
+            self.hidden.add(user_id, {"id": entry_id})
+        return True
+
+    def clear(self, user_id):
+        """Очистить расписание пользователя (создатель группы очищает общее)"""
+        if self.personal.get(user_id):
+            self.personal.clear(user_id)
+        key = self.directory.group_of(user_id)
+        if key is None:
+            return
+        if self.directory.owner_group(user_id) == key:
+            self.group_schedule.clear(key)
+            return
+        hidden = self._hidden_ids(user_id)
+        for entry in self.group_schedule.get(key):
+            if entry.id not in hidden:
+                self.hidden.add(user_id, {"id": entry.id})
+
+    def join(self, user_id, name):
+        """
+        Вступление в группу. Создатель переносит своё расписание в общее;
+        у остальных удаляются личные копии занятий, которые уже есть в группе
+        """
+        key, created = self.directory.join(user_id, name)
+        if self.hidden.get(user_id):
+            self.hidden.clear(user_id)
+        personal = self.personal.get(user_id)
+        if created:
+            for entry in list(personal):
+                self.group_schedule.add(key, entry)
+            if personal:
+                self.personal.clear(user_id)
+        elif personal:
+            shared = {_lesson(entry) for entry in self.group_schedule.get(key)}
+            for i in range(len(personal) - 1, -1, -1):
+                if _lesson(personal[i]) in shared:
+                    self.personal.pop(user_id, i)
+        return key, created
+
+    def leave(self, user_id):
+        if self.hidden.get(user_id):
+            self.hidden.clear(user_id)
+        return self.directory.leave(user_id)
+
+
+def _lesson(entry):
+    return entry.get('day'), entry.get('time'), entry.get('subject'), entry.get('room')
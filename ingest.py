@@ -0,0 +1,133 @@
+"""
+Приём webhook-обновлений через ограниченную очередь и пул обработчиков
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """
+    Telegram получает ответ сразу, обновление кладётся в почтовый ящик
+    его пользователя. Workers задач берут из очереди готовых пользователей
+    тех, кого сейчас никто не обрабатывает, и обрабатывают по одному
+    обновлению: обновления одного пользователя идут по очереди, а его
+    ожидающие обновления не занимают обработчики, нужные остальным.
+    Всего в ящиках не больше maxsize обновлений, дальше - ответ 429
+    (Telegram повторит доставку позже); обновления, прождавшие дольше
+    max_age секунд, отбрасываются - ответ на них уже никому не нужен.
+    Повторы уже принятых обновлений (dedup) подтверждаются без обработки
+    """
+
+    def __init__(self, dispatcher, bot, workers=8, maxsize=1000, max_age=60.0, retry_after=5, dedup=None):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.dedup = dedup
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self._mailboxes = {}  # пользователь -> deque[(время приёма, обновление)], пока он в очереди или в обработке
+        self._ready = asyncio.Queue()  # пользователи с обновлениями, которых никто не обрабатывает
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self.rejected = 0  # отказано из-за переполнения
+        self.expired = 0   # отброшено из-за возраста
+
+    def qsize(self):
+        return self._pending
+
+    def users(self):
+        """Пользователей с обновлениями в очереди или в обработке"""
+        return len(self._mailboxes)
+
+    @staticmethod
+    def _key(update):
+        user = UserContextMiddleware.resolve_event_context(update).user
+        return user.id if user is not None else ("update", update.update_id)
+
+    def put(self, update):
+        """Положить обновление в ящик пользователя; False, если очередь заполнена"""
+        if self._pending >= self.maxsize:
+            self.rejected += 1
+            return False
+        key = self._key(update)
+        mailbox = self._mailboxes.get(key)
+        if mailbox is None:
+            mailbox = self._mailboxes[key] = deque()
+            self._ready.put_nowait(key)
+        mailbox.append((time.monotonic(), update))
+        self._pending += 1
+        self._idle.clear()
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            mailbox = self._mailboxes[key]
+            received, update = mailbox.popleft()
+            try:
+                if time.monotonic() - received > self.max_age:
+                    self.expired += 1
+                    logger.warning(f"Обновление {update.update_id} устарело в очереди и отброшено")
+                    continue
+                # Ящик уже гарантирует очерёдность - блокировка пользователя не нужна
+                await self.dispatcher.feed_update(self.bot, update, user_serialized=True)
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}", exc_info=True)
+            finally:
+                # Следующее обновление пользователя - в конец очереди, чтобы не задерживать остальных
+                if mailbox:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._mailboxes[key]
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """aiohttp-обработчик webhook"""
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Некорректное обновление: {e}")
+            return web.Response(status=400)
+        if self.dedup is not None and update.update_id in self.dedup:
+            self.dedup.duplicates += 1
+            return web.Response()
+        if not self.put(update):
+            logger.warning(f"Очередь заполнена ({self.qsize()}), обновление {update.update_id} отклонено")
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        # Запоминаем только принятые: отклонённое из-за 429 Telegram пришлёт снова
+        if self.dedup is not None:
+            self.dedup.seen(update.update_id)
+        return web.Response()
+
+    def register(self, app: web.Application, path):
+        app.router.add_post(path, self.handle)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+
+    async def _on_startup(self, app):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Очередь обновлений: {self.workers} обработчиков, размер {self.maxsize}")
+
+    async def _on_shutdown(self, app, timeout=10.0):
+        # Даём обработать то, что уже принято, затем останавливаем задачи
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано обновлений при остановке: {self.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,142 @@
+"""
+Разбор текстовых сообщений: один проход, структурированный результат
+"""
+from dataclasses import dataclass, field
+
+from scheduler import parse_reminder_date
+from search import tokenize
+
+# Дни недели: варианты написания -> каноническое название
+WEEKDAYS = {
+    "пн": "Понедельник", "пон": "Понедельник", "понедельник": "Понедельник",
+    "вт": "Вторник", "вто": "Вторник", "вторник": "Вторник",
+    "ср": "Среда", "сре": "Среда", "среда": "Среда",
+    "чт": "Четверг", "чет": "Четверг", "четверг": "Четверг",
+    "пт": "Пятница", "пят": "Пятница", "пятница": "Пятница",
+    "сб": "Суббота", "суб": "Суббота", "суббота": "Суббота",
+    "вс": "Воскресенье", "вос": "Воскресенье", "воскресенье": "Воскресенье",
+}
+
+# Предметы, которые узнаются даже без расписания
+DEFAULT_SUBJECTS = [
+    "Математика", "Алгебра", "Геометрия", "Физика", "Химия", "Биология",
+    "История", "Обществознание", "География", "Литература", "Русский язык",
+    "Английский язык", "Немецкий язык", "Информатика", "Программирование",
+    "Экономика", "Право", "Философия", "Физкультура", "ОБЖ",
+]
+
+
+def normalize(text):
+    """Нижний регистр, ё -> е, без лишних пробелов"""
+    return " ".join(text.casefold().replace("ё", "е").split())
+
+
+def subject_key(subject):
+    """Ключ предмета: основа первого слова ("Английский язык" -> "английск")"""
+    terms = tokenize(subject)
+    return terms[0] if terms else ""
+
+
+_DEFAULT_KEYS = frozenset(subject_key(s) for s in DEFAULT_SUBJECTS)
+
+
+@dataclass
+class Intent:
+    """Результат разбора сообщения"""
+    kind: str  # schedule, reminder, homework, note, unknown
+    fields: dict = field(default_factory=dict)
+
+
+class SubjectVocabulary:
+    """
+    Словарь предметов пользователя из его расписания.
+    Строится лениво и обновляется по событиям коллекции расписания
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self._vocab = {}  # user_id -> {ключ предмета: число занятий}
+        schedule.subscribe(self._on_change)
+
+    def for_user(self, user_id):
+        vocab = self._vocab.get(user_id)
+        if vocab is None:
+            vocab = self._vocab[user_id] = {}
+            for entry in self.schedule.get(user_id):
+                self._count(vocab, entry, 1)
+        return vocab
+
+    @staticmethod
+    def _count(vocab, entry, delta):
+        key = subject_key(entry.get('subject', ''))
+        if not key:
+            return
+        count = vocab.get(key, 0) + delta
+        if count > 0:
+            vocab[key] = count
+        else:
+            vocab.pop(key, None)
+
+    def _on_change(self, event, user_id, item):
+        vocab = self._vocab.get(user_id)
+        if vocab is None:
+            return
+        if event == "add":
+            self._count(vocab, item, 1)
+        elif event == "remove":
+            self._count(vocab, item, -1)
+        else:
+            del self._vocab[user_id]
+
+
+def is_subject(text, user_subjects=()):
+    key = subject_key(text)
+    return bool(key) and (key in _DEFAULT_KEYS or key in user_subjects)
+
+
+def parse_message(text, user_subjects=()):
+    """
+    Классификация и разбор сообщения:
+    - "День | Время | Предмет [| Аудитория]" -> schedule
+    - "Текст | Дата" -> reminder
+    - "Предмет | Задание [| Дедлайн]" -> homework
+    - "Заголовок | Текст" или многострочный текст -> note
+    """
+    text = text.strip()
+    if "|" in text:
+        parts = [p.strip() for p in text.split("|")]
+        first = normalize(parts[0])
+
+        day = WEEKDAYS.get(first)
+        if day is not None and len(parts) >= 3:
+            return Intent("schedule", {
+                "day": day,
+                "time": parts[1],
+                "subject": parts[2],
+                "room": parts[3] if len(parts) > 3 and parts[3] else "Не указана",
+            })
+
+        if len(parts) == 2:
+            when = parse_reminder_date(parts[1])
+            if when is not None:
+                return Intent("reminder", {"text": parts[0], "date": parts[1], "when": when})
+
+        if parts[1] and (
+            is_subject(parts[0], user_subjects)
+            or (len(parts) == 3 and parse_reminder_date(parts[2]) is not None)
+        ):
+            return Intent("homework", {
+                "subject": parts[0],
+                "task": parts[1],
+                "deadline": parts[2] if len(parts) > 2 and parts[2] else "Не указан",
+            })
+
+        title, _, note_text = text.partition("|")
+        return Intent("note", {"title": title.strip(), "text": note_text.strip()})
+
+    if "\n" in text:
+        title, _, note_text = text.partition("\n")
+        title = title.strip()
+        return Intent("note", {"title": title, "text": note_text.strip() or title})
+
+    return Intent("unknown")
@@ -0,0 +1,186 @@
+"""
+Журнал изменений хранилища: каждое изменение коллекции дописывается в конец
+файла короткой записью, а на диск журнал сбрасывается пачками - одна запись
+и один fsync раз в interval секунд - в отдельном потоке.
+
+Журнал делится на сегменты (bot.snap.log.00000001, ...). Перед снимком
+текущий сегмент закрывается, а после записи снимка закрытые сегменты
+удаляются или переносятся в архив. При старте сегменты, которые не вошли
+в снимок, проигрываются заново
+"""
+import asyncio
+import logging
+import os
+import pickle
+import struct
+import zlib
+
+logger = logging.getLogger(__name__)
+
+_FRAME = struct.Struct("<II")  # длина и crc32 записи
+
+
+def encode(event):
+    payload = pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path):
+    """События сегмента по порядку; оборванный при сбое хвост отбрасывается"""
+    with open(path, "rb") as f:
+        data = f.read()
+    events = []
+    pos = 0
+    while pos + _FRAME.size <= len(data):
+        size, crc = _FRAME.unpack_from(data, pos)
+        payload = data[pos + _FRAME.size:pos + _FRAME.size + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            logger.warning(f"{path}: повреждённая запись на смещении {pos}, остаток сегмента пропущен")
+            break
+        events.append(pickle.loads(payload))
+        pos += _FRAME.size + size
+    return events
+
+
+def segment_paths(path):
+    """Пары (номер, путь) сегментов журнала path по порядку"""
+    folder, prefix = os.path.split(os.path.abspath(path))
+    segments = []
+    for name in os.listdir(folder) if os.path.isdir(folder) else ():
+        number = name[len(prefix) + 1:]
+        if name.startswith(prefix + ".") and number.isdigit():
+            segments.append((int(number), os.path.join(folder, name)))
+    return sorted(segments)
+
+
+def read_events(paths, until=None):
+    """События сегментов paths по порядку; until - только не позже этого времени (unix)"""
+    events = []
+    for path in paths:
+        for event in read_segment(path):
+            if until is not None and event[0] > until:
+                return events
+            events.append(event)
+    return events
+
+
+class Journal:
+    """
+    Журнал path. События - кортежи (время, коллекция, ключ, операция, аргументы);
+    archive - каталог, куда переносятся сегменты после снимка (пусто - удалять)
+    """
+
+    def __init__(self, path, interval=0.2, archive=""):
+        self.path = path
+        self.interval = interval
+        self.archive = archive
+        self._segment = 1
+        self._pending = []     # (номер сегмента, байты) - ещё не записано
+        self._files = {}       # номер сегмента -> открытый файл (только в потоке записи)
+        self._lock = asyncio.Lock()  # записи и удаления сегментов по одной
+        self._wakeup = None
+        self._task = None
+        self._closing = False
+        self.size = 0          # байт в журнале после последнего снимка
+        self.appended = 0
+        self.syncs = 0
+
+    def _segment_path(self, number):
+        return f"{self.path}.{number:08d}"
+
+    def open(self):
+        """Прочитать оставшиеся сегменты (синхронно); новые записи пойдут в новый сегмент"""
+        segments = segment_paths(self.path)
+        if segments:
+            self._segment = segments[-1][0] + 1
+        events = read_events([path for _, path in segments])
+        self.size = sum(os.path.getsize(path) for _, path in segments)
+        return events
+
+    def append(self, event):
+        data = encode(event)
+        self._pending.append((self._segment, data))
+        self.size += len(data)
+        self.appended += 1
+
+    def rotate(self):
+        """Закрыть текущий сегмент; его номер - для drop после снимка"""
+        closed = self._segment
+        self._segment += 1
+        self.size = 0
+        return closed
+
+    def _write(self, pending):
+        for number in sorted({number for number, _ in pending}):
+            f = self._files.get(number)
+            if f is None:
+                f = self._files[number] = open(self._segment_path(number), "ab")
+            f.write(b"".join(data for n, data in pending if n == number))
+            f.flush()
+            os.fsync(f.fileno())
+        # Открытым остаётся только последний сегмент
+        for number in [n for n in self._files if n < max(self._files)]:
+            self._files.pop(number).close()
+
+    async def sync(self):
+        """Записать накопленные события и дождаться fsync"""
+        async with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                await asyncio.to_thread(self._write, pending)
+            except Exception:
+                self._pending[:0] = pending
+                raise
+            self.syncs += 1
+
+    def _remove(self, upto):
+        for number, path in segment_paths(self.path):
+            if number > upto:
+                break
+            f = self._files.pop(number, None)
+            if f is not None:
+                f.close()
+            if self.archive:
+                os.makedirs(self.archive, exist_ok=True)
+                os.replace(path, os.path.join(self.archive, os.path.basename(path)))
+            else:
+                os.remove(path)
+
+    async def drop(self, upto):
+        """Убрать сегменты до upto включительно - они уже вошли в снимок"""
+        await self.sync()
+        async with self._lock:
+            await asyncio.to_thread(self._remove, upto)
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Ошибка записи журнала {self.path}: {e}", exc_info=True)
+
+    def _close_files(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    async def close(self):
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.sync()
+        async with self._lock:
+            await asyncio.to_thread(self._close_files)
@@ -0,0 +1,228 @@
+"""
+Готовые клавиатуры и тексты статичных экранов.
+Создаются один раз при импорте; разметка aiogram неизменяемая,
+поэтому один объект можно отдавать во все ответы
+"""
+from functools import lru_cache
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from callbacks import pack
+
+
+def _build(buttons, *sizes):
+    keyboard = InlineKeyboardBuilder()
+    for text, data in buttons:
+        if data.startswith("https://"):
+            keyboard.add(InlineKeyboardButton(text=text, url=data))
+        else:
+            keyboard.add(InlineKeyboardButton(text=text, callback_data=data))
+    keyboard.adjust(*sizes)
+    return keyboard.as_markup()
+
+
+# Главное меню
+MAIN_MENU = _build([
+    ("📅 Расписание", "schedule"),
+    ("📝 Домашние задания", "homework"),
+    ("📌 Заметки", "notes"),
+    ("⏰ Напоминания", "reminders"),
+    ("📚 Полезные ссылки", "links"),
+    ("ℹ️ О боте", "about"),
+], 2, 2, 1, 1)
+
+# Клавиатура расписания
+SCHEDULE_KEYBOARD = _build([
+    ("📅 Сегодня", "schedule_today"),
+    ("📆 Завтра", "schedule_tomorrow"),
+    ("📋 Вся неделя", "schedule_week"),
+    ("➕ Добавить занятие", "schedule_add"),
+    ("🗑️ Удалить занятие", "schedule_delete"),
+    ("👥 Группа", "group"),
+    ("⬅️ Назад", "main_menu"),
+], 2, 2, 2, 1)
+
+# Экран группы для её участника
+GROUP_KEYBOARD = _build([
+    ("🚪 Выйти из группы", "group_leave"),
+    ("⬅️ Назад к расписанию", "schedule"),
+], 1, 1)
+
+# Клавиатура домашних заданий
+HOMEWORK_KEYBOARD = _build([
+    ("📋 Список заданий", "homework_list"),
+    ("➕ Добавить задание", "homework_add"),
+    ("✅ Выполнено", "homework_done"),
+    ("🗑️ Удалить", "homework_delete"),
+    ("⏳ Скоро сдавать", "homework_soon"),
+    ("⚠️ Просрочено", "homework_overdue"),
+    ("⬅️ Назад", "main_menu"),
+], 2, 2, 2, 1)
+
+# Клавиатура заметок
+NOTES_KEYBOARD = _build([
+    ("📋 Мои заметки", "notes_list"),
+    ("➕ Новая заметка", "notes_add"),
+    ("🔍 Поиск", "notes_search"),
+    ("🗑️ Удалить", "notes_delete"),
+    ("⬅️ Назад", "main_menu"),
+], 2, 2, 1)
+
+# Кнопки экрана напоминаний (с кнопкой удаления и без)
+REMINDERS_BUTTONS = (
+    ("➕ Добавить напоминание", "reminders_add"),
+    ("🗑️ Удалить", "reminders_delete"),
+    ("⬅️ Назад", "main_menu"),
+)
+REMINDERS_BUTTONS_EMPTY = (
+    ("➕ Добавить напоминание", "reminders_add"),
+    ("⬅️ Назад", "main_menu"),
+)
+
+# Клавиатура под результатами поиска заметок
+NOTES_SEARCH_KEYBOARD = _build([
+    ("🔍 Искать ещё", "notes_search"),
+    ("📌 Заметки", "notes"),
+], 2)
+
+# Клавиатура полезных ссылок
+LINKS_KEYBOARD = _build([
+    ("🌐 Сайт колледжа", "https://college.cfuv.ru"),
+    ("📱 Соцсети", "https://vk.com/college"),
+    ("📚 Библиотека", "https://library.college.ru"),
+    ("💬 Чат студентов", "https://t.me/college_chat"),
+    ("🎮 FunPay", "https://funpay.com"),
+    ("⬅️ Назад", "main_menu"),
+], 2, 2, 1, 1)
+
+
+@lru_cache(maxsize=None)
+def button_keyboard(text, callback_data):
+    """Клавиатура из одной кнопки ("⬅️ Назад", "📅 Расписание" и т.п.)"""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=text, callback_data=callback_data)
+    ]])
+
+
+def _row(buttons):
+    return [InlineKeyboardButton(text=text, callback_data=data) for text, data in buttons]
+
+
+@lru_cache(maxsize=4096)
+def page_nav(screen, offset, total, page_size):
+    """Кнопки "◀️ 2/5 ▶️" для страницы списка; курсор - смещение в callback_data"""
+    if total <= page_size:
+        return ()
+    buttons = []
+    if offset > 0:
+        buttons.append(("◀️", pack("page", screen, max(0, offset - page_size))))
+    buttons.append((f"{offset // page_size + 1}/{(total - 1) // page_size + 1}", pack("page", screen, offset)))
+    if offset + page_size < total:
+        buttons.append(("▶️", pack("page", screen, offset + page_size)))
+    return tuple(buttons)
+
+
+@lru_cache(maxsize=4096)
+def paged_keyboard(nav, buttons):
+    """Строка навигации по страницам + кнопки по одной в строке; nav и buttons - кортежи (текст, data)"""
+    rows = [_row(nav)] if nav else []
+    rows += [_row([button]) for button in buttons]
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@lru_cache(maxsize=4096)
+def items_keyboard(buttons, back, clear=None, nav=()):
+    """Кнопка на каждую запись + навигация + "Удалить все" + "Назад"; buttons - кортеж (текст, data)"""
+    rows = [_row([button]) for button in buttons]
+    if nav:
+        rows.append(_row(nav))
+    if clear:
+        rows.append(_row([("🗑️ Удалить все", clear)]))
+    rows.append(_row([("⬅️ Назад", back)]))
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+MAIN_MENU_TEXT = (
+    "🎓 <b>Главное меню</b>\n\n"
+    "Выбери действие:"
+)
+
+LINKS_TEXT = (
+    "📚 <b>Полезные ссылки</b>\n\n"
+    "Быстрый доступ к важным ресурсам:"
+)
+
+# Статичные экраны: callback_data -> (текст, клавиатура)
+STATIC_SCREENS = {
+    "main_menu": (MAIN_MENU_TEXT, MAIN_MENU),
+    "schedule": (
+        "📅 <b>Расписание занятий</b>\n\n"
+        "Выбери действие:",
+        SCHEDULE_KEYBOARD
+    ),
+    "schedule_add": (
+        "➕ <b>Добавить занятие</b>\n\n"
+        "Отправь информацию в формате:\n"
+        "<code>День недели | Время | Предмет | Аудитория</code>\n\n"
+        "Пример:\n"
+        "<code>Понедельник | 09:00 | Математика | 201</code>\n\n"
+        "Или:\n"
+        "<code>Пн | 09:00 | Математика | 201</code>",
+        button_keyboard("⬅️ Назад", "schedule")
+    ),
+    "homework": (
+        "📝 <b>Домашние задания</b>\n\n"
+        "Управляй своими заданиями:",
+        HOMEWORK_KEYBOARD
+    ),
+    "homework_add": (
+        "➕ <b>Добавить домашнее задание</b>\n\n"
+        "Отправь информацию в формате:\n"
+        "<code>Предмет | Задание | Дедлайн</code>\n\n"
+        "Пример:\n"
+        "<code>Математика | Решить задачи 1-5 | 25.12.2024</code>\n\n"
+        "Или без дедлайна:\n"
+        "<code>Физика | Подготовить доклад</code>",
+        button_keyboard("⬅️ Назад", "homework")
+    ),
+    "notes": (
+        "📌 <b>Заметки</b>\n\n"
+        "Сохраняй важную информацию:",
+        NOTES_KEYBOARD
+    ),
+    "notes_add": (
+        "➕ <b>Новая заметка</b>\n\n"
+        "Отправь заметку в формате:\n"
+        "<code>Заголовок | Текст заметки</code>\n\n"
+        "Пример:\n"
+        "<code>Важная формула | E = mc²</code>\n\n"
+        "Или просто текст (первая строка станет заголовком):\n"
+        "<code>Лекция по физике\nСегодня разбирали квантовую механику...</code>",
+        button_keyboard("⬅️ Назад", "notes")
+    ),
+    "reminders_add": (
+        "➕ <b>Добавить напоминание</b>\n\n"
+        "Отправь в формате:\n"
+        "<code>Текст напоминания | Дата</code>\n\n"
+        "Пример:\n"
+        "<code>Экзамен по математике | 25.12.2024</code>\n"
+        "<code>Консультация | 25.12 14:30</code>\n\n"
+        "Без времени напомню в 09:00.",
+        button_keyboard("⬅️ Назад", "reminders")
+    ),
+    "about": (
+        "ℹ️ <b>О боте</b>\n\n"
+        "🎓 Бот-помощник для студентов колледжа\n\n"
+        "<b>Возможности:</b>\n"
+        "• 📅 Управление расписанием\n"
+        "• 📝 Отслеживание домашних заданий\n"
+        "• 📌 Сохранение заметок\n"
+        "• ⏰ Напоминания о важных событиях\n"
+        "• 📚 Полезные ссылки\n\n"
+        "<b>Версия:</b> 1.0\n"
+        "<b>Разработчик:</b> Гриськов Артем 2исп2\n\n"
+        "Используй /help для списка команд",
+        button_keyboard("⬅️ Назад", "main_menu")
+    ),
+}
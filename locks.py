@@ -0,0 +1,57 @@
+"""
+Последовательная обработка обновлений одного пользователя
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+
+
+class KeyedLock:
+    """
+    Блокировка по ключу. Lock создаётся при первом обращении и удаляется,
+    как только его никто не держит и не ждёт, поэтому число объектов
+    не превышает числа ключей, обрабатываемых в данный момент
+    """
+
+    def __init__(self):
+        self._locks = {}  # ключ -> [Lock, число владельцев и ожидающих]
+
+    def __len__(self):
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+
+class SerializedDispatcher(Dispatcher):
+    """
+    Dispatcher, который обрабатывает обновления одного пользователя по очереди,
+    разных пользователей - параллельно. Блокировка берётся в feed_update, до
+    middleware aiogram: обновление, ждавшее очереди, читает состояние FSM уже
+    после предыдущего. Обновления из очереди webhook (ingest.py) идут
+    без блокировки: там очерёдность обеспечивает почтовый ящик пользователя
+    """
+
+    def __init__(self, *args, locks, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.locks = locks
+
+    async def feed_update(self, bot, update, **kwargs):
+        user = UserContextMiddleware.resolve_event_context(update).user
+        if user is None or kwargs.get("user_serialized"):
+            return await super().feed_update(bot, update, **kwargs)
+        async with self.locks.hold(user.id):
+            return await super().feed_update(bot, update, **kwargs)
@@ -0,0 +1,178 @@
+"""
+Метрики в текстовом формате Prometheus: счётчики, гистограммы задержек
+и значения, снимаемые в момент запроса /metrics.
+Всё работает в одном цикле событий, поэтому запись - это обычное
+изменение словаря, без блокировок
+"""
+import time
+from bisect import bisect_left
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _with_le(labels, le):
+    le = f'le="{le}"'
+    return "{" + le + "}" if not labels else labels[:-1] + "," + le + "}"
+
+
+class Counter:
+    """Счётчик с метками: inc(*значения_меток)"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}  # значения меток -> число
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Гистограмма с метками: observe(значение, *значения_меток)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # значения меток -> [счётчики корзин, сумма]
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            text = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _with_le(text, bound), cumulative
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket", _with_le(text, "+Inf"), cumulative
+            yield f"{self.name}_sum", text, total
+            yield f"{self.name}_count", text, cumulative
+
+
+class Gauge:
+    """
+    Значение, которое считывается функцией в момент запроса.
+    kind="counter" - для растущих счётчиков, которые ведут другие модули
+    """
+
+    def __init__(self, name, help, func, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.kind = kind
+
+    def samples(self):
+        yield self.name, "", self.func()
+
+
+class Metrics:
+    """Набор метрик бота и вывод их для /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self.handler_calls = self.add(Counter(
+            "bot_handler_calls_total", "Вызовы обработчиков", ("handler",)))
+        self.handler_errors = self.add(Counter(
+            "bot_handler_errors_total", "Исключения в обработчиках", ("handler",)))
+        self.handler_latency = self.add(Histogram(
+            "bot_handler_seconds", "Время работы обработчиков", ("handler",)))
+        self.api_latency = self.add(Histogram(
+            "bot_api_seconds", "Время запросов к Bot API", ("method",)))
+        self.api_errors = self.add(Counter(
+            "bot_api_errors_total", "Ошибки запросов к Bot API", ("method",)))
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, func, kind="gauge"):
+        """Метрика-значение: func() вызывается при каждом запросе /metrics"""
+        return self.add(Gauge(name, help, func, kind))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """aiohttp-обработчик /metrics"""
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware наблюдателя (dp.message, dp.callback_query):
+    число вызовов, ошибки и время каждого обработчика.
+    name(event, handler) - имя обработчика для метки, по умолчанию имя функции
+    """
+
+    def __init__(self, metrics, name=None):
+        self.metrics = metrics
+        self.name = name
+
+    async def __call__(self, handler, event, data):
+        handler_object = data["handler"]
+        if self.name is not None:
+            name = self.name(event, handler_object)
+        else:
+            name = handler_object.callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.handler_errors.inc(name)
+            raise
+        finally:
+            self.metrics.handler_calls.inc(name)
+            self.metrics.handler_latency.observe(time.perf_counter() - start, name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки запросов к Bot API по методам"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            self.metrics.api_errors.inc(name)
+            raise
+        finally:
+            self.metrics.api_latency.observe(time.perf_counter() - start, name)
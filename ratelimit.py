@@ -0,0 +1,348 @@
+"""
+Ограничение исходящих запросов к Bot API: общий лимит бота (~30 сообщений
+в секунду) и лимит на чат (~1 в секунду, в группах 20 в минуту),
+приоритет ответов пользователям над рассылками, повтор после retry_after
+и схлопывание стоящих в очереди правок одного сообщения
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета: меньше - раньше
+INTERACTIVE = 0
+BULK = 1
+
+send_priority = ContextVar("send_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk():
+    """Запросы внутри блока уступают ответам пользователям (напоминания, рассылки)"""
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity про запас"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now):
+        """Когда можно будет взять токен (now - если уже можно)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return max(now, self.blocked_until)
+        return max(now + (1 - self.tokens) / self.rate, self.blocked_until)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until):
+        """Не выдавать токены до until (после ответа 429)"""
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = min(self.tokens, 0)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "edit_key", "granted", "response", "superseded")
+
+    def __init__(self, priority, seq, edit_key):
+        self.priority = priority
+        self.seq = seq
+        self.edit_key = edit_key
+        self.granted = asyncio.get_running_loop().create_future()
+        self.response = None     # Future ответа - для схлопнутых правок
+        self.superseded = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Chat:
+    __slots__ = ("bucket", "waiters", "scheduled", "waking")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.waiters = []      # куча _Waiter
+        self.scheduled = None  # приоритет, с которым чат стоит в _ready, или None
+        self.waking = None     # время, с которым чат стоит в _sleeping, или None
+
+
+class SendLimiter:
+    """
+    Очередь на отправку. Запрос ждёт токен своего чата и общий токен;
+    из чатов, у которых токен уже есть, первым обслуживается запрос
+    с высшим приоритетом, так что медленный чат не задерживает остальные.
+    Более новая правка того же сообщения заменяет ещё не отправленную
+    """
+
+    def __init__(self, rate=30.0, burst=30, chat_rate=1.0, chat_burst=3, group_rate=20 / 60, group_burst=3):
+        self.bucket = TokenBucket(rate, burst)
+        self.chat_rate = (chat_rate, chat_burst)
+        self.group_rate = (group_rate, group_burst)
+        self._chats = {}       # chat_id -> _Chat
+        self._ready = []       # куча (приоритет, seq, chat_id) - чаты с токеном
+        self._sleeping = []    # куча (время готовности, seq, chat_id)
+        self._edits = {}       # (chat_id, message_id) -> ожидающая правка
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._swept = time.monotonic()
+        self._stopping = False
+        self.coalesced = 0
+        self.retried = 0
+
+    def __len__(self):
+        return sum(len(chat.waiters) for chat in self._chats.values())
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if chat_id is None:
+                # Запросы без чата (inline-сообщения) ограничены только общим лимитом
+                rate, burst = self.bucket.rate, self.bucket.capacity
+            elif isinstance(chat_id, int) and chat_id < 0:
+                rate, burst = self.group_rate
+            else:
+                rate, burst = self.chat_rate
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, burst))
+        return chat
+
+    def acquire(self, chat_id, priority=INTERACTIVE, edit_key=None):
+        """Встать в очередь; результат - _Waiter, его granted завершится разрешением"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+        waiter = _Waiter(priority, next(self._counter), edit_key)
+        if edit_key is not None:
+            previous = self._edits.get(edit_key)
+            if previous is not None and not previous.granted.done():
+                # Старая правка не отправится: её вызов получит ответ новой
+                previous.superseded = True
+                previous.granted.set_result(waiter)
+                self.coalesced += 1
+            self._edits[edit_key] = waiter
+        chat = self._chat(chat_id)
+        heapq.heappush(chat.waiters, waiter)
+        if chat.scheduled is None or priority < chat.scheduled:
+            self._schedule(chat_id, chat, time.monotonic())
+        self._wakeup.set()
+        return waiter
+
+    def pending_edit(self, edit_key):
+        """Ещё не отправленная правка сообщения или None"""
+        waiter = self._edits.get(edit_key)
+        if waiter is None or waiter.granted.done():
+            return None
+        return waiter
+
+    def _schedule(self, chat_id, chat, now):
+        head = chat.waiters[0]
+        ready_at = chat.bucket.ready_at(now)
+        if ready_at <= now:
+            chat.scheduled = head.priority
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        elif chat.waking is None or chat.waking > ready_at:
+            chat.scheduled = None
+            chat.waking = ready_at
+            heapq.heappush(self._sleeping, (ready_at, next(self._counter), chat_id))
+
+    def _next_waiter(self, chat):
+        while chat.waiters:
+            waiter = heapq.heappop(chat.waiters)
+            if not waiter.superseded and not waiter.granted.cancelled():
+                return waiter
+            if self._edits.get(waiter.edit_key) is waiter:
+                del self._edits[waiter.edit_key]
+        return None
+
+    def block(self, chat_id, seconds):
+        """После 429: чат (или весь бот, если chat_id нет) ждёт seconds секунд"""
+        until = time.monotonic() + seconds
+        if chat_id is None:
+            self.bucket.block(until)
+        else:
+            self._chat(chat_id).bucket.block(until)
+        self._wakeup.set()
+
+    def _wake(self, now):
+        """Перенести чаты, у которых появился токен, в очередь готовых"""
+        while self._sleeping and self._sleeping[0][0] <= now:
+            ready_at, _, chat_id = heapq.heappop(self._sleeping)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.waking != ready_at:
+                continue  # устаревшая запись
+            chat.waking = None
+            if chat.waiters and chat.scheduled is None:
+                self._schedule(chat_id, chat, now)
+
+    def _sweep(self, now):
+        """Забыть чаты без очереди с полным запасом токенов"""
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.waiters and chat.scheduled is None and chat.waking is None
+            and chat.bucket.ready_at(now) <= now and chat.bucket.tokens >= chat.bucket.capacity
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+        self._swept = now
+
+    def _grant(self, now):
+        """Выдать одно разрешение; False, если сейчас некому"""
+        while self._ready:
+            priority, _, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.scheduled != priority:
+                continue  # устаревшая запись
+            chat.scheduled = None
+            if chat.bucket.ready_at(now) > now:
+                if chat.waiters:
+                    self._schedule(chat_id, chat, now)
+                continue
+            waiter = self._next_waiter(chat)
+            if waiter is None:
+                continue
+            chat.bucket.take(now)
+            self.bucket.take(now)
+            if self._edits.get(waiter.edit_key) is waiter:
+                del self._edits[waiter.edit_key]
+            waiter.granted.set_result(None)
+            if chat.waiters:
+                self._schedule(chat_id, chat, now)
+            return True
+        return False
+
+    def _delay(self, now):
+        delays = []
+        if self._ready:
+            delays.append(self.bucket.ready_at(now) - now)
+        if self._sleeping:
+            delays.append(self._sleeping[0][0] - now)
+        return max(0.0, min(delays)) if delays else None
+
+    async def _run(self):
+        # Как в TimerScheduler: флаг на случай потерянной в wait_for отмены
+        while not self._stopping:
+            now = time.monotonic()
+            self._wake(now)
+            if self.bucket.ready_at(now) <= now and self._grant(now):
+                continue
+            if now - self._swept > 60:
+                self._sweep(now)
+            delay = self._delay(now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Методы, на которые распространяются лимиты сообщений
+LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: отправка через SendLimiter и повтор после 429.
+    Ожидание retry_after дольше max_retry_after не выполняется - ошибка уходит вызывающему
+    """
+
+    def __init__(self, limiter, retries=3, max_retry_after=60):
+        self.limiter = limiter
+        self.retries = retries
+        self.max_retry_after = max_retry_after
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        if not name.startswith(LIMITED_PREFIXES):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        edit_key = None
+        if name.startswith("Edit") and chat_id is not None and getattr(method, "message_id", None):
+            edit_key = (chat_id, method.message_id)
+        priority = send_priority.get()
+        waiters = []  # все постановки в очередь этого запроса (после 429 - новая)
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt and edit_key is not None and self.limiter.pending_edit(edit_key):
+                    # Пока ждали, пришла более новая правка - её ответ и вернём
+                    waiter = self.limiter.pending_edit(edit_key)
+                    response = await self._wait_response(waiter)
+                    break
+                waiter = self.limiter.acquire(chat_id, priority, edit_key)
+                waiters.append(waiter)
+                newer = await waiter.granted
+                if newer is not None:
+                    response = await self._wait_response(newer)
+                    break
+                try:
+                    response = await make_request(bot, method)
+                    break
+                except TelegramRetryAfter as e:
+                    if attempt == self.retries or e.retry_after > self.max_retry_after:
+                        raise
+                    logger.warning(f"429 для чата {chat_id}: повтор через {e.retry_after} с")
+                    self.limiter.retried += 1
+                    self.limiter.block(chat_id, e.retry_after)
+                    # Повтор вне очереди рассылок: запрос уже отстоял своё
+                    priority = INTERACTIVE
+        except BaseException as e:
+            for waiter in waiters:
+                self._resolve(waiter, exception=e)
+            raise
+        for waiter in waiters:
+            self._resolve(waiter, response=response)
+        return response
+
+    @staticmethod
+    async def _wait_response(waiter):
+        """Ответ на запрос, который заменил наш (схлопнутая правка)"""
+        if waiter.response is None:
+            waiter.response = asyncio.get_running_loop().create_future()
+        return await asyncio.shield(waiter.response)
+
+    @staticmethod
+    def _resolve(waiter, response=None, exception=None):
+        future = waiter.response
+        if future is None or future.done():
+            return
+        if isinstance(exception, asyncio.CancelledError):
+            future.cancel()
+        elif exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(response)
@@ -0,0 +1,117 @@
+"""
+Записи пользователей: занятия, задания, заметки и напоминания.
+Вместо словаря у каждой записи __slots__, повторяющиеся у многих
+пользователей строки (день, время, предмет, аудитория) интернируются,
+а день недели хранится номером. Чтение как у словаря (entry['subject'],
+entry.get('room')) сохранено; в базу записи пишутся обычными словарями
+"""
+import sys
+
+from schedule import WEEKDAY_NAMES
+
+_DAY_NUMBERS = {name: i for i, name in enumerate(WEEKDAY_NAMES)}
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Record:
+    """
+    Основа записей. FIELDS - поля в порядке сериализации,
+    INTERNED - строковые поля, которые интернируются.
+    Незаданное поле считается отсутствующим, как ключ словаря.
+    В горячих местах обязательные поля читаются атрибутами (entry.subject) -
+    это быстрее и словаря, и entry['subject']
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+    INTERNED = ()
+    _field_set = frozenset()
+
+    def __init_subclass__(cls):
+        cls._field_set = frozenset(cls.FIELDS)
+
+    def __init__(self, **fields):
+        self.update(fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        record.update(data)
+        return record
+
+    def update(self, fields=(), **more):
+        for key, value in dict(fields, **more).items():
+            if key not in self._field_set:
+                raise KeyError(f"{type(self).__name__}: неизвестное поле {key!r}")
+            setattr(self, key, _intern(value) if key in self.INTERNED else value)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key, default)
+        return default
+
+    def __contains__(self, key):
+        return key in self._field_set and hasattr(self, key)
+
+    def keys(self):
+        return [key for key in self.FIELDS if hasattr(self, key)]
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class ScheduleEntry(Record):
+    """Занятие: день недели хранится номером (нераспознанный - строкой)"""
+
+    __slots__ = ("id", "_day", "time", "subject", "room")
+    FIELDS = ("id", "day", "time", "subject", "room")
+    INTERNED = ("time", "subject", "room")
+
+    @property
+    def day(self):
+        day = self._day
+        return WEEKDAY_NAMES[day] if type(day) is int else day
+
+    @day.setter
+    def day(self, value):
+        number = _DAY_NUMBERS.get(value)
+        self._day = number if number is not None else _intern(value)
+
+
+class Homework(Record):
+    __slots__ = ("id", "subject", "task", "deadline", "due", "done")
+    FIELDS = __slots__
+    INTERNED = ("subject", "deadline", "due")
+
+
+class Note(Record):
+    __slots__ = ("id", "title", "text")
+    FIELDS = __slots__
+    INTERNED = ()
+
+
+class Reminder(Record):
+    __slots__ = ("id", "text", "date", "at", "sent")
+    FIELDS = __slots__
+    INTERNED = ("date",)
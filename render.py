@@ -0,0 +1,107 @@
+"""
+Кэш отрисованных экранов со сбросом по версиям коллекций
+"""
+import logging
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """
+    Кэш (текст, клавиатура) по ключу (user_id, экран, страница).
+    Каждое изменение коллекции пользователя увеличивает её версию,
+    и записи, отрисованные по старым версиям, больше не подходят
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._versions = {}  # (коллекция, user_id) -> номер версии
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def track(self, collection):
+        """Следить за изменениями коллекции"""
+        name = collection.name
+
+        def bump(event, user_id, item):
+            if event in ("evict", "load"):
+                return  # записи выгружены или загружены с диска, содержимое то же
+            key = (name, user_id)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+        collection.subscribe(bump)
+
+    def screen(self, name, depends):
+        """
+        Декоратор функции отрисовки render(user_id, page=0) -> (текст, клавиатура).
+        depends - имена коллекций, от которых зависит экран (записи пользователя),
+        или функции user_id -> (коллекция, ключ) для записей под другим ключом
+        """
+        def decorator(render):
+            def cached(user_id, page=0):
+                key = (user_id, name, page)
+                versions = tuple(
+                    self._versions.get(d(user_id) if callable(d) else (d, user_id), 0) for d in depends
+                )
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == versions:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+                result = render(user_id, page)
+                self._entries[key] = (versions, result)
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                return result
+            cached.uncached = render
+            return cached
+        return decorator
+
+
+class ScreenEditor:
+    """
+    Редактирование сообщений с пропуском повторов: если сообщение уже
+    показывает тот же текст и клавиатуру, запрос к Bot API не отправляется.
+    Показанный текст запоминает только последняя начатая правка сообщения:
+    более старая, заменённая в очереди отправки (ratelimit.py), могла
+    завершиться позже и записала бы текст, которого в сообщении нет
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._shown = OrderedDict()  # (chat_id, message_id) -> (текст, клавиатура)
+        self._edits = {}             # (chat_id, message_id) -> номер последней начатой правки
+        self.skipped = 0
+
+    async def edit(self, callback, text, keyboard=None, parse_mode="HTML"):
+        message = callback.message
+        key = (message.chat.id, message.message_id)
+        shown = self._shown.get(key)
+        if shown is not None and shown[0] == text and (shown[1] is keyboard or shown[1] == keyboard):
+            self.skipped += 1
+            return
+        generation = self._edits.get(key, 0) + 1
+        self._edits[key] = generation
+        try:
+            await message.edit_text(text, reply_markup=keyboard, parse_mode=parse_mode)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                self._shown.pop(key, None)
+                raise
+            self.skipped += 1
+        finally:
+            latest = self._edits.get(key) == generation
+            if latest:
+                del self._edits[key]
+        if not latest:
+            return  # показан текст более новой правки
+        self._shown[key] = (text, keyboard)
+        self._shown.move_to_end(key)
+        if len(self._shown) > self.maxsize:
+            self._shown.popitem(last=False)
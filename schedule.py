@@ -0,0 +1,127 @@
+"""
+Индекс расписания: занятия разложены по дням недели и отсортированы по времени
+"""
+import re
+from bisect import bisect_left, insort
+
+# Дни недели в порядке datetime.weekday()
+WEEKDAY_NAMES = ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье")
+
+_TIME_RE = re.compile(r"(\d{1,2})[:.](\d{2})")
+NO_TIME = 24 * 60  # Занятия без распознанного времени - в конце дня
+
+
+def weekday_name(date):
+    """Название дня недели для даты"""
+    return WEEKDAY_NAMES[date.weekday()]
+
+
+def parse_time(text):
+    """Начало занятия в минутах от полуночи: "9:00" -> 540, "09:00-10:30" -> 540"""
+    match = _TIME_RE.search(text or "")
+    if not match:
+        return NO_TIME
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return NO_TIME
+    return hour * 60 + minute
+
+
+def sort_key(entry):
+    return parse_time(entry.get('time')), entry.get('id', '')
+
+
+def slice_days(days, start, stop):
+    """
+    Занятия недели с номерами от start до stop без сборки всей недели:
+    days - пары (число занятий дня, занятия дня - список или что угодно со срезом) по порядку
+    """
+    entries = []
+    for count, part in days:
+        if start < count:
+            entries += part[max(start, 0):min(stop, count)]
+        start -= count
+        stop -= count
+        if stop <= 0:
+            break
+    return entries
+
+
+class ScheduleIndex:
+    """
+    Расписание пользователей по дням: день -> занятия по времени начала.
+    Строится лениво и поддерживается по событиям коллекции расписания
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self._days = {}  # user_id -> {день: [занятия]}
+        self._ids = {}   # user_id -> {id: занятие}
+        schedule.subscribe(self._on_change)
+
+    def _user(self, user_id):
+        days = self._days.get(user_id)
+        if days is None:
+            days = self._days[user_id] = {}
+            ids = self._ids[user_id] = {}
+            for entry in self.schedule.get(user_id):
+                self._insert(days, entry)
+                ids[entry.get('id')] = entry
+        return days
+
+    @staticmethod
+    def _insert(days, entry):
+        insort(days.setdefault(entry.get('day', ''), []), entry, key=sort_key)
+
+    @staticmethod
+    def _remove(days, entry):
+        bucket = days.get(entry.get('day', ''), [])
+        i = bisect_left(bucket, sort_key(entry), key=sort_key)
+        while i < len(bucket):
+            if bucket[i] is entry:
+                del bucket[i]
+                break
+            i += 1
+        if not bucket:
+            days.pop(entry.get('day', ''), None)
+
+    def day(self, user_id, day):
+        """Занятия дня по времени начала"""
+        return self._user(user_id).get(day, [])
+
+    def week(self, user_id):
+        """Пары (день, занятия) по порядку дней недели, только непустые"""
+        days = self._user(user_id)
+        week = [(day, days[day]) for day in WEEKDAY_NAMES if day in days]
+        if len(week) < len(days):
+            # Нераспознанные дни - в конце
+            week += [(day, entries) for day, entries in days.items() if day not in WEEKDAY_NAMES]
+        return week
+
+    def entries(self, user_id):
+        """Все занятия по порядку недели и времени"""
+        return [entry for _, bucket in self.week(user_id) for entry in bucket]
+
+    def find(self, user_id, entry_id):
+        """Занятие по id или None"""
+        self._user(user_id)
+        return self._ids[user_id].get(entry_id)
+
+    def days(self, user_id):
+        """Пары (число занятий дня, занятия дня) по порядку недели - для slice_days"""
+        return [(len(bucket), bucket) for _, bucket in self.week(user_id)]
+
+    def _on_change(self, event, user_id, item):
+        days = self._days.get(user_id)
+        if days is None:
+            return
+        if event == "add":
+            self._insert(days, item)
+            self._ids[user_id][item.get('id')] = item
+        elif event == "remove":
+            self._remove(days, item)
+            self._ids[user_id].pop(item.get('id'), None)
+        else:
+            # Изменение или очистка - индекс пользователя строится заново
+            del self._days[user_id]
+            del self._ids[user_id]
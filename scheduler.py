@@ -0,0 +1,160 @@
+"""
+Планировщик отложенных задач на двоичной куче (напоминания и т.п.)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Время по умолчанию, если в напоминании указана только дата
+DEFAULT_REMINDER_HOUR = 9
+
+_DATE_RE = re.compile(
+    r"^\s*(?:(\d{1,2})\.(\d{1,2})(?:\.(\d{2,4}))?)?\s*(?:(\d{1,2})[:.](\d{2}))?\s*$"
+)
+
+
+def parse_reminder_date(text, now=None):
+    """
+    Разбор даты напоминания: "25.12.2024 18:00", "25.12.2024", "25.12", "18:00".
+    Возвращает datetime или None, если строка не похожа на дату
+    """
+    match = _DATE_RE.match(text)
+    if not match or not text.strip():
+        return None
+    day, month, year, hour, minute = match.groups()
+    now = now or datetime.now()
+    if day is None and hour is None:
+        return None
+    try:
+        if day is None:
+            # Только время - сегодня, а если уже прошло, то завтра
+            when = now.replace(hour=int(hour), minute=int(minute), second=0, microsecond=0)
+            if when <= now:
+                when += timedelta(days=1)
+            return when
+        if year is None:
+            year = now.year
+        elif len(year) == 2:
+            year = 2000 + int(year)
+        when = datetime(
+            int(year), int(month), int(day),
+            int(hour) if hour is not None else DEFAULT_REMINDER_HOUR,
+            int(minute) if minute is not None else 0,
+        )
+    except ValueError:
+        return None
+    return when
+
+
+class TimerScheduler:
+    """
+    Min-куча таймеров. Вставка O(log n), отмена помечает запись
+    (O(1)) и вычищается при извлечении или сжатии кучи.
+    Фоновая задача спит ровно до ближайшего срока
+    """
+
+    def __init__(self):
+        self._heap = []      # [timestamp, seq, key, callback]
+        self._entries = {}   # key -> запись в куче
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._wakeup = None
+        self._task = None
+        self._running = set()  # сработавшие таймеры, которые ещё выполняются
+        self._stopping = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, when, callback):
+        """Запланировать callback() на время when (timestamp); повтор key переносит таймер"""
+        if key in self._entries:
+            self.cancel(key)
+        entry = [when, next(self._counter), key, callback]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        # Будим цикл, только если новый таймер стал ближайшим
+        if self._wakeup is not None and self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        """Отмена таймера; возвращает True, если он был"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[2] = entry[3] = None
+        self._cancelled += 1
+        if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if e[3] is not None]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if entry[3] is None:
+                self._cancelled -= 1
+                continue
+            del self._entries[entry[2]]
+            due.append(entry)
+        return due
+
+    def _next_delay(self):
+        while self._heap and self._heap[0][3] is None:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.time())
+
+    async def _run(self):
+        # Флаг, а не только cancel(): в Python 3.11 wait_for теряет отмену,
+        # если событие сработало одновременно с ней
+        while not self._stopping:
+            delay = self._next_delay()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Сработавшие таймеры выполняются параллельно: темп отправки задаёт ограничитель
+            for when, _, key, callback in self._pop_due(time.time()):
+                task = asyncio.create_task(self._fire(key, callback))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key, callback):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"Ошибка таймера {key}: {e}", exc_info=True)
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
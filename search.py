@@ -0,0 +1,210 @@
+"""
+Полнотекстовый поиск по заметкам: инвертированный индекс на пользователя
+"""
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+
+_WORD_RE = re.compile(r"\w+")
+
+# Окончания для лёгкого стемминга (длинные проверяются первыми)
+_ENDINGS = sorted([
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ией", "ость",
+    "ах", "ях", "ов", "ев", "ей", "ой", "ый", "ий", "ая", "яя", "ое", "ее", "ые",
+    "ие", "ом", "ем", "ам", "ям", "ую", "юю", "ть",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+
+TITLE_WEIGHT = 3  # Слово из заголовка весит больше слова из текста
+PREFIX_PENALTY = 0.5  # Совпадение по префиксу ниже точного
+SCAN_LIMIT = 100  # Заметки самого редкого слова проверяются все, если их не больше
+
+
+def stem(word):
+    """Отсечение типичного русского окончания (основа не короче 3 букв)"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Нормализация: нижний регистр, ё -> е, разбиение на слова, стемминг"""
+    text = text.casefold().replace("ё", "е")
+    return [stem(w) for w in _WORD_RE.findall(text)]
+
+
+class NoteIndex:
+    """
+    Инвертированный индекс заметок одного пользователя. Заметки основы
+    разложены по весу, чтобы поиск мог идти от самых весомых и остановиться,
+    как только остальные заметки уже не попадут в результат
+    """
+
+    def __init__(self):
+        self.postings = {}  # основа -> {вес: {id заметки: None}}
+        self.terms = []     # отсортированные основы для поиска по префиксу
+        self.docs = {}      # id заметки -> ({основа: вес}, заметка)
+
+    def add(self, note):
+        note_id = note['id']
+        if note_id in self.docs:
+            self.remove(note_id)
+        weights = {}
+        for term in tokenize(note.get('title', '')):
+            weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(note.get('text', '')):
+            weights[term] = weights.get(term, 0) + 1
+        for term, weight in weights.items():
+            tiers = self.postings.get(term)
+            if tiers is None:
+                tiers = self.postings[term] = {}
+                insort(self.terms, term)
+            tiers.setdefault(weight, {})[note_id] = None
+        self.docs[note_id] = (weights, note)
+
+    def remove(self, note_id):
+        weights, _ = self.docs.pop(note_id, ({}, None))
+        for term, weight in weights.items():
+            tiers = self.postings[term]
+            tier = tiers[weight]
+            del tier[note_id]
+            if not tier:
+                del tiers[weight]
+            if not tiers:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def _expand(self, term):
+        """Основы, начинающиеся с term (точное совпадение - первым)"""
+        i = bisect_left(self.terms, term)
+        while i < len(self.terms) and self.terms[i].startswith(term):
+            yield self.terms[i]
+            i += 1
+
+    def _matches(self, term, total):
+        """Основы слова запроса: (основа, множитель веса, заметки по весу, число заметок)"""
+        matches = []
+        for found in self._expand(term):
+            tiers = self.postings[found]
+            size = sum(len(tier) for tier in tiers.values())
+            idf = math.log(1 + total / size)
+            matches.append((found, idf if found == term else idf * PREFIX_PENALTY, tiers, size))
+        return matches
+
+    @staticmethod
+    def _descending(matches):
+        """(вклад, id заметки) слова запроса по убыванию вклада"""
+        tiers = sorted(
+            ((weight * factor, tier) for _, factor, tiers, _ in matches for weight, tier in tiers.items()),
+            key=lambda t: t[0], reverse=True
+        )
+        for level, tier in tiers:
+            for note_id in tier:
+                yield level, note_id
+
+    @staticmethod
+    def _score(weights, words):
+        """Оценка заметки по всем словам запроса; 0, если какого-то слова в ней нет"""
+        score = 0
+        for matches in words:
+            word_score = 0
+            for found, factor, _, _ in matches:
+                weight = weights.get(found)
+                if weight is not None and weight * factor > word_score:
+                    word_score = weight * factor
+            if not word_score:
+                return 0
+            score += word_score
+        return score
+
+    def search(self, query, limit=10):
+        """
+        Заметки, содержащие все слова запроса, по убыванию релевантности.
+        Если у самого редкого слова мало заметок, проверяются только они.
+        Иначе заметки каждого слова перебираются по очереди от самых весомых,
+        начиная с самого редкого слова; перебор заканчивается, когда сумма
+        текущих вкладов слов не больше худшей из limit найденных оценок
+        """
+        terms = tokenize(query)
+        if not terms or not self.docs:
+            return []
+        total = len(self.docs)
+        words = []
+        for term in terms:
+            matches = self._matches(term, total)
+            if not matches:
+                return []
+            words.append(matches)
+        words.sort(key=lambda matches: sum(m[3] for m in matches))
+        if sum(m[3] for m in words[0]) <= SCAN_LIMIT:
+            scores = {}
+            for _, _, tiers, _ in words[0]:
+                for tier in tiers.values():
+                    for note_id in tier:
+                        if note_id not in scores:
+                            scores[note_id] = self._score(self.docs[note_id][0], words)
+            best = heapq.nlargest(limit, (note_id for note_id in scores if scores[note_id]), key=scores.get)
+            return [self.docs[note_id][1] for note_id in best]
+        cursors = [self._descending(matches) for matches in words]
+        heads = [next(cursor) for cursor in cursors]
+        best = []  # куча (оценка, -порядок, id заметки) из limit лучших
+        seen = set()
+        turn = 0
+        while True:
+            i = turn % len(cursors)
+            turn += 1
+            note_id = heads[i][1]
+            if note_id not in seen:
+                seen.add(note_id)
+                score = self._score(self.docs[note_id][0], words)
+                if score:
+                    entry = (score, -len(seen), note_id)
+                    if len(best) < limit:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            head = next(cursors[i], None)
+            if head is None:
+                break  # все заметки этого слова просмотрены, других совпадений нет
+            heads[i] = head
+            if len(best) == limit and best[0][0] >= sum(level for level, _ in heads):
+                break
+        return [self.docs[note_id][1] for _, _, note_id in sorted(best, reverse=True)]
+
+
+class NoteSearch:
+    """
+    Индексы всех пользователей. Индекс строится при первом поиске
+    и дальше обновляется по событиям коллекции заметок
+    """
+
+    def __init__(self, notes):
+        self.notes = notes
+        self._indexes = {}
+        notes.subscribe(self._on_change)
+
+    def index(self, user_id):
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = self._indexes[user_id] = NoteIndex()
+            for note in self.notes.get(user_id):
+                index.add(note)
+        return index
+
+    def search(self, user_id, query, limit=10):
+        """Найденные заметки пользователя"""
+        return self.index(user_id).search(query, limit)
+
+    def _on_change(self, event, user_id, item):
+        index = self._indexes.get(user_id)
+        if index is None:
+            return
+        if event == "add" or event == "update":
+            index.add(item)
+        elif event == "remove":
+            index.remove(item['id'])
+        else:
+            # Очистка, выгрузка или загрузка с диска - индекс строится заново
+            del self._indexes[user_id]
@@ -0,0 +1,128 @@
+"""
+Распределение пользователей по процессам-обработчикам (шардам).
+Входной процесс принимает webhook и пересылает обновление шарду,
+которому принадлежит пользователь; у каждого шарда своя база и свои напоминания,
+а группы и их расписание - в общей для всех шардов базе
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(user_id, shards):
+    """Номер шарда пользователя; не зависит от процесса и перезапусков"""
+    return user_id % shards
+
+
+def shard_path(path, index):
+    """Путь к базе (или снимку) шарда: bot.db -> bot.shard0.db (пустой путь - без базы)"""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+def groups_path(path):
+    """Путь к общей для шардов базе групп: bot.db -> bot.groups.db (пустой путь - без базы)"""
+    if not path:
+        return path
+    root, _ = os.path.splitext(path)
+    return f"{root}.groups.db"
+
+
+def update_user_id(data):
+    """id пользователя (или чата), от которого пришло обновление; 0, если его нет"""
+    for key, value in data.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        owner = value.get("from") or value.get("user") or value.get("chat")
+        if isinstance(owner, dict) and isinstance(owner.get("id"), int):
+            return owner["id"]
+    return 0
+
+
+class ShardRouter:
+    """
+    Входной процесс: запускает shards копий webhook.py на портах
+    base_port..base_port+shards-1 и пересылает им обновления.
+    Ответ шарда (в том числе 429 с Retry-After) возвращается Telegram как есть
+    """
+
+    def __init__(self, shards, base_port, script, timeout=10.0):
+        self.shards = shards
+        self.script = script
+        self.ports = [base_port + i for i in range(shards)]
+        self.urls = [f"http://127.0.0.1:{port}/webhook" for port in self.ports]
+        self.timeout = timeout
+        self._processes = []
+        self._session = None
+
+    def _worker_env(self, index):
+        env = dict(os.environ)
+        env.pop("SHARDS", None)
+        env["SHARD_INDEX"] = str(index)
+        env["SHARD_COUNT"] = str(self.shards)
+        env["PORT"] = str(self.ports[index])
+        env["DATABASE_PATH"] = shard_path(os.getenv("DATABASE_PATH", ""), index)
+        env["SNAPSHOT_PATH"] = shard_path(os.getenv("SNAPSHOT_PATH", ""), index)
+        # Группы общие: их участники могут оказаться в разных шардах
+        env["GROUPS_DATABASE_PATH"] = os.getenv("GROUPS_DATABASE_PATH") or groups_path(
+            os.getenv("DATABASE_PATH") or os.getenv("SNAPSHOT_PATH", "")
+        )
+        # Webhook у Telegram устанавливает только входной процесс
+        env["WEBHOOK_HOST"] = ""
+        return env
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """aiohttp-обработчик webhook входного процесса"""
+        body = await request.read()
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        index = shard_for(update_user_id(data), self.shards)
+        try:
+            async with self._session.post(
+                self.urls[index], data=body, headers={"Content-Type": "application/json"}
+            ) as response:
+                headers = {}
+                if "Retry-After" in response.headers:
+                    headers["Retry-After"] = response.headers["Retry-After"]
+                return web.Response(status=response.status, headers=headers)
+        except (ClientError, asyncio.TimeoutError) as e:
+            # Шард недоступен - Telegram повторит доставку
+            logger.warning(f"Шард {index} недоступен: {e}")
+            return web.Response(status=502)
+
+    def register(self, app: web.Application, path):
+        app.router.add_post(path, self.handle)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+
+    async def _on_startup(self, app):
+        self._session = ClientSession(timeout=ClientTimeout(total=self.timeout))
+        for index in range(self.shards):
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, self.script, env=self._worker_env(index)
+            )
+            self._processes.append(process)
+        logger.info(f"Запущено шардов: {self.shards}, порты {self.ports[0]}-{self.ports[-1]}")
+
+    async def _on_cleanup(self, app, timeout=15.0):
+        # Шарды сами дорабатывают очередь и сохраняют данные по SIGTERM
+        for process in self._processes:
+            if process.returncode is None:
+                process.terminate()
+        for process in self._processes:
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+        self._processes = []
+        await self._session.close()
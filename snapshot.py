@@ -0,0 +1,166 @@
+"""
+Двоичный снимок коллекций хранилища. Файл открывается через mmap,
+а записи пользователя читаются только при обращении: по отсортированному
+индексу фиксированной длины (коллекция, user_id) ищется бинарным поиском,
+поэтому открытие снимка не зависит от его размера.
+
+Формат: заголовок, блоки записей (pickle списков словарей), таблица
+(названия коллекций и записи с не числовыми ключами, например группы)
+и индекс. Новый снимок пишется во временный файл и подменяет старый
+"""
+import mmap
+import os
+import pickle
+import struct
+import threading
+from bisect import bisect_left
+
+MAGIC = b"TTBSNAP1"
+_HEADER = struct.Struct("<8sIQQQ")  # магия, записей в индексе, смещение индекса, смещение и длина таблицы
+_ENTRY = struct.Struct("<HqQI")     # номер коллекции, user_id, смещение и длина блока
+
+
+class _Index:
+    """Индекс снимка как последовательность ключей (номер коллекции, user_id) для bisect"""
+
+    def __init__(self, data, offset, count):
+        self.data = data
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return _ENTRY.unpack_from(self.data, self.offset + i * _ENTRY.size)
+
+
+class Snapshot:
+    """Открытый снимок (только чтение). Блоки - байты pickle, разбирает вызывающий"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._lock = threading.Lock()  # чтения из потоков против close()
+        magic, count, index_offset, table_offset, table_size = _HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: не файл снимка")
+        table = pickle.loads(self._data[table_offset:table_offset + table_size])
+        self.names = table["names"]
+        self._numbers = {name: i for i, name in enumerate(self.names)}
+        self._extra = {(name, key): (offset, size) for name, key, offset, size in table["extra"]}
+        self._index = _Index(self._data, index_offset, count)
+
+    @classmethod
+    def open(cls, path):
+        """Снимок или None, если файла ещё нет"""
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def __len__(self):
+        return len(self._index) + len(self._extra)
+
+    def _block(self, location):
+        offset, size = location
+        with self._lock:
+            if self._data.closed:
+                raise ValueError(f"{self.path}: снимок закрыт")
+            return self._data[offset:offset + size]
+
+    def _locate(self, name, key):
+        if type(key) is not int:
+            return self._extra.get((name, key))
+        number = self._numbers.get(name)
+        if number is None:
+            return None
+        i = bisect_left(self._index, (number, key), key=lambda entry: entry[:2])
+        if i < len(self._index):
+            number_, key_, offset, size = self._index[i]
+            if (number_, key_) == (number, key):
+                return offset, size
+        return None
+
+    def __contains__(self, item):
+        return self._locate(*item) is not None
+
+    def get(self, name, key):
+        """Блок записей или None"""
+        location = self._locate(name, key)
+        return self._block(location) if location is not None else None
+
+    def locations(self, name):
+        """Пары (ключ, (смещение, длина)) всех записей коллекции"""
+        number = self._numbers.get(name)
+        if number is not None:
+            i = bisect_left(self._index, (number,), key=lambda entry: entry[:1])
+            while i < len(self._index):
+                number_, key, offset, size = self._index[i]
+                if number_ != number:
+                    break
+                yield key, (offset, size)
+                i += 1
+        for (name_, key), location in self._extra.items():
+            if name_ == name:
+                yield key, location
+
+    def blocks(self, name):
+        """Пары (ключ, блок) всех записей коллекции"""
+        for key, location in self.locations(name):
+            yield key, self._block(location)
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+
+
+def write_snapshot(path, changed, previous=None):
+    """
+    Записать снимок и открыть его. changed - {(коллекция, ключ): записи}
+    с изменёнными списками простых значений; остальные блоки копируются
+    из previous без разбора. Пустые списки не пишутся
+    """
+    entries = list(changed.items())
+    if previous is not None:
+        for name in previous.names:
+            entries += [
+                ((name, key), location) for key, location in previous.locations(name)
+                if (name, key) not in changed
+            ]
+    names = []
+    numbers = {}
+    index = []
+    extra = []
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(bytes(_HEADER.size))
+        for (name, key), items in entries:
+            if isinstance(items, tuple):
+                block = previous._block(items)
+            elif items:
+                block = pickle.dumps(items, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                continue
+            location = (f.tell(), len(block))
+            f.write(block)
+            if name not in numbers:
+                numbers[name] = len(names)
+                names.append(name)
+            if type(key) is int:
+                index.append((numbers[name], key, *location))
+            else:
+                extra.append((name, key, *location))
+        table = pickle.dumps({"names": names, "extra": extra}, protocol=pickle.HIGHEST_PROTOCOL)
+        table_offset = f.tell()
+        f.write(table)
+        index.sort()
+        index_offset = f.tell()
+        f.write(b"".join(_ENTRY.pack(*entry) for entry in index))
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, len(index), index_offset, table_offset, len(table)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    return Snapshot(path)
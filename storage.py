@@ -0,0 +1,798 @@
+"""
+Хранилище данных пользователей: горячий кэш в памяти + отложенная запись на диск
+(в SQLite или двоичным снимком). Данные неактивных пользователей выгружаются
+из памяти и читаются с диска заново при следующем обращении
+"""
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from aiogram import BaseMiddleware
+
+from journal import Journal
+from snapshot import Snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class Collection:
+    """
+    Коллекция списков записей, ключ - id пользователя.
+    record - класс записей (records.py): добавляемые словари превращаются
+    в его экземпляры; без него записи хранятся словарями.
+    tiered - записи неактивных пользователей можно выгружать из памяти
+    (если хранилище это умеет); они загружаются при обращении
+    """
+
+    def __init__(self, storage, name, record=None, tiered=False):
+        self.storage = storage
+        self.name = name
+        self.record = record
+        self.tiered = tiered and storage.tiered
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """
+        Подписка на изменения: listener(event, user_id, item),
+        event - "add", "remove", "update" или "clear" (item=None).
+        Для выгружаемых коллекций ещё "evict" (записи выгружены из памяти)
+        и "load" (загружены с диска заново), item=None; сами записи при этом
+        не меняются, но это уже другие объекты
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event, user_id, item):
+        for listener in self._listeners:
+            listener(event, user_id, item)
+
+    def get(self, user_id, default=None):
+        """Список записей пользователя (не копия!)"""
+        items = self.storage._cache.get((self.name, user_id))
+        if self.tiered:
+            if items is None:
+                items = self.storage._load(self, user_id)
+            self.storage.touch(user_id)
+        if items is None:
+            return [] if default is None else default
+        return items
+
+    def __contains__(self, user_id):
+        if self.tiered:
+            self.get(user_id)
+        return (self.name, user_id) in self.storage._cache
+
+    def find(self, user_id, item_id):
+        """Индекс записи с данным id или None"""
+        for i, item in enumerate(self.get(user_id)):
+            if item.get('id') == item_id:
+                return i
+        return None
+
+    def items(self):
+        """
+        Пары (user_id, список записей) по всем пользователям.
+        Выгруженные записи читаются с диска без загрузки в память
+        """
+        cached = set()
+        for (name, user_id), items in list(self.storage._cache.items()):
+            if name == self.name:
+                cached.add(user_id)
+                yield user_id, items
+        if self.tiered:
+            yield from self.storage._scan(self, cached)
+
+    def _items(self, user_id):
+        key = (self.name, user_id)
+        items = self.storage._cache.get(key)
+        if self.tiered:
+            if items is None:
+                items = self.storage._load(self, user_id)
+            self.storage.touch(user_id)
+        if items is None:
+            items = self.storage._cache[key] = []
+        return items
+
+    def _restore(self, items):
+        """Список словарей с диска -> записи коллекции"""
+        if self.record is not None:
+            items = [self.record.from_dict(item) for item in items]
+        return items
+
+    def _record(self, item):
+        if self.record is None or isinstance(item, self.record):
+            return item
+        return self.record.from_dict(item)
+
+    def add(self, user_id, item):
+        """Добавление записи в конец списка"""
+        item = self._record(item)
+        self._items(user_id).append(item)
+        self.storage.mark_dirty(self.name, user_id)
+        self.storage.journal(self.name, user_id, "add", item)
+        self._notify("add", user_id, item)
+        return item
+
+    def pop(self, user_id, index):
+        """Удаление записи по индексу"""
+        item = self._items(user_id).pop(index)
+        self.storage.mark_dirty(self.name, user_id)
+        self.storage.journal(self.name, user_id, "pop", index)
+        self._notify("remove", user_id, item)
+        return item
+
+    def update(self, user_id, index, **fields):
+        """Изменение полей записи по индексу"""
+        item = self._items(user_id)[index]
+        item.update(fields)
+        self.storage.mark_dirty(self.name, user_id)
+        self.storage.journal(self.name, user_id, "update", index, fields)
+        self._notify("update", user_id, item)
+        return item
+
+    def replace(self, user_id, items):
+        """Замена всего списка записей пользователя"""
+        items = self.storage._cache[(self.name, user_id)] = [self._record(item) for item in items]
+        self.storage.mark_dirty(self.name, user_id)
+        self.storage.journal(self.name, user_id, "replace", items)
+        self._notify("clear", user_id, None)
+
+    def clear(self, user_id):
+        """Очистка всех записей пользователя"""
+        self._items(user_id).clear()
+        self.storage.mark_dirty(self.name, user_id)
+        self.storage.journal(self.name, user_id, "clear")
+        self._notify("clear", user_id, None)
+
+    def apply(self, user_id, op, args):
+        """Повторить изменение из журнала: op - имя метода коллекции"""
+        if op == "update":
+            index, fields = args
+            self.update(user_id, index, **fields)
+        elif op in ("add", "pop", "replace", "clear"):
+            getattr(self, op)(user_id, *args)
+        else:
+            raise ValueError(f"неизвестная операция журнала {op!r}")
+
+
+class Projection:
+    """
+    Выжимка коллекции source в невыгружаемую коллекцию target:
+    target[user_id] - project(запись) для записей source, где это не None.
+    Невыгружаемые коллекции читаются при старте целиком, поэтому выжимку
+    всех пользователей можно взять, не читая их данные с диска.
+    Записи выжимки находятся по полю key, общему с записями source.
+    Добавление, удаление и изменение записи меняют одну запись выжимки;
+    выжимка пользователя целиком пересчитывается только при очистке
+    или замене его списка, а build() строит её по всем записям (миграция)
+    """
+
+    def __init__(self, source, target, project, key="id"):
+        self.source = source
+        self.target = target
+        self.project = project
+        self.key = key
+        source.subscribe(self._on_change)
+
+    def _index(self, user_id, item_key):
+        for i, entry in enumerate(self.target.get(user_id)):
+            if entry[self.key] == item_key:
+                return i
+        return None
+
+    def _on_change(self, event, user_id, item):
+        if event in ("evict", "load"):
+            return  # записи те же
+        if event not in ("add", "remove", "update"):
+            self.refresh(user_id, self.source.get(user_id))
+            return
+        entry = self.project(item) if event != "remove" else None
+        index = self._index(user_id, item.get(self.key)) if event != "add" else None
+        if index is None:
+            if entry is not None:
+                self.target.add(user_id, entry)
+        elif entry is None:
+            self.target.pop(user_id, index)
+        elif entry != self.target.get(user_id)[index]:
+            self.target.update(user_id, index, **entry)
+
+    def refresh(self, user_id, items):
+        """Выжимка пользователя заново по его записям"""
+        entries = [entry for entry in map(self.project, items) if entry is not None]
+        if entries == self.target.get(user_id):
+            return
+        if entries:
+            self.target.replace(user_id, entries)
+        else:
+            self.target.clear(user_id)
+
+    def build(self):
+        """Выжимка по всем записям source, в том числе выгруженным (чтение с диска)"""
+        for user_id, items in self.source.items():
+            self.refresh(user_id, items)
+
+
+def _plain(value):
+    """Запись records.py -> словарь для JSON"""
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def _simple(value):
+    """Записи (и списки записей) -> словари, остальное как есть"""
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if type(value) is list:
+        return [_simple(item) for item in value]
+    return value
+
+
+class MemoryStorage:
+    """Хранилище только в памяти (данные пропадают при перезапуске)"""
+
+    tiered = False  # выгружать некуда
+    loads = evictions = 0
+
+    def __init__(self):
+        self._cache = {}  # (коллекция, user_id) -> список записей
+        self._collections = {}
+
+    def collection(self, name, record=None, tiered=False):
+        if name not in self._collections:
+            self._collections[name] = Collection(self, name, record, tiered)
+        return self._collections[name]
+
+    def collections(self):
+        return list(self._collections.values())
+
+    def mark_dirty(self, name, user_id):
+        pass
+
+    def journal(self, name, user_id, op, *args):
+        """Записать изменение коллекции в журнал (если он есть)"""
+        pass
+
+    def __len__(self):
+        """Пользователей, чьи выгружаемые данные сейчас в памяти"""
+        return 0
+
+    async def load_users(self, user_ids):
+        """Заранее загрузить данные пользователей (не блокируя цикл событий)"""
+        pass
+
+    async def start(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class TieredStorage(MemoryStorage):
+    """
+    Основа хранилищ с диском: изменения копятся и пишутся фоновой задачей.
+    Выгружаемые коллекции не читаются при старте: данные пользователя
+    загружаются при первом обращении и выгружаются, когда пользователей
+    в памяти больше max_users или он неактивен дольше idle_ttl секунд
+    (0 - без ограничения). Несохранённые изменения не выгружаются.
+    Наследник читает строки (name, user_id, data) методом _read и разбирает их _decode
+    """
+
+    tiered = True
+
+    def __init__(self, flush_interval, max_users=0, idle_ttl=0):
+        super().__init__()
+        self.flush_interval = flush_interval
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self._dirty = set()
+        self._flushing = set()            # изменения, которые сейчас пишутся
+        self._resident = OrderedDict()    # user_id -> время последнего обращения, старые первыми
+        self._wakeup = None
+        self._writer = None
+        self._closing = False
+        self.loads = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._resident)
+
+    def mark_dirty(self, name, user_id):
+        self._dirty.add((name, user_id))
+
+    def touch(self, user_id):
+        self._resident[user_id] = time.monotonic()
+        self._resident.move_to_end(user_id)
+
+    def _tiered_names(self):
+        return [name for name, collection in self._collections.items() if collection.tiered]
+
+    def _read(self, names, user_ids):
+        """Строки (name, user_id, data) выгружаемых коллекций; None, если хранилище не открыто"""
+        raise NotImplementedError
+
+    def _decode(self, collection, data):
+        raise NotImplementedError
+
+    def _put(self, collection, user_id, items):
+        """Положить загруженные с диска записи в кэш, если их там ещё нет"""
+        key = (collection.name, user_id)
+        if key in self._cache:
+            return self._cache[key]
+        self._cache[key] = items
+        self.loads += 1
+        collection._notify("load", user_id, None)
+        return items
+
+    def _load(self, collection, user_id):
+        """Синхронная загрузка записей пользователя одной коллекции"""
+        rows = self._read([collection.name], [user_id])
+        if rows is None:
+            return None  # хранилище ещё не открыто
+        items = self._decode(collection, rows[0][2]) if rows else []
+        return self._put(collection, user_id, items)
+
+    async def load_users(self, user_ids):
+        names = self._tiered_names()
+        missing = [
+            user_id for user_id in dict.fromkeys(user_ids)
+            if any((name, user_id) not in self._cache for name in names)
+        ]
+        if not missing:
+            return
+        rows = await asyncio.to_thread(self._read, names, missing)
+        if rows is None:
+            return
+        found = {(name, user_id): data for name, user_id, data in rows}
+        for user_id in missing:
+            for name in names:
+                collection = self._collections[name]
+                data = found.get((name, user_id))
+                self._put(collection, user_id, self._decode(collection, data) if data is not None else [])
+            self.touch(user_id)
+
+    def evict(self, user_id):
+        """Выгрузить данные пользователя из памяти; False, если есть несохранённые изменения"""
+        names = self._tiered_names()
+        if any((name, user_id) in self._dirty or (name, user_id) in self._flushing for name in names):
+            return False
+        for name in names:
+            if self._cache.pop((name, user_id), None) is not None:
+                self._collections[name]._notify("evict", user_id, None)
+        self._resident.pop(user_id, None)
+        self.evictions += 1
+        return True
+
+    def _evict_cold(self):
+        """Выгрузка самых давних пользователей сверх max_users и неактивных дольше idle_ttl"""
+        if not self.max_users and not self.idle_ttl:
+            return
+        deadline = time.monotonic() - self.idle_ttl
+        for user_id, seen in list(self._resident.items()):
+            over = self.max_users and len(self._resident) > self.max_users
+            idle = self.idle_ttl and seen < deadline
+            if not over and not idle:
+                break
+            self.evict(user_id)
+
+    def _start_writer(self):
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи ({type(self).__name__}): {e}", exc_info=True)
+            self._evict_cold()
+
+    async def _close_files(self):
+        pass
+
+    async def close(self):
+        """Остановка фоновой записи и сброс оставшихся изменений"""
+        self._closing = True
+        if self._writer is not None:
+            self._wakeup.set()
+            await self._writer
+            self._writer = None
+        await self.flush()
+        await self._close_files()
+
+
+def _column_key(key):
+    """Ключ для столбца user_id: строки пишутся байтами, иначе SQLite превратит ключ группы "221" в число"""
+    return key.encode() if isinstance(key, str) else key
+
+
+def _row_key(value):
+    """Ключ из столбца user_id: байты -> строка"""
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class SQLiteStorage(TieredStorage):
+    """
+    SQLite в режиме WAL. Чтения идут из кэша, изменения копятся
+    и пишутся фоновой задачей пачками, одной транзакцией
+    """
+
+    def __init__(self, path, flush_interval=0.5, batch_size=500, max_users=0, idle_ttl=0):
+        super().__init__(flush_interval, max_users, idle_ttl)
+        self.path = path
+        self.batch_size = batch_size
+        self._db = None
+        self._reader = None               # отдельное соединение для загрузки
+        self._reader_lock = threading.Lock()
+
+    def mark_dirty(self, name, user_id):
+        self._dirty.add((name, user_id))
+        if self._wakeup is not None and len(self._dirty) >= self.batch_size:
+            self._wakeup.set()
+
+    def _open(self, tiered):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            "name TEXT NOT NULL, "
+            "user_id INTEGER NOT NULL, "
+            "data TEXT NOT NULL, "
+            "PRIMARY KEY (name, user_id))"
+        )
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Строковые ключи, записанные текстом, - в байты, как их пишет _column_key
+            db.execute("UPDATE collections SET user_id = CAST(user_id AS BLOB) WHERE typeof(user_id) = 'text'")
+        if version < 2:
+            # Пустые списки больше не хранятся
+            db.execute("DELETE FROM collections WHERE data = '[]'")
+            db.execute("PRAGMA user_version = 2")
+        db.commit()
+        reader = sqlite3.connect(self.path, check_same_thread=False)
+        marks = ",".join("?" * len(tiered))
+        rows = db.execute(
+            f"SELECT name, user_id, data FROM collections WHERE name NOT IN ({marks})", tiered
+        ).fetchall()
+        return db, reader, rows
+
+    def _write(self, rows):
+        """Строки (name, user_id, data); data=None - удалить строку"""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO collections (name, user_id, data) VALUES (?, ?, ?)",
+                [row for row in rows if row[2] is not None],
+            )
+            self._db.executemany(
+                "DELETE FROM collections WHERE name = ? AND user_id = ?",
+                [row[:2] for row in rows if row[2] is None],
+            )
+
+    def _read(self, names, user_ids):
+        if self._reader is None:
+            return None
+        rows = []
+        name_marks = ",".join("?" * len(names))
+        with self._reader_lock:
+            for i in range(0, len(user_ids), 500):
+                chunk = [_column_key(user_id) for user_id in user_ids[i:i + 500]]
+                rows += self._reader.execute(
+                    f"SELECT name, user_id, data FROM collections "
+                    f"WHERE name IN ({name_marks}) AND user_id IN ({','.join('?' * len(chunk))})",
+                    (*names, *chunk),
+                ).fetchall()
+        return [(name, _row_key(user_id), data) for name, user_id, data in rows]
+
+    def _decode(self, collection, data):
+        return collection._restore(json.loads(data))
+
+    def _scan(self, collection, skip):
+        """Записи коллекции с диска, кроме пользователей из skip (без загрузки в кэш)"""
+        if self._reader is None:
+            return
+        with self._reader_lock:
+            rows = self._reader.execute(
+                "SELECT user_id, data FROM collections WHERE name = ?", (collection.name,)
+            ).fetchall()
+        for user_id, data in rows:
+            user_id = _row_key(user_id)
+            if user_id not in skip and (collection.name, user_id) not in self._cache:
+                yield user_id, self._decode(collection, data)
+
+    def _decode_rows(self, rows):
+        """Строки (name, user_id, data) -> {(коллекция, ключ): записи}"""
+        loaded = {}
+        for name, user_id, data in rows:
+            collection = self._collections.get(name)
+            loaded[(name, _row_key(user_id))] = (
+                self._decode(collection, data) if collection is not None else json.loads(data)
+            )
+        return loaded
+
+    async def start(self):
+        """Открытие базы и загрузка в кэш невыгружаемых коллекций"""
+        self._db, self._reader, rows = await asyncio.to_thread(self._open, self._tiered_names())
+        # Разбор тоже в потоке: в невыгружаемых коллекциях бывают записи всех пользователей
+        self._cache.update(await asyncio.to_thread(self._decode_rows, rows))
+        logger.info(f"SQLite: загружено {len(rows)} коллекций из {self.path}")
+        self._start_writer()
+
+    async def flush(self):
+        """Запись накопленных изменений одной транзакцией"""
+        if not self._dirty or self._db is None:
+            return
+        dirty, self._dirty = self._dirty, set()
+        # Сериализуем в цикле событий, чтобы поток не читал списки во время изменения.
+        # Пустой список - удаление строки, чтобы в базе не копились строки "[]"
+        rows = []
+        for name, user_id in dirty:
+            items = self._cache.get((name, user_id))
+            data = json.dumps(items, ensure_ascii=False, default=_plain) if items else None
+            rows.append((name, _column_key(user_id), data))
+        self._flushing = dirty
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except Exception:
+            self._dirty |= dirty
+            raise
+        finally:
+            self._flushing = set()
+
+    async def _close_files(self):
+        for connection in (self._db, self._reader):
+            if connection is not None:
+                await asyncio.to_thread(connection.close)
+        self._db = self._reader = None
+
+
+class SharedSQLiteStorage(SQLiteStorage):
+    """
+    База, общая для нескольких процессов (данные групп при SHARDS > 1).
+    Все записи в памяти; после каждой записи изменений, если база менялась
+    (PRAGMA data_version), списки, изменённые другими процессами, читаются
+    заново, и подписчики коллекции получают "clear"
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        super().__init__(path, flush_interval)
+        self._version = None
+        self._seen = {}  # (коллекция, ключ) -> данные, как они сейчас в базе
+
+    def _open(self, tiered):
+        db, reader, rows = super()._open(tiered)
+        self._version = reader.execute("PRAGMA data_version").fetchone()[0]
+        self._seen = {(name, _row_key(key)): data for name, key, data in rows}
+        return db, reader, rows
+
+    def _write(self, rows):
+        super()._write(rows)
+        for name, key, data in rows:
+            if data is None:
+                self._seen.pop((name, _row_key(key)), None)
+            else:
+                self._seen[(name, _row_key(key))] = data
+
+    def _changed(self):
+        """Все строки базы, если её меняли после прошлой проверки, иначе None"""
+        with self._reader_lock:
+            version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._version:
+                return None
+            self._version = version
+            return self._reader.execute("SELECT name, user_id, data FROM collections").fetchall()
+
+    async def refresh(self):
+        """Перечитать списки, изменённые другими процессами; сколько обновлено"""
+        if self._reader is None:
+            return 0
+        rows = await asyncio.to_thread(self._changed)
+        if rows is None:
+            return 0
+        current = {(name, _row_key(key)): data for name, key, data in rows}
+        changed = 0
+        for key in current.keys() | self._seen.keys():
+            data = current.get(key)
+            if data == self._seen.get(key) or key in self._dirty or key in self._flushing:
+                continue
+            name, user_id = key
+            collection = self._collections.get(name)
+            if data is None:
+                self._seen.pop(key)
+                items = []
+            else:
+                self._seen[key] = data
+                items = self._decode(collection, data) if collection is not None else json.loads(data)
+            self._cache[key] = items
+            if collection is not None:
+                collection._notify("clear", user_id, None)
+            changed += 1
+        return changed
+
+    async def flush(self):
+        await super().flush()
+        await self.refresh()
+
+
+class SnapshotStorage(TieredStorage):
+    """
+    Хранение в памяти с периодическим двоичным снимком на диск (snapshot.py)
+    раз в interval секунд и при остановке. При старте снимок открывается
+    через mmap, и данные пользователя разбираются только при обращении к ним.
+    Снимок пишется целиком в отдельном потоке; блоки неизменённых записей
+    копируются из предыдущего снимка без разбора.
+
+    С журналом (journal_interval > 0, journal.py) каждое изменение ещё и дописывается
+    в журнал, который сбрасывается на диск раз в journal_interval секунд.
+    Снимок сворачивает журнал: вошедшие в него сегменты удаляются
+    (или переносятся в journal_archive), а если журнал после снимка вырос
+    больше compact_size байт, следующий снимок пишется раньше срока.
+    При старте изменения из журнала применяются поверх снимка
+    """
+
+    def __init__(self, path, interval=300, max_users=0, idle_ttl=0,
+                 journal_interval=0, journal_archive="", compact_size=16 << 20):
+        super().__init__(interval, max_users, idle_ttl)
+        self.path = path
+        self.compact_size = compact_size
+        self._snapshot = None
+        self._started = False
+        self._journal = Journal(path + ".log", journal_interval, journal_archive) if journal_interval > 0 else None
+        self._replaying = False
+        self.replayed = 0
+
+    def journal(self, name, user_id, op, *args):
+        if self._journal is None or self._replaying:
+            return
+        self._journal.append((time.time(), name, user_id, op, [_simple(arg) for arg in args]))
+        if self._journal.size > self.compact_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _replay(self, events):
+        """Применить изменения из журнала поверх снимка (сами они в журнал не пишутся)"""
+        skipped = 0
+        self._replaying = True
+        try:
+            for _, name, user_id, op, args in events:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = self.collection(name)
+                try:
+                    collection.apply(user_id, op, args)
+                except (IndexError, KeyError, ValueError) as e:
+                    skipped += 1
+                    logger.warning(f"Журнал: не применено {op} {name}/{user_id}: {e!r}")
+        finally:
+            self._replaying = False
+        self.replayed = len(events) - skipped
+        return skipped
+
+    def _read(self, names, user_ids):
+        if not self._started:
+            return None
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        rows = []
+        for user_id in user_ids:
+            for name in names:
+                data = snapshot.get(name, user_id)
+                if data is not None:
+                    rows.append((name, user_id, data))
+        return rows
+
+    def _decode(self, collection, data):
+        items = pickle.loads(data)
+        return collection._restore(items) if collection is not None else items
+
+    def _scan(self, collection, skip):
+        if self._snapshot is None:
+            return
+        for user_id, data in self._snapshot.blocks(collection.name):
+            if user_id not in skip and (collection.name, user_id) not in self._cache:
+                yield user_id, self._decode(collection, data)
+
+    async def start(self):
+        """Открытие снимка и загрузка невыгружаемых коллекций (они небольшие)"""
+        started = time.monotonic()
+        self._snapshot = await asyncio.to_thread(Snapshot.open, self.path)
+        self._started = True
+        if self._snapshot is not None:
+            tiered = set(self._tiered_names())
+            for name in self._snapshot.names:
+                if name in tiered:
+                    continue
+                collection = self._collections.get(name)
+                for key, data in self._snapshot.blocks(name):
+                    self._cache[(name, key)] = self._decode(collection, data)
+            logger.info(
+                f"Снимок {self.path}: {len(self._snapshot)} записей, "
+                f"открыт за {(time.monotonic() - started) * 1000:.1f} мс"
+            )
+        if self._journal is not None:
+            events = await asyncio.to_thread(self._journal.open)
+            if events:
+                skipped = self._replay(events)
+                logger.info(f"Журнал {self._journal.path}: применено {self.replayed} изменений, пропущено {skipped}")
+            self._journal.start()
+        self._start_writer()
+
+    def _changed(self, dirty):
+        """
+        Изменённые записи простыми списками. Собираются в цикле событий,
+        чтобы поток не читал их во время изменения; всё остальное
+        (pickle, копирование старых блоков, запись) - в потоке
+        """
+        changed = {}
+        for key in dirty:
+            items = self._cache.get(key, [])
+            changed[key] = _simple(items)
+        return changed
+
+    async def flush(self):
+        """Записать новый снимок, если что-то изменилось"""
+        if not self._dirty or not self._started:
+            return
+        dirty, self._dirty = self._dirty, set()
+        changed = self._changed(dirty)
+        # Сегменты журнала до этого момента войдут в снимок
+        folded = self._journal.rotate() if self._journal is not None else None
+        self._flushing = dirty
+        try:
+            # Старый снимок не закрывается: его ещё могут читать потоки load_users,
+            # отображение освободится вместе с последней ссылкой
+            self._snapshot = await asyncio.to_thread(write_snapshot, self.path, changed, self._snapshot)
+        except Exception:
+            self._dirty |= dirty
+            raise
+        finally:
+            self._flushing = set()
+        logger.debug(f"Снимок {self.path}: записано {len(self._snapshot)} записей")
+        if folded is not None:
+            await self._journal.drop(folded)
+
+    async def _close_files(self):
+        if self._journal is not None:
+            await self._journal.close()
+        if self._snapshot is not None:
+            await asyncio.to_thread(self._snapshot.close)
+            self._snapshot = None
+
+
+class LoadUserMiddleware(BaseMiddleware):
+    """
+    Outer-middleware обновлений: данные пользователя загружаются с диска
+    в отдельном потоке до обработчиков, чтобы те не ждали диска в цикле событий
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is not None:
+            await self.storage.load_users([user.id])
+        return await handler(event, data)
+
+
+def create_storage(path="", max_users=0, idle_ttl=0, snapshot_path="", snapshot_interval=300,
+                   journal_interval=0, journal_archive=""):
+    """SQLite, если указан путь к базе; иначе снимок, если указан его путь; иначе только память"""
+    if path:
+        return SQLiteStorage(path, max_users=max_users, idle_ttl=idle_ttl)
+    if snapshot_path:
+        return SnapshotStorage(snapshot_path, snapshot_interval, max_users=max_users, idle_ttl=idle_ttl,
+                               journal_interval=journal_interval, journal_archive=journal_archive)
+    return MemoryStorage()
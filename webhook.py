@@ -6,11 +6,16 @@ import logging
 import os
 from aiohttp import web
 from aiogram import Bot
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 from dotenv import load_dotenv
 
 # Импортируем диспетчер из bot.py
-from bot import dp
+from bot import dp, metrics, send_limiter, update_dedup
+from dedup import DedupRequestHandler
+from ingest import UpdateQueue
+from metrics import ApiMetricsMiddleware
+from ratelimit import RateLimitMiddleware
+from shard import ShardRouter
 
 load_dotenv()
 
@@ -21,11 +26,19 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "")  # URL вашего приложения на Render
 WEBHOOK_PATH = "/webhook"
 WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
+# Пул обработчиков очереди (0 - обрабатывать как раньше, задачей на каждое обновление)
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 8))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+# Число процессов-шардов (0 или 1 - всё в одном процессе)
+SHARDS = int(os.getenv("SHARDS", 0))
+SHARD_INDEX = os.getenv("SHARD_INDEX")  # задаётся входным процессом для шардов
 
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден!")
 
 bot = Bot(token=BOT_TOKEN)
+bot.session.middleware(RateLimitMiddleware(send_limiter))
+bot.session.middleware(ApiMetricsMiddleware(metrics))
 
 
 async def on_startup(bot: Bot) -> None:
@@ -39,8 +52,9 @@ async def on_startup(bot: Bot) -> None:
 
 async def on_shutdown(bot: Bot) -> None:
     """Удаление webhook при остановке"""
-    await bot.delete_webhook()
-    logger.info("Webhook удален")
+    if WEBHOOK_HOST:
+        await bot.delete_webhook()
+        logger.info("Webhook удален")
 
 
 def create_app() -> web.Application:
@@ -48,12 +62,30 @@ def create_app() -> web.Application:
     app = web.Application()
     
     # Настраиваем webhook handler
-    webhook_requests_handler = SimpleRequestHandler(
-        dispatcher=dp,
-        bot=bot,
-    )
-    webhook_requests_handler.register(app, path=WEBHOOK_PATH)
+    if WEBHOOK_WORKERS > 0:
+        # Очередь регистрируется до setup_application, чтобы при остановке
+        # она успела разобраться раньше, чем закроется хранилище
+        update_queue = UpdateQueue(
+            dp, bot, workers=WEBHOOK_WORKERS, maxsize=WEBHOOK_QUEUE_SIZE, dedup=update_dedup
+        )
+        update_queue.register(app, WEBHOOK_PATH)
+        app["update_queue"] = update_queue
+        metrics.gauge("bot_update_queue_depth", "Обновлений в очереди", update_queue.qsize)
+        metrics.gauge("bot_update_queue_users", "Пользователей с обновлениями в очереди", update_queue.users)
+        metrics.gauge("bot_update_queue_rejected_total", "Отказы из-за переполнения очереди",
+                      lambda: update_queue.rejected, "counter")
+        metrics.gauge("bot_update_queue_expired_total", "Устаревшие в очереди обновления",
+                      lambda: update_queue.expired, "counter")
+    else:
+        webhook_requests_handler = DedupRequestHandler(
+            update_dedup,
+            dispatcher=dp,
+            bot=bot,
+        )
+        webhook_requests_handler.register(app, path=WEBHOOK_PATH)
     
+    app.router.add_get("/metrics", metrics.handle)
+
     # Настраиваем приложение
     setup_application(app, dp, bot=bot)
     
@@ -64,7 +96,24 @@ def create_app() -> web.Application:
     return app
 
 
+def create_front_app(port) -> web.Application:
+    """Входной процесс: webhook пересылается шардам по id пользователя"""
+    app = web.Application()
+    router = ShardRouter(SHARDS, base_port=port + 1, script=os.path.abspath(__file__))
+    router.register(app, WEBHOOK_PATH)
+
+    app.on_startup.append(lambda _: asyncio.create_task(on_startup(bot)))
+    app.on_shutdown.append(lambda _: asyncio.create_task(on_shutdown(bot)))
+
+    return app
+
+
 if __name__ == "__main__":
-    app = create_app()
     port = int(os.getenv("PORT", 8000))
-    web.run_app(app, host="0.0.0.0", port=port)
+    if SHARD_INDEX is not None:
+        # Шард принимает обновления только от входного процесса
+        web.run_app(create_app(), host="127.0.0.1", port=port)
+    elif SHARDS > 1:
+        web.run_app(create_front_app(port), host="0.0.0.0", port=port)
+    else:
+        web.run_app(create_app(), host="0.0.0.0", port=port)